@@ -0,0 +1,146 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks import the `src` package of a template, so they must point Python at
+the template folder and provide the environment variables `src.config` requires.
+They run against `REDIS_URL` when it is set, otherwise against an in-process
+fakeredis server (`pip install "fakeredis[lua]"`).
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def parse_args(description: str, **arguments) -> argparse.Namespace:
+    """
+    Parse the common benchmark arguments plus any benchmark specific ones.
+
+    Args:
+        description (str): Description shown in --help.
+        **arguments: Extra arguments, mapping a name to the keyword arguments of add_argument.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--template",
+        default="custom-react-agent",
+        help="Template folder whose src package is benchmarked",
+    )
+    for name, kwargs in arguments.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", **kwargs)
+    args = parser.parse_args()
+    use_template(args.template)
+    return args
+
+
+def use_template(template: str):
+    """Make `src` importable from the given template folder."""
+    template_dir = ROOT / "templates" / template
+    if not template_dir.is_dir():
+        raise SystemExit(f"Template {template} does not exist")
+    os.environ.setdefault("LITELLM_GATEWAY_URL", "http://localhost:4000")
+    os.environ.setdefault("LITELLM_GATEWAY_API_KEY", "benchmark")
+    os.environ.setdefault("REDIS_URL", "")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("AGENT_CONFIG", str(template_dir / "agent.yaml"))
+    sys.path.insert(0, str(template_dir))
+
+
+def round_trip_counter(connection_class):
+    """
+    Subclass a redis-py connection class so that it counts network round-trips.
+
+    A pipeline or a script call is a single `send_packed_command`, so counting
+    those calls counts round-trips rather than commands.
+    """
+
+    class CountingConnection(connection_class):
+        round_trips = 0
+
+        async def send_packed_command(self, *args, **kwargs):
+            CountingConnection.round_trips += 1
+            return await super().send_packed_command(*args, **kwargs)
+
+    return CountingConnection
+
+
+def connect_redis(**pool_kwargs):
+    """
+    Connect to REDIS_URL, or to an in-process fakeredis when it is not set.
+
+    Returns:
+        tuple: The async Redis client and the counting connection class it uses.
+    """
+    from redis.asyncio import ConnectionPool, Connection
+    from redis.asyncio import Redis as AsyncRedis
+
+    url = os.environ.get("REDIS_URL")
+    if url:
+        counter = round_trip_counter(Connection)
+        pool = ConnectionPool.from_url(url, connection_class=counter, **pool_kwargs)
+        return AsyncRedis(connection_pool=pool), counter
+
+    try:
+        from fakeredis import FakeServer
+        from fakeredis.aioredis import FakeAsyncRedisConnection
+    except ImportError:
+        raise SystemExit("Set REDIS_URL or install fakeredis[lua] to run benchmarks")
+
+    counter = round_trip_counter(FakeAsyncRedisConnection)
+    pool = ConnectionPool(connection_class=counter, server=FakeServer(), **pool_kwargs)
+    return AsyncRedis(connection_pool=pool), counter
+
+
+class Timer:
+    """Collects latency samples, in milliseconds, of the timed blocks."""
+
+    def __init__(self):
+        self.samples = []
+
+    @contextmanager
+    def measure(self):
+        start = time.perf_counter()
+        yield
+        self.samples.append((time.perf_counter() - start) * 1000)
+
+    def percentile(self, q: float) -> float:
+        if len(self.samples) == 1:
+            return self.samples[0]
+        return statistics.quantiles(self.samples, n=100, method="inclusive")[int(q) - 1]
+
+    def summary(self) -> dict:
+        return {
+            "ops/sec": len(self.samples) / (sum(self.samples) / 1000)
+            if self.samples
+            else 0.0,
+            "p50 ms": self.percentile(50) if self.samples else 0.0,
+            "p99 ms": self.percentile(99) if self.samples else 0.0,
+        }
+
+
+def print_table(rows: list, columns: list):
+    """Print a list of dicts as an aligned text table."""
+    widths = {
+        column: max(len(column), *(len(_format(row[column])) for row in rows))
+        for column in columns
+    }
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print(
+            "  ".join(_format(row[column]).ljust(widths[column]) for column in columns)
+        )
+
+
+def _format(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
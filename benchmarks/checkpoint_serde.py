@@ -0,0 +1,52 @@
+"""
+Benchmark of the checkpoint serialization formats on conversation histories.
+
+Conversation checkpoints of growing length are serialized and deserialized
+with every format of the saver's serializer: `jsonplus`, LangGraph's default,
+and `msgpack`, which encodes LangChain messages with registered type codes.
+
+Usage:
+    python benchmarks/checkpoint_serde.py --messages 2 8 32 128 --repeat 50
+"""
+
+from _common import Timer, parse_args, print_table
+from redis_compression import conversation_checkpoint
+
+
+def main(args):
+    from src.utils.checkpoint_serde import SERDE_FORMATS, CheckpointSerializer
+
+    rows = []
+    for messages in args.messages:
+        checkpoint = conversation_checkpoint(messages)
+        for serde_format in SERDE_FORMATS:
+            serde = CheckpointSerializer(serde_format)
+            dumps_timer, loads_timer = Timer(), Timer()
+            for _ in range(args.repeat):
+                with dumps_timer.measure():
+                    serialized = serde.dumps_typed(checkpoint)
+                with loads_timer.measure():
+                    loaded = serde.loads_typed(serialized)
+            assert loaded["channel_values"] == checkpoint["channel_values"]
+            rows.append(
+                {
+                    "messages": messages,
+                    "serde": serde_format,
+                    "bytes": len(serialized[1]),
+                    "dumps ms": dumps_timer.percentile(50),
+                    "loads ms": loads_timer.percentile(50),
+                }
+            )
+
+    print(f"Median latency per checkpoint over {args.repeat} runs")
+    print_table(rows, ["messages", "serde", "bytes", "dumps ms", "loads ms"])
+
+
+if __name__ == "__main__":
+    main(
+        parse_args(
+            __doc__.strip().splitlines()[0],
+            messages=dict(type=int, nargs="+", default=[2, 8, 32, 128]),
+            repeat=dict(type=int, default=50),
+        )
+    )
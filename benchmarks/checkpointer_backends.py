@@ -0,0 +1,141 @@
+"""
+Benchmark of the in-memory, Redis and SQLite checkpointers on a ReAct workload.
+
+Each backend persists the same conversation threads super-step by super-step:
+an `aput` of the growing conversation followed by concurrent `aput_writes`, one
+per task, as LangGraph issues them. Then the latest checkpoint of every thread
+is read back with `aget_tuple` and the last checkpoints of its history are
+listed with `alist`. The SQLite database is a temporary file in WAL mode; Redis
+is REDIS_URL, or fakeredis, whose latencies do not include a network.
+
+Usage:
+    python benchmarks/checkpointer_backends.py --threads 20 --steps 20 --tasks 3
+"""
+
+import asyncio
+import os
+import tempfile
+from contextlib import asynccontextmanager
+
+from _common import Timer, connect_redis, parse_args, print_table
+from redis_compression import conversation_checkpoint
+
+
+@asynccontextmanager
+async def in_memory_saver():
+    from src.utils.memory_checkpointer import BoundedMemorySaver
+
+    yield BoundedMemorySaver()
+
+
+@asynccontextmanager
+async def redis_saver():
+    from src.utils.redis_checkpointer import AsyncRedisSaver
+
+    conn, _ = connect_redis()
+    yield AsyncRedisSaver(conn)
+    await conn.aclose()
+
+
+@asynccontextmanager
+async def sqlite_saver(synchronous: str):
+    from src.utils.sqlite_checkpointer import AsyncSqliteSaver
+
+    with tempfile.TemporaryDirectory() as directory:
+        async with AsyncSqliteSaver.from_path(
+            path=os.path.join(directory, "checkpoints.sqlite"), synchronous=synchronous
+        ) as saver:
+            yield saver
+
+
+async def run(saver, args) -> dict:
+    from langchain_core.messages import ToolMessage
+    from langgraph.checkpoint.base import create_checkpoint
+
+    timers = {"put step": Timer(), "get latest": Timer(), "list 10": Timer()}
+    configs = []
+    for thread in range(args.threads):
+        config = {
+            "configurable": {"thread_id": f"thread-{thread}", "checkpoint_ns": ""}
+        }
+        checkpoint = conversation_checkpoint(0)
+        for step in range(args.steps):
+            checkpoint = create_checkpoint(checkpoint, None, step)
+            checkpoint["channel_values"]["messages"] = conversation_checkpoint(
+                3 * (step + 1)
+            )["channel_values"]["messages"]
+            checkpoint["channel_versions"]["messages"] = step + 1
+            with timers["put step"].measure():
+                config = await saver.aput(
+                    config,
+                    checkpoint,
+                    {"source": "loop", "step": step, "writes": None},
+                    {"messages": step + 1},
+                )
+                await asyncio.gather(
+                    *(
+                        saver.aput_writes(
+                            config,
+                            [
+                                (
+                                    "messages",
+                                    ToolMessage(
+                                        content=f"tool output {step}/{task}",
+                                        tool_call_id=f"call_{task}",
+                                    ),
+                                )
+                            ],
+                            f"task-{task}",
+                        )
+                        for task in range(args.tasks)
+                    )
+                )
+        configs.append(
+            {"configurable": {"thread_id": f"thread-{thread}", "checkpoint_ns": ""}}
+        )
+
+    for config in configs:
+        with timers["get latest"].measure():
+            checkpoint_tuple = await saver.aget_tuple(config)
+        assert len(checkpoint_tuple.pending_writes) == args.tasks
+        with timers["list 10"].measure():
+            listed = [item async for item in saver.alist(config, limit=10)]
+        assert len(listed) == min(10, args.steps)
+    return {
+        f"{operation} {column}": value
+        for operation, timer in timers.items()
+        for column, value in timer.summary().items()
+        if column != "ops/sec"
+    }
+
+
+async def main(args):
+    backends = {
+        "in_memory": in_memory_saver,
+        "redis": redis_saver,
+        "sqlite": lambda: sqlite_saver("NORMAL"),
+        "sqlite (FULL)": lambda: sqlite_saver("FULL"),
+    }
+    rows = []
+    for name, make_saver in backends.items():
+        async with make_saver() as saver:
+            rows.append({"backend": name, **await run(saver, args)})
+
+    print(
+        f"{args.threads} threads x {args.steps} super-steps, {args.tasks} tasks per step"
+    )
+    for operation in ("put step", "get latest", "list 10"):
+        print_table(rows, ["backend", f"{operation} p50 ms", f"{operation} p99 ms"])
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            parse_args(
+                __doc__.strip().splitlines()[0],
+                threads=dict(type=int, default=20),
+                steps=dict(type=int, default=20),
+                tasks=dict(type=int, default=3),
+            )
+        )
+    )
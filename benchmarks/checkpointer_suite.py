@@ -0,0 +1,563 @@
+"""
+Conformance checks and performance scenarios for every CheckpointerFactory backend.
+
+Each backend is created through `CheckpointerFactory.create_checkpointer`, with
+the same type and kwargs as in agent.yaml. The conformance checks run the same
+assertions against all of them: latest and older checkpoints, parents, pending
+writes and their retries, listing with filter, limit and before, namespaces
+and deletion. The scenarios then time put, put_writes, get latest, list with
+limit and before, reads of a long thread and reads across many threads.
+
+Redis backends use REDIS_URL when it is set (e.g. `make up`, or a local
+redis-server), otherwise an in-process fakeredis server stands in for Redis.
+
+The run fails when a check fails. Latencies are machine dependent, so they
+are only compared with a stored baseline with --compare-baseline: the run then
+also fails when the median latency of a scenario exceeds its baseline by more
+than --tolerance, 1.0 failing on twice the baseline. Baselines only compare
+runs on the same machine and Redis target, record one with --save-baseline
+after an intended change.
+
+Usage:
+    python benchmarks/checkpointer_suite.py
+    python benchmarks/checkpointer_suite.py --backends redis sqlite --save-baseline
+    python benchmarks/checkpointer_suite.py --compare-baseline
+"""
+
+import asyncio
+import json
+import os
+import platform
+import tempfile
+import traceback
+from contextlib import asynccontextmanager
+from pathlib import Path
+from unittest import mock
+
+from _common import Timer, parse_args, print_table
+
+BASELINE_PATH = (
+    Path(__file__).resolve().parent / "baselines" / "checkpointer_suite.json"
+)
+
+# Increases of the median latency ignored whatever the tolerance, timer noise
+MIN_REGRESSION_MS = 0.1
+
+# Factory type and kwargs of each backend, as configured in agent.yaml
+BACKENDS = {
+    "in_memory": ("in_memory", {}),
+    "redis": ("redis", {}),
+    "redis_schema2_msgpack": ("redis", {"key_schema": 2, "serde": "msgpack"}),
+    "redis_cache": ("redis", {"cache": {}}),
+    "redis_write_behind": ("redis", {"write_behind": {}}),
+    "tiered": ("tiered", {}),
+    "sqlite": ("sqlite", {}),
+}
+
+
+def fake_pool_from_url(url, **pool_kwargs):
+    """Stand-in for InstrumentedConnectionPool.from_url, connected to an in-process fakeredis."""
+    from fakeredis import FakeServer
+    from fakeredis.aioredis import FakeAsyncRedisConnection
+    from src.utils.redis_pool import InstrumentedConnectionPool
+
+    # fakeredis connections do not answer the PING health checks of redis-py
+    pool_kwargs.pop("health_check_interval", None)
+    return InstrumentedConnectionPool(
+        connection_class=FakeAsyncRedisConnection, server=FakeServer(), **pool_kwargs
+    )
+
+
+@asynccontextmanager
+async def factory_saver(checkpointer_type: str, kwargs: dict):
+    """A saver created by CheckpointerFactory, closed when the context exits."""
+    from src.utils.checkpointer_factory import CheckpointerFactory
+    from src.utils.redis_pool import InstrumentedConnectionPool
+
+    # AsyncRedisSaver.from_url builds the saver and its pool as in the application
+    with tempfile.TemporaryDirectory() as directory, mock.patch.object(
+        InstrumentedConnectionPool,
+        "from_url",
+        InstrumentedConnectionPool.from_url
+        if os.environ["REDIS_URL"]
+        else fake_pool_from_url,
+    ):
+        if checkpointer_type == "sqlite":
+            kwargs = {"path": os.path.join(directory, "checkpoints.sqlite"), **kwargs}
+        saver = await CheckpointerFactory.create_checkpointer(
+            checkpointer_type, **kwargs
+        )
+        try:
+            yield saver
+        finally:
+            await CheckpointerFactory.aclose()
+
+
+def thread_config(thread_id: str, checkpoint_ns: str = "") -> dict:
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}}
+
+
+def checkpoint_id(config: dict) -> str:
+    return config["configurable"]["checkpoint_id"]
+
+
+def next_checkpoint(checkpoint: dict, step: int) -> tuple:
+    """The checkpoint of a step, holding the last 10 messages, with its metadata."""
+    from langchain_core.messages import AIMessage
+    from langgraph.checkpoint.base import create_checkpoint
+
+    checkpoint = create_checkpoint(checkpoint, None, step)
+    checkpoint["channel_values"]["messages"] = [
+        AIMessage(content=f"message {idx}") for idx in range(max(0, step - 9), step + 1)
+    ]
+    checkpoint["channel_versions"]["messages"] = step + 1
+    metadata = {
+        "source": "loop" if step else "input",
+        "step": step,
+        "writes": None,
+        "parents": {},
+    }
+    return checkpoint, metadata
+
+
+async def put_steps(saver, config: dict, steps: int) -> list:
+    """
+    Save one run of `steps` checkpoints after the latest one of a thread.
+
+    The run ends with CheckpointerFactory.aflush, as in run_agent, so in
+    write-behind mode only its last checkpoint is saved.
+
+    Returns:
+        list: The configs of the checkpoints, oldest first.
+    """
+    from langgraph.checkpoint.base import empty_checkpoint
+    from src.utils.checkpointer_factory import CheckpointerFactory
+
+    checkpoint_tuple = await saver.aget_tuple(config)
+    if checkpoint_tuple is None:
+        checkpoint, first_step = empty_checkpoint(), 0
+    else:
+        checkpoint, config = checkpoint_tuple.checkpoint, checkpoint_tuple.config
+        first_step = checkpoint_tuple.metadata["step"] + 1
+    configs = []
+    for step in range(first_step, first_step + steps):
+        checkpoint, metadata = next_checkpoint(checkpoint, step)
+        config = await saver.aput(config, checkpoint, metadata, {"messages": step + 1})
+        configs.append(config)
+    await CheckpointerFactory.aflush(config["configurable"]["thread_id"])
+    return configs
+
+
+async def put_runs(saver, config: dict, runs: int) -> list:
+    """Save `runs` runs of a single checkpoint, returning their configs."""
+    return [(await put_steps(saver, config, 1))[0] for _ in range(runs)]
+
+
+# Conformance checks, each one on fresh threads of the saver
+
+
+async def check_empty_thread(saver):
+    assert await saver.aget_tuple(thread_config("empty")) is None
+    assert [c async for c in saver.alist(thread_config("empty"))] == []
+
+
+async def check_latest_and_parents(saver):
+    configs = await put_runs(saver, thread_config("latest"), 3)
+    latest = await saver.aget_tuple(thread_config("latest"))
+    assert checkpoint_id(latest.config) == checkpoint_id(configs[-1])
+    assert [m.content for m in latest.checkpoint["channel_values"]["messages"]] == [
+        "message 0",
+        "message 1",
+        "message 2",
+    ]
+    assert latest.metadata["step"] == 2 and latest.metadata["source"] == "loop"
+    assert checkpoint_id(latest.parent_config) == checkpoint_id(configs[1])
+    first = await saver.aget_tuple(configs[0])
+    assert checkpoint_id(first.config) == checkpoint_id(configs[0])
+    assert first.parent_config is None
+    assert len(first.checkpoint["channel_values"]["messages"]) == 1
+
+
+async def check_pending_writes(saver):
+    from langgraph.checkpoint.base import ERROR
+
+    (config,) = await put_steps(saver, thread_config("writes"), 1)
+    await saver.aput_writes(config, [("messages", "a0"), ("messages", "a1")], "task-a")
+    await saver.aput_writes(config, [("messages", "b0")], "task-b")
+    # A retried task never overwrites the regular writes of its previous attempt
+    await saver.aput_writes(config, [("messages", "retry")], "task-a")
+    # Special channels replace the earlier special writes of the task
+    await saver.aput_writes(config, [(ERROR, "first error")], "task-c")
+    await saver.aput_writes(config, [(ERROR, "second error")], "task-c")
+    checkpoint_tuple = await saver.aget_tuple(thread_config("writes"))
+    assert sorted(checkpoint_tuple.pending_writes) == [
+        ("task-a", "messages", "a0"),
+        ("task-a", "messages", "a1"),
+        ("task-b", "messages", "b0"),
+        ("task-c", ERROR, "second error"),
+    ], checkpoint_tuple.pending_writes
+    # Writes belong to their checkpoint only
+    (next_config,) = await put_steps(saver, thread_config("writes"), 1)
+    assert (await saver.aget_tuple(next_config)).pending_writes == []
+    assert len((await saver.aget_tuple(config)).pending_writes) == 4
+
+
+async def check_other_values(saver):
+    import decimal
+    import uuid
+
+    # Values other than messages go through JsonPlusSerializer in every format
+    value = {
+        "id": uuid.UUID(int=1),
+        "tags": {"a", "b"},
+        "amount": decimal.Decimal("1.5"),
+        "raw": b"bytes",
+    }
+    (config,) = await put_steps(saver, thread_config("values"), 1)
+    await saver.aput_writes(config, [("data", value)], "task")
+    checkpoint_tuple = await saver.aget_tuple(thread_config("values"))
+    assert checkpoint_tuple.pending_writes == [
+        ("task", "data", value)
+    ], checkpoint_tuple.pending_writes
+
+
+async def check_list(saver):
+    configs = await put_runs(saver, thread_config("list"), 7)
+    ids = [checkpoint_id(c) for c in reversed(configs)]
+
+    async def listed(**kwargs):
+        return [
+            checkpoint_id(c.config)
+            async for c in saver.alist(thread_config("list"), **kwargs)
+        ]
+
+    assert await listed() == ids
+    assert await listed(limit=3) == ids[:3]
+    assert await listed(before=configs[4]) == ids[3:]
+    assert await listed(before=configs[4], limit=2) == ids[3:5]
+    assert await listed(filter={"step": 5}) == [ids[1]]
+    assert await listed(filter={"source": "input"}) == [ids[-1]]
+    assert await listed(filter={"source": "loop", "step": 0}) == []
+    assert await listed(filter={"parents": {}}) == ids
+
+
+async def check_namespaces(saver):
+    await put_runs(saver, thread_config("namespaces"), 2)
+    (child,) = await put_steps(saver, thread_config("namespaces", "child"), 1)
+    latest = await saver.aget_tuple(thread_config("namespaces", "child"))
+    assert checkpoint_id(latest.config) == checkpoint_id(child)
+    assert len([c async for c in saver.alist(thread_config("namespaces"))]) == 2
+    assert (
+        len([c async for c in saver.alist(thread_config("namespaces", "child"))]) == 1
+    )
+
+
+async def check_delete_thread(saver):
+    await put_steps(saver, thread_config("deleted"), 2)
+    await put_steps(saver, thread_config("deleted", "child"), 1)
+    await put_steps(saver, thread_config("kept"), 1)
+    await saver.adelete_thread("deleted")
+    assert await saver.aget_tuple(thread_config("deleted")) is None
+    assert await saver.aget_tuple(thread_config("deleted", "child")) is None
+    assert await saver.aget_tuple(thread_config("kept")) is not None
+
+
+async def check_eviction_frees_memory(saver):
+    from src.utils.memory_checkpointer import (
+        BoundedMemorySaver,
+        MemoryLimits,
+        _blob_size,
+        _checkpoint_size,
+        _writes_size,
+    )
+
+    memory = saver
+    if not isinstance(memory, BoundedMemorySaver):
+        return
+    memory.limits = MemoryLimits(max_threads=2)
+    for _ in range(3):
+        for idx in range(10):
+            await put_steps(saver, thread_config(f"evicted-{idx}"), 2)
+    live = set(memory.storage)
+    assert len(live) == 2, live
+    # Channel values of evicted threads are freed with their checkpoints
+    assert {key[0] for key in memory.blobs} <= live
+    assert {key[0] for key in memory.writes} <= live
+    assert memory.stats()["bytes"] == (
+        sum(
+            _checkpoint_size(saved)
+            for namespaces in memory.storage.values()
+            for checkpoints in namespaces.values()
+            for saved in checkpoints.values()
+        )
+        + sum(_blob_size(blob) for blob in memory.blobs.values())
+        + sum(_writes_size(writes) for writes in memory.writes.values())
+    ), memory.stats()
+
+
+async def check_hot_tier_eviction(saver):
+    from src.utils.checkpoint_tiered import TieredCheckpointSaver
+    from src.utils.memory_checkpointer import MemoryLimits
+
+    if not isinstance(saver, TieredCheckpointSaver):
+        return
+    for idx in range(10):
+        await put_steps(saver, thread_config(f"hot-{idx}"), 3)
+    filled = saver.hot.stats()["bytes"], len(saver.hot.blobs)
+    saver.hot.limits = MemoryLimits(max_threads=2)
+    await put_steps(saver, thread_config("hot-last"), 1)
+    live = set(saver.hot.storage)
+    assert len(live) == 2, live
+    assert {key[0] for key in saver.hot.blobs} <= live
+    assert saver.hot.stats()["bytes"] < filled[0] / 2, (saver.hot.stats(), filled)
+    assert len(saver.hot.blobs) < filled[1] / 2, (len(saver.hot.blobs), filled)
+    # Evicted threads are still read from Redis
+    assert await saver.aget_tuple(thread_config("hot-0")) is not None
+
+
+async def check_read_after_refill(saver):
+    from langchain_core.messages import HumanMessage
+    from langgraph.checkpoint.base import create_checkpoint
+    from src.utils.checkpoint_tiered import TieredCheckpointSaver
+    from src.utils.checkpointer_factory import CheckpointerFactory
+
+    config = thread_config("refill")
+
+    def evict():
+        # The next read misses the hot tier, as after an eviction or a restart
+        if isinstance(saver, TieredCheckpointSaver):
+            saver.hot.delete_thread("refill")
+
+    async def put_step(checkpoint_tuple, values: dict) -> None:
+        """A run of one step updating `values`, the other channels unchanged."""
+        step = checkpoint_tuple.metadata["step"] + 1
+        checkpoint = create_checkpoint(checkpoint_tuple.checkpoint, None, step)
+        versions = {
+            channel: checkpoint["channel_versions"].get(channel, 0) + 1
+            for channel in values
+        }
+        checkpoint["channel_values"].update(values)
+        checkpoint["channel_versions"].update(versions)
+        metadata = {"source": "loop", "step": step, "writes": None, "parents": {}}
+        await saver.aput(checkpoint_tuple.config, checkpoint, metadata, versions)
+        await CheckpointerFactory.aflush("refill")
+
+    def appended(checkpoint_tuple, content: str) -> dict:
+        messages = checkpoint_tuple.checkpoint["channel_values"]["messages"]
+        return {"messages": [*messages, HumanMessage(content=content)]}
+
+    def contents(checkpoint_tuple) -> list:
+        return [
+            m.content for m in checkpoint_tuple.checkpoint["channel_values"]["messages"]
+        ]
+
+    await put_steps(saver, config, 2)
+    await put_step(await saver.aget_tuple(config), {"summary": "earlier"})
+    evict()
+    cold = await saver.aget_tuple(config)
+    hot = await saver.aget_tuple(config)
+    assert contents(cold) == ["message 0", "message 1"], contents(cold)
+    assert contents(hot) == contents(cold), contents(hot)
+    assert hot.checkpoint["channel_values"] == cold.checkpoint["channel_values"]
+
+    # A run after the refill builds on the whole history
+    await put_step(hot, appended(hot, "again"))
+    expected = ["message 0", "message 1", "again"]
+    latest = await saver.aget_tuple(config)
+    assert contents(latest) == expected, contents(latest)
+    assert latest.checkpoint["channel_values"]["summary"] == "earlier"
+    evict()
+    latest = await saver.aget_tuple(config)
+    assert contents(latest) == expected, contents(latest)
+
+    # A run writing to a thread the hot tier does not hold keeps its unchanged channels
+    evict()
+    await put_step(latest, appended(latest, "last"))
+    latest = await saver.aget_tuple(config)
+    assert contents(latest) == [*expected, "last"], contents(latest)
+    assert latest.checkpoint["channel_values"]["summary"] == "earlier"
+
+
+CHECKS = [
+    check_empty_thread,
+    check_latest_and_parents,
+    check_pending_writes,
+    check_other_values,
+    check_list,
+    check_namespaces,
+    check_delete_thread,
+    check_eviction_frees_memory,
+    check_hot_tier_eviction,
+    check_read_after_refill,
+]
+
+
+async def run_checks(backend: str) -> list:
+    """Run every check on a fresh saver of the backend, returning the failures."""
+    failures = []
+    for check in CHECKS:
+        async with factory_saver(*BACKENDS[backend]) as saver:
+            try:
+                await check(saver)
+            except Exception:
+                failures.append(
+                    f"{backend}: {check.__name__}\n{traceback.format_exc()}"
+                )
+    return failures
+
+
+# Performance scenarios
+
+
+async def run_scenarios(backend: str, args) -> dict:
+    """Time each scenario on a fresh saver of the backend."""
+    from langchain_core.messages import ToolMessage
+    from langgraph.checkpoint.base import empty_checkpoint
+    from src.utils.checkpointer_factory import CheckpointerFactory
+
+    timers = {
+        name: Timer()
+        for name in (
+            "put",
+            "put_writes",
+            "get latest",
+            "list limit",
+            "list before",
+            "long thread get",
+            "long thread list",
+            "many threads get",
+        )
+    }
+    async with factory_saver(*BACKENDS[backend]) as saver:
+        # A single run, checkpoints are only flushed at its end in write-behind mode
+        config, checkpoint = thread_config("scenarios"), empty_checkpoint()
+        for step in range(args.steps):
+            checkpoint, metadata = next_checkpoint(checkpoint, step)
+            with timers["put"].measure():
+                config = await saver.aput(
+                    config, checkpoint, metadata, {"messages": step + 1}
+                )
+            writes = [
+                ("messages", ToolMessage(content=f"output {step}", tool_call_id="call"))
+            ]
+            with timers["put_writes"].measure():
+                await saver.aput_writes(config, writes, f"task-{step}")
+            with timers["get latest"].measure():
+                await saver.aget_tuple(thread_config("scenarios"))
+        await CheckpointerFactory.aflush()
+        for _ in range(args.repeat):
+            with timers["list limit"].measure():
+                [c async for c in saver.alist(thread_config("scenarios"), limit=10)]
+            with timers["list before"].measure():
+                [
+                    c
+                    async for c in saver.alist(
+                        thread_config("scenarios"), before=config, limit=10
+                    )
+                ]
+
+        await put_runs(saver, thread_config("long"), args.long_steps)
+        for _ in range(args.repeat):
+            with timers["long thread get"].measure():
+                await saver.aget_tuple(thread_config("long"))
+            with timers["long thread list"].measure():
+                [c async for c in saver.alist(thread_config("long"))]
+
+        for thread in range(args.threads):
+            await put_steps(saver, thread_config(f"many-{thread}"), 2)
+        for thread in range(args.threads):
+            with timers["many threads get"].measure():
+                await saver.aget_tuple(thread_config(f"many-{thread}"))
+
+    return {scenario: timer.summary() for scenario, timer in timers.items()}
+
+
+def redis_target() -> str:
+    return "redis" if os.environ["REDIS_URL"] else "fakeredis"
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Scenarios whose median latency regressed by more than tolerance."""
+    regressions = []
+    for backend, scenarios in results.items():
+        for scenario, summary in scenarios.items():
+            expected = baseline.get(backend, {}).get(scenario)
+            if expected is None:
+                continue
+            if summary["p50 ms"] > max(
+                expected["p50 ms"] * (1 + tolerance),
+                expected["p50 ms"] + MIN_REGRESSION_MS,
+            ):
+                regressions.append(
+                    f"{backend} {scenario}: p50 {summary['p50 ms']:.3f} ms, "
+                    f"baseline {expected['p50 ms']:.3f} ms"
+                )
+    return regressions
+
+
+async def main(args) -> int:
+    failures, results = [], {}
+    for backend in args.backends:
+        failures.extend(await run_checks(backend))
+        results[backend] = await run_scenarios(backend, args)
+
+    print(f"Conformance: {len(CHECKS) * len(args.backends) - len(failures)} passed")
+    for failure in failures:
+        print(f"FAILED {failure}")
+    rows = [
+        {"backend": backend, "scenario": scenario, **summary}
+        for backend, scenarios in results.items()
+        for scenario, summary in scenarios.items()
+    ]
+    print(f"Redis: {redis_target()}")
+    print_table(rows, ["backend", "scenario", "ops/sec", "p50 ms", "p99 ms"])
+
+    target = {"redis": redis_target(), "machine": platform.node()}
+    if args.save_baseline:
+        BASELINE_PATH.parent.mkdir(exist_ok=True)
+        rounded = {
+            backend: {
+                scenario: {column: round(value, 3) for column, value in summary.items()}
+                for scenario, summary in scenarios.items()
+            }
+            for backend, scenarios in results.items()
+        }
+        BASELINE_PATH.write_text(
+            json.dumps({**target, "results": rounded}, indent=2) + "\n"
+        )
+        print(f"Baseline saved to {BASELINE_PATH}")
+    elif args.compare_baseline and BASELINE_PATH.exists():
+        baseline = json.loads(BASELINE_PATH.read_text())
+        if {key: baseline.get(key) for key in target} != target:
+            print(
+                f"Baseline recorded on {baseline.get('machine')} against "
+                f"{baseline.get('redis')}, latencies not compared"
+            )
+        else:
+            regressions = compare(results, baseline["results"], args.tolerance)
+            for regression in regressions:
+                print(f"REGRESSED {regression}")
+            failures.extend(regressions)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(
+        asyncio.run(
+            main(
+                parse_args(
+                    __doc__.strip().splitlines()[0],
+                    backends=dict(
+                        nargs="+", choices=list(BACKENDS), default=list(BACKENDS)
+                    ),
+                    steps=dict(type=int, default=100),
+                    long_steps=dict(type=int, default=300),
+                    threads=dict(type=int, default=200),
+                    repeat=dict(type=int, default=10),
+                    tolerance=dict(type=float, default=1.0),
+                    save_baseline=dict(action="store_true"),
+                    compare_baseline=dict(action="store_true"),
+                )
+            )
+        )
+    )
@@ -0,0 +1,105 @@
+"""
+End-to-end check of the Redis checkpointer in cluster mode.
+
+Saves, reads, lists, prunes and deletes a few threads through a saver created
+with `cluster=True`, and verifies that every key of a thread hashes to a single
+cluster slot, so that its scripts and transactions never span several nodes.
+Start a local cluster with `make cluster-up`; without REDIS_URL the check runs
+against a standalone fakeredis server, which only covers the key layout.
+
+Usage:
+    REDIS_URL=redis://localhost:7000 python benchmarks/redis_cluster_check.py --threads 8
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+from _common import Timer, connect_redis, parse_args, print_table
+
+
+@asynccontextmanager
+async def cluster_saver(key_schema: int):
+    """Saver in cluster mode, connected to REDIS_URL or to a fakeredis server."""
+    from src.utils.redis_checkpointer import AsyncRedisSaver
+
+    url = os.environ.get("REDIS_URL")
+    if url:
+        async with AsyncRedisSaver.from_url(
+            url=url, cluster=True, key_schema=key_schema
+        ) as saver:
+            yield saver
+    else:
+        conn, _ = connect_redis()
+        yield AsyncRedisSaver(conn, cluster=True, key_schema=key_schema)
+        await conn.aclose()
+
+
+async def thread_keys(saver, thread_id: str) -> list:
+    """Every key of a thread, found through its hash tag on all nodes."""
+    return [key async for key in saver.conn.scan_iter(match=f"*{{{thread_id}}}*")]
+
+
+async def check_thread(saver, thread_id: str, steps: int, timer: Timer) -> dict:
+    from langchain_core.messages import AIMessage
+    from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+    from redis.cluster import key_slot
+
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    checkpoint = empty_checkpoint()
+    for step in range(steps):
+        with timer.measure():
+            checkpoint = create_checkpoint(checkpoint, None, step)
+            checkpoint["channel_values"]["messages"] = [AIMessage(content=f"{step}")]
+            checkpoint["channel_versions"]["messages"] = step + 1
+            config = await saver.aput(
+                config, checkpoint, {"step": step}, {"messages": step + 1}
+            )
+            await saver.aput_writes(
+                config, [("messages", AIMessage(content=f"w{step}"))], "task"
+            )
+            checkpoint_tuple = await saver.aget_tuple(config)
+
+    assert checkpoint_tuple.checkpoint["id"] == checkpoint["id"]
+    assert checkpoint_tuple.checkpoint["channel_values"]["messages"][0].content == (
+        f"{steps - 1}"
+    )
+    assert len(checkpoint_tuple.pending_writes) == 1
+    listed = [c async for c in saver.alist(config)]
+    assert len(listed) == steps, f"{thread_id}: listed {len(listed)} of {steps}"
+
+    keys = await thread_keys(saver, thread_id)
+    slots = {key_slot(key) for key in keys}
+    assert len(slots) == 1, f"{thread_id}: keys span slots {sorted(slots)}"
+
+    await saver.aprune_thread(thread_id, "", keep_last_checkpoints=1)
+    assert len([c async for c in saver.alist(config)]) == 1
+    await saver.adelete_thread(thread_id)
+    assert not await thread_keys(saver, thread_id), f"{thread_id}: keys left"
+    return {"thread": thread_id, "keys": len(keys), "slot": slots.pop()}
+
+
+async def main(args):
+    url = os.environ.get("REDIS_URL") or "fakeredis (standalone)"
+    for key_schema in (1, 2):
+        timer = Timer()
+        async with cluster_saver(key_schema) as saver:
+            rows = [
+                await check_thread(saver, f"cluster-check-{idx}", args.steps, timer)
+                for idx in range(args.threads)
+            ]
+        print(f"{url}, key schema {key_schema}: {args.threads} threads ok")
+        print_table(rows, ["thread", "keys", "slot"])
+        print_table([timer.summary()], ["ops/sec", "p50 ms", "p99 ms"])
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            parse_args(
+                __doc__.strip().splitlines()[0],
+                threads=dict(type=int, default=8),
+                steps=dict(type=int, default=5),
+            )
+        )
+    )
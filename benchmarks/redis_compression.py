@@ -0,0 +1,117 @@
+"""
+Benchmark of the CPU cost versus the bytes saved by checkpoint compression.
+
+Conversation checkpoints of growing length are serialized with the saver's
+serializer, then compressed and decompressed with every installed codec. The
+smallest sizes where compression pays off are a good `threshold_bytes`.
+
+Usage:
+    python benchmarks/redis_compression.py --messages 2 8 32 128 --repeat 50
+"""
+
+import json
+
+from _common import Timer, parse_args, print_table
+
+
+def conversation_checkpoint(messages: int) -> dict:
+    """A checkpoint of a ReAct conversation, alternating user, tool and AI turns."""
+    from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+    from langgraph.checkpoint.base import empty_checkpoint
+
+    history = []
+    for turn in range(messages):
+        if turn % 3 == 0:
+            history.append(
+                HumanMessage(content=f"Could you look up the weather in city {turn}?")
+            )
+        elif turn % 3 == 1:
+            history.append(
+                AIMessage(
+                    content="",
+                    tool_calls=[
+                        {
+                            "name": "get_weather",
+                            "args": {"city": f"city {turn}", "unit": "celsius"},
+                            "id": f"call_{turn}",
+                        }
+                    ],
+                )
+            )
+        else:
+            history.append(
+                ToolMessage(
+                    content=json.dumps(
+                        {
+                            "city": f"city {turn}",
+                            "forecast": [
+                                {"day": day, "temperature": 20 + day, "sky": "clear"}
+                                for day in range(7)
+                            ],
+                        }
+                    ),
+                    tool_call_id=f"call_{turn - 1}",
+                )
+            )
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"messages": history}
+    return checkpoint
+
+
+def main(args):
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+    from src.utils.redis_compression import CODECS
+
+    serde = JsonPlusSerializer()
+    rows = []
+    for messages in args.messages:
+        checkpoint = conversation_checkpoint(messages)
+        serialize_timer = Timer()
+        for _ in range(args.repeat):
+            with serialize_timer.measure():
+                _, raw = serde.dumps_typed(checkpoint)
+        for codec, (compress, decompress) in sorted(CODECS.items()):
+            compress_timer, decompress_timer = Timer(), Timer()
+            for _ in range(args.repeat):
+                with compress_timer.measure():
+                    compressed = compress(raw, args.level)
+                with decompress_timer.measure():
+                    decompress(compressed)
+            rows.append(
+                {
+                    "messages": messages,
+                    "codec": codec,
+                    "raw bytes": len(raw),
+                    "stored bytes": len(compressed),
+                    "saved %": 100 * (1 - len(compressed) / len(raw)),
+                    "serialize ms": serialize_timer.percentile(50),
+                    "compress ms": compress_timer.percentile(50),
+                    "decompress ms": decompress_timer.percentile(50),
+                }
+            )
+
+    print(f"Median latency per checkpoint over {args.repeat} runs")
+    print_table(
+        rows,
+        [
+            "messages",
+            "codec",
+            "raw bytes",
+            "stored bytes",
+            "saved %",
+            "serialize ms",
+            "compress ms",
+            "decompress ms",
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main(
+        parse_args(
+            __doc__.strip().splitlines()[0],
+            messages=dict(type=int, nargs="+", default=[2, 8, 32, 128]),
+            repeat=dict(type=int, default=50),
+            level=dict(type=int, default=None),
+        )
+    )
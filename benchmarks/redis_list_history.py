@@ -0,0 +1,103 @@
+"""
+Benchmark of listing the history of a thread with alist versus alist_metadata.
+
+A conversation thread is saved one turn per checkpoint, each checkpoint holding
+the whole conversation so far, as a ReAct agent does. The full history is then
+listed with `alist`, which loads every checkpoint with its channel values and
+pending writes, and with `alist_metadata`, which only reads the metadata.
+
+Usage:
+    python benchmarks/redis_list_history.py --steps 50 200 --repeat 5
+"""
+
+import asyncio
+import time
+import tracemalloc
+
+from _common import Timer, connect_redis, parse_args, print_table
+from redis_compression import conversation_checkpoint
+
+
+async def save_thread(saver, thread_id: str, steps: int) -> dict:
+    from langchain_core.messages import AIMessage
+    from langgraph.checkpoint.base import create_checkpoint
+
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    checkpoint = conversation_checkpoint(0)
+    for step in range(steps):
+        checkpoint = create_checkpoint(checkpoint, None, step)
+        checkpoint["channel_values"]["messages"] = conversation_checkpoint(
+            3 * (step + 1)
+        )["channel_values"]["messages"]
+        checkpoint["channel_versions"]["messages"] = step + 1
+        config = await saver.aput(
+            config,
+            checkpoint,
+            {"source": "loop", "step": step, "writes": None},
+            {"messages": step + 1},
+        )
+        await saver.aput_writes(
+            config, [("messages", AIMessage(content=f"turn {step}"))], "task"
+        )
+    return config
+
+
+async def measure(list_history, config, repeat: int) -> dict:
+    timer = Timer()
+    cpu_seconds = 0.0
+    for _ in range(repeat):
+        cpu_start = time.process_time()
+        with timer.measure():
+            listed = [item async for item in list_history(config)]
+        cpu_seconds += time.process_time() - cpu_start
+
+    tracemalloc.start()
+    listed = [item async for item in list_history(config)]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "checkpoints": len(listed),
+        "p50 ms": timer.percentile(50),
+        "cpu ms": 1000 * cpu_seconds / repeat,
+        "peak MiB": peak / 2**20,
+    }
+
+
+async def main(args):
+    from src.utils.redis_checkpointer import AsyncRedisSaver
+
+    conn, _ = connect_redis()
+    saver = AsyncRedisSaver(conn)
+    rows = []
+    for steps in args.steps:
+        thread_id = f"history-{steps}"
+        await save_thread(saver, thread_id, steps)
+        thread_config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+        for api, list_history in (
+            ("alist", saver.alist),
+            ("alist_metadata", saver.alist_metadata),
+        ):
+            rows.append(
+                {
+                    "steps": steps,
+                    "api": api,
+                    **await measure(list_history, thread_config, args.repeat),
+                }
+            )
+        await saver.adelete_thread(thread_id)
+    await conn.aclose()
+
+    print(f"Listing the full history of a thread, median of {args.repeat} runs")
+    print_table(rows, ["steps", "api", "checkpoints", "p50 ms", "cpu ms", "peak MiB"])
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            parse_args(
+                __doc__.strip().splitlines()[0],
+                steps=dict(type=int, nargs="+", default=[50, 200]),
+                repeat=dict(type=int, default=5),
+            )
+        )
+    )
@@ -0,0 +1,109 @@
+"""
+Microbenchmark of the Redis round-trips spent persisting a ReAct super-step.
+
+A super-step is one `aput` followed by one `aput_writes` per task. The scripted
+`aput_writes` is compared against the previous implementation, which issued an
+HSET per write, or an HSETNX per field, sequentially.
+
+Usage:
+    python benchmarks/redis_put_writes.py --steps 200 --tasks 3 --writes 4
+"""
+
+import asyncio
+
+from _common import Timer, connect_redis, parse_args, print_table
+
+
+async def legacy_put_writes(saver, config, writes, task_id):
+    """The pre-script implementation of AsyncRedisSaver.aput_writes."""
+    from langgraph.checkpoint.base import WRITES_IDX_MAP
+    from src.utils.redis_checkpointer import _make_redis_checkpoint_writes_key
+
+    configurable = config["configurable"]
+    for idx, (channel, value) in enumerate(writes):
+        key = _make_redis_checkpoint_writes_key(
+            configurable["thread_id"],
+            configurable["checkpoint_ns"],
+            configurable["checkpoint_id"],
+            task_id,
+            WRITES_IDX_MAP.get(channel, idx),
+        )
+        type_, serialized_value = saver.serde.dumps_typed(value)
+        data = {"channel": channel, "type": type_, "value": serialized_value}
+        if all(w[0] in WRITES_IDX_MAP for w in writes):
+            await saver.conn.hset(key, mapping=data)
+        else:
+            for field, value in data.items():
+                await saver.conn.hsetnx(key, field, value)
+
+
+async def run(args, put_writes, label):
+    from langchain_core.messages import AIMessage, ToolMessage
+    from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+    from src.utils.redis_checkpointer import AsyncRedisSaver
+
+    conn, counter = connect_redis()
+    saver = AsyncRedisSaver(conn)
+    await conn.ping()
+    config = {"configurable": {"thread_id": label, "checkpoint_ns": ""}}
+    checkpoint = empty_checkpoint()
+    timer = Timer()
+    counter.round_trips = 0
+
+    for step in range(args.steps):
+        with timer.measure():
+            checkpoint = create_checkpoint(checkpoint, None, step)
+            config = await saver.aput(config, checkpoint, {"step": step}, {})
+            for task in range(args.tasks):
+                writes = [
+                    (
+                        "messages",
+                        ToolMessage(
+                            content=f"tool output {step}/{task}/{idx}",
+                            tool_call_id=f"call_{idx}",
+                        )
+                        if idx
+                        else AIMessage(content=f"step {step}"),
+                    )
+                    for idx in range(args.writes)
+                ]
+                await put_writes(saver, config, writes, f"task-{task}")
+
+    await conn.aclose()
+    return {
+        "implementation": label,
+        "round-trips/step": counter.round_trips / args.steps,
+        **timer.summary(),
+    }
+
+
+async def main(args):
+    rows = [
+        await run(args, legacy_put_writes, "legacy"),
+        await run(
+            args,
+            lambda saver, config, writes, task_id: saver.aput_writes(
+                config, writes, task_id
+            ),
+            "scripted",
+        ),
+    ]
+    print(
+        f"{args.steps} super-steps, {args.tasks} tasks x {args.writes} writes per step"
+    )
+    print_table(
+        rows, ["implementation", "round-trips/step", "ops/sec", "p50 ms", "p99 ms"]
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            parse_args(
+                __doc__.strip().splitlines()[0],
+                steps=dict(type=int, default=200),
+                tasks=dict(type=int, default=3),
+                writes=dict(type=int, default=4),
+            )
+        )
+    )
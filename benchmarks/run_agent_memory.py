@@ -0,0 +1,213 @@
+"""
+Benchmark of the memory a request to run_agent allocates on long threads.
+
+A thread is seeded with a long conversation, then each request runs one turn
+of the agent in which the model calls a tool --tool-calls times before it
+answers. `run_agent` consumes the `updates` stream, which only holds the
+messages each node writes, and keeps the last AI response. It is compared with
+the former consumer, which appended every `values` event, a snapshot of the
+whole state, to a list and searched it for the response once the run ended.
+
+The model is a fake chat model and the checkpointer is in memory, so memory
+only covers the graph and the consumer. "held" is what the request still holds
+once the graph has run, besides the checkpoints it saved: the events the legacy
+consumer kept alive reference the whole history of the thread, while
+`run_agent` only holds its response and stays flat as the history grows.
+"peak" also counts the graph loading and saving the state of the thread on
+every step, which grows with the history in both cases.
+
+Usage:
+    python benchmarks/run_agent_memory.py --history 10 100 1000 --tool-calls 5
+    python benchmarks/run_agent_memory.py --template prebuilt-react-agent
+"""
+
+import asyncio
+import gc
+import itertools
+import tracemalloc
+from unittest import mock
+
+from _common import parse_args, print_table
+
+
+def fake_model(tool_calls: int):
+    """A chat model calling get_weather tool_calls times, then answering."""
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    ids = itertools.count()
+
+    class FakeToolCallingModel(BaseChatModel):
+        @property
+        def _llm_type(self) -> str:
+            return "fake-tool-calling"
+
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            turn = list(
+                itertools.takewhile(
+                    lambda message: not isinstance(message, HumanMessage),
+                    reversed(messages),
+                )
+            )
+            called = sum(isinstance(message, ToolMessage) for message in turn)
+            if called < tool_calls:
+                message = AIMessage(
+                    content="",
+                    tool_calls=[
+                        {
+                            "name": "get_weather",
+                            "args": {"location": "sf"},
+                            "id": f"call-{next(ids)}",
+                        }
+                    ],
+                )
+            else:
+                message = AIMessage(content="It's always sunny in sf")
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+    return FakeToolCallingModel()
+
+
+def history(size: int) -> list:
+    """A past conversation of about size messages, in whole turns of 4 messages."""
+    from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+    messages = []
+    for turn in range(max(size // 4, 1)):
+        call_id = f"history-{turn}"
+        messages += [
+            HumanMessage(content=f"What is the weather in sf? (turn {turn})"),
+            AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": "get_weather", "args": {"location": "sf"}, "id": call_id}
+                ],
+            ),
+            ToolMessage(content="It's always sunny in sf", tool_call_id=call_id),
+            AIMessage(content="It's always sunny in sf. " * 20),
+        ]
+    return messages
+
+
+async def legacy_run_agent(thread_id: str, user_input: str) -> dict:
+    """run_agent as it was: every `values` event collected, then searched."""
+    from langchain_core.messages import AIMessage
+
+    from src.core.graphs.graph_builder import GraphBuilder
+    from src.utils.chat import get_message_text
+
+    graph = await GraphBuilder.get_graph()
+    config = {"configurable": {"thread_id": thread_id}}
+    events = []
+    async for event in graph.astream(
+        {"messages": [("user", user_input)]}, config=config, stream_mode="values"
+    ):
+        events.append(event)
+
+    for event in reversed(events):
+        if event.get("messages"):
+            last_message = event["messages"][-1]
+            if isinstance(last_message, AIMessage) and not last_message.tool_calls:
+                return {"response": get_message_text(last_message)}
+    return {"response": None}
+
+
+def allocated(snapshot) -> int:
+    """Bytes allocated in a snapshot, except for serialized checkpoints."""
+    snapshot = snapshot.filter_traces(
+        [
+            tracemalloc.Filter(False, "*/langgraph/checkpoint/serde/*"),
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ]
+    )
+    return sum(stat.size for stat in snapshot.statistics("filename"))
+
+
+async def measure(run, graph, as_node: str, size: int, repeat: int) -> dict:
+    peaks, held = [], []
+    astream = graph.astream
+
+    async def measured_astream(*args, **kwargs):
+        async for event in astream(*args, **kwargs):
+            yield event
+        # The graph has run, what is allocated since the request started and still
+        # alive is held by the request, besides the checkpoints it saved
+        gc.collect()
+        held.append(allocated(tracemalloc.take_snapshot()) - allocated(start))
+
+    with mock.patch.object(graph, "astream", measured_astream):
+        for attempt in range(repeat):
+            thread_id = f"{run.__name__}-{size}-{attempt}"
+            config = {"configurable": {"thread_id": thread_id}}
+            await graph.aupdate_state(config, {"messages": history(size)}, as_node)
+
+            tracemalloc.start()
+            start = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            result = await run(thread_id, "Weather in sf?")
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            assert result["response"], result
+
+    return {
+        "held KiB": min(held) / 2**10,
+        "peak MiB": min(peaks) / 2**20,
+    }
+
+
+async def main(args):
+    from src.config import settings
+
+    # Keep checkpoints in process, the benchmark measures the request itself
+    settings.AGENT_CONFIG["checkpointer"] = {"type": "in_memory"}
+
+    from src.core.agents import agent_factory
+    from src.core.graphs import graph_builder
+
+    model = fake_model(args.tool_calls)
+    if hasattr(graph_builder, "MODEL"):
+        patch = mock.patch.object(graph_builder, "MODEL", model)
+    else:
+        from src.core.nodes import call_model
+
+        patch = mock.patch.object(call_model, "TOOL_ENABLED_MODEL", model)
+
+    rows = []
+    # run_agent pretty prints every message, which is not what is measured here
+    with patch, mock.patch.object(agent_factory, "print_event", lambda event: None):
+        graph = await graph_builder.GraphBuilder.get_graph()
+        as_node = "call_model" if "call_model" in graph.nodes else "agent"
+        for size in args.history:
+            for name, run in (
+                ("values (legacy)", legacy_run_agent),
+                ("updates", agent_factory.run_agent),
+            ):
+                rows.append(
+                    {
+                        "history": size,
+                        "consumer": name,
+                        **await measure(run, graph, as_node, size, args.repeat),
+                    }
+                )
+
+    print(
+        f"\nrun_agent memory ({args.template}, {args.tool_calls} tool calls per request)"
+    )
+    print_table(rows, ["history", "consumer", "held KiB", "peak MiB"])
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            parse_args(
+                __doc__.splitlines()[1],
+                history=dict(type=int, nargs="+", default=[10, 100, 1000]),
+                tool_calls=dict(type=int, default=5),
+                repeat=dict(type=int, default=3),
+            )
+        )
+    )
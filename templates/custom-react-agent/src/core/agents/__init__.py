@@ -1,4 +1,4 @@
-from src.core.agents.agent_factory import run_agent
+from src.core.agents.agent_factory import run_agent, stream_agent
 from src.core.agents.model_provider import MODEL, TOOL_ENABLED_MODEL
 
-__all__ = ["run_agent", "MODEL", "TOOL_ENABLED_MODEL"]
+__all__ = ["run_agent", "stream_agent", "MODEL", "TOOL_ENABLED_MODEL"]
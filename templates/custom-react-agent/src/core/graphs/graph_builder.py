@@ -20,6 +20,10 @@ from src.utils.logger import logger
 from src.core.graphs.utils import convert_special_nodes
 from src.utils.checkpointer_factory import CheckpointerFactory
 
+# The node trimming the history to the `history` budget, and the model node it runs before
+HISTORY_NODE = "manage_history"
+MODEL_NODE = "call_model"
+
 
 class GraphBuilder:
     """
@@ -68,6 +72,49 @@ class GraphBuilder:
             instance._graph = await cls._build(instance)
         return instance._graph
 
+    def _wire_history(self):
+        """
+        Run the manage_history node before every model call when `history` is configured.
+
+        Without it, call_model sends the whole history whatever the budget. Graphs
+        listing the node are left as they are, in the others every route to
+        call_model, entry point included, goes through manage_history first.
+        """
+        if not self.agent_config.get("history"):
+            return
+        node_names = {node["name"] for node in self.agent_config["nodes"]}
+        if HISTORY_NODE in node_names:
+            return
+        if MODEL_NODE not in node_names:
+            raise ValueError(
+                f"`history` is configured but the graph has no {MODEL_NODE} node "
+                f"to run {HISTORY_NODE} before"
+            )
+
+        def reroute(target):
+            return HISTORY_NODE if target == MODEL_NODE else target
+
+        self.agent_config = {
+            **self.agent_config,
+            "nodes": [*self.agent_config["nodes"], {"name": HISTORY_NODE}],
+            "edges": [
+                *(
+                    {**edge, "to": reroute(edge["to"])}
+                    for edge in self.agent_config["edges"]
+                ),
+                {"from": HISTORY_NODE, "to": MODEL_NODE},
+            ],
+            "conditional_edges": [
+                {
+                    **cond_edge,
+                    "mapping": {k: reroute(v) for k, v in cond_edge["mapping"].items()},
+                }
+                for cond_edge in self.agent_config["conditional_edges"]
+            ],
+            "entry_point": reroute(self.agent_config["entry_point"]),
+        }
+        logger.info(f"Added the {HISTORY_NODE} node before every {MODEL_NODE} call")
+
     def _add_nodes(self):
         """
         Add processing nodes to the graph from configuration.
@@ -168,6 +215,7 @@ class GraphBuilder:
         """
         if instance._graph is None:
             # Build the graph structure
+            instance._wire_history()
             instance._add_nodes()
             instance._add_edges()
             instance._add_conditional_edges()
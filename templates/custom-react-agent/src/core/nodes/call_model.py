@@ -1,6 +1,17 @@
+from langchain_core.messages import SystemMessage
 from langchain_core.runnables import RunnableConfig
+from src.config import settings
 from src.models.state import AgentState
 from src.core.agents.model_provider import TOOL_ENABLED_MODEL
+from src.core.nodes.manage_history import model_messages
+from src.utils.logger import logger
+
+# Built once: the same message starts every model call, so providers can cache the
+# prompt prefix. It is not part of the state, so it is never saved in a thread
+SYSTEM_PROMPT = SystemMessage(
+    content=settings.AGENT_CONFIG.get("prompt", "You are a helpful assistant.")
+)
+logger.debug("System Prompt for custom React Agent: %s", SYSTEM_PROMPT.content)
 
 
 async def call_model(
@@ -11,7 +22,10 @@ async def call_model(
     Asynchronously invokes the language model with the provided messages and configuration.
 
     This function takes the current state of the agent, which includes the messages to be processed,
-    and a configuration object that may contain additional parameters for the invocation.
+    and a configuration object that may contain additional parameters for the invocation. The system
+    prompt is sent before the messages of the state, without being added to them. When the history is
+    trimmed, only the messages picked by the manage_history node are sent, after the summary of the
+    older ones.
 
     Args:
         state (AgentState): The current state of the agent, which includes the messages to be sent to the model.
@@ -22,8 +36,11 @@ async def call_model(
         dict: A dictionary containing the model's response wrapped in a 'messages' key. The response is
               expected to be a single message generated by the model based on the input messages.
     """
-    # Invoke the language model asynchronously with the messages from the state and the provided configuration
-    response = await TOOL_ENABLED_MODEL.ainvoke(state["messages"], config)
+    # Invoke the language model asynchronously with the system prompt, the messages from the state and the
+    # provided configuration
+    response = await TOOL_ENABLED_MODEL.ainvoke(
+        [SYSTEM_PROMPT, *model_messages(state)], config
+    )
 
     # Return the response in a structured format, wrapping it in a list under the 'messages' key
     return {"messages": [response]}
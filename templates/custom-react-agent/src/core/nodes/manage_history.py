@@ -0,0 +1,66 @@
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from src.config import settings
+from src.models.state import AgentState
+from src.core.agents.model_provider import MODEL
+from src.utils.history import HistoryManager, HistoryWindow
+
+# None when agent.yaml has no `history` section: the whole history is sent
+HISTORY_MANAGER = HistoryManager.from_config(settings.get("history"), MODEL)
+
+
+async def manage_history(
+    state: AgentState,
+    config: RunnableConfig,
+):
+    """
+    Asynchronously picks the messages of the thread sent to the next model call.
+
+    This function trims the history to the token budget configured under `history` in agent.yaml
+    and, when `summarize` is set, folds the messages left out into a rolling summary. The messages
+    of the state are left untouched: only the id of the first message sent and the summary are
+    saved, for `call_model` to build its input with `model_messages`.
+
+    Args:
+        state (AgentState): The current state of the agent, which includes the messages of the thread.
+        config (RunnableConfig): Configuration settings for the invocation.
+
+    Returns:
+        dict: The updated `history_start`, `summary` and `summarized_until` of the state, empty
+              when they did not change or the history is not trimmed.
+    """
+    if HISTORY_MANAGER is None:
+        return {}
+
+    messages = state["messages"]
+    window = await HISTORY_MANAGER.apply(
+        messages, state.get("summary"), state.get("summarized_until")
+    )
+    update = {
+        "history_start": messages[window.start].id if messages else None,
+        "summary": window.summary,
+        "summarized_until": window.summarized_until,
+    }
+    # Only write the values that changed, to keep them out of the next checkpoints
+    return {key: value for key, value in update.items() if state.get(key) != value}
+
+
+def model_messages(state: AgentState) -> list[BaseMessage]:
+    """
+    The messages of the thread sent to the model, as picked by `manage_history`.
+
+    Args:
+        state (AgentState): The current state of the agent.
+
+    Returns:
+        list[BaseMessage]: The summary, if any, followed by the messages from `history_start` on,
+                           or every message when the history is not trimmed.
+    """
+    messages = state["messages"]
+    if HISTORY_MANAGER is None:
+        return messages
+    start = max(HISTORY_MANAGER.find(messages, state.get("history_start")), 0)
+    return HISTORY_MANAGER.model_input(
+        messages,
+        HistoryWindow(start, state.get("summary"), state.get("summarized_until")),
+    )
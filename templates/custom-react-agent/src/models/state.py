@@ -1,4 +1,6 @@
 # NOTE: This file will always be there
+from typing import Optional
+
 from langgraph.graph import MessagesState
 
 
@@ -13,6 +15,11 @@ class AgentState(MessagesState):
     Attributes:
         messages (list): A list of messages that represent the conversation history or state of the agent.
                          This is inherited from the MessagesState class.
+        history_start (str): Id of the first message sent to the model, set by the manage_history node.
+        summary (str): Rolling summary of the messages before history_start, when summarizing is enabled.
+        summarized_until (str): Id of the last message the summary covers.
     """
 
-    pass
+    history_start: Optional[str]
+    summary: Optional[str]
+    summarized_until: Optional[str]
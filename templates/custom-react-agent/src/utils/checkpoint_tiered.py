@@ -0,0 +1,288 @@
+"""
+Tiered checkpointer: a bounded in-process hot tier over the Redis cold tier.
+
+With sticky sessions, the threads a process serves are mostly read back by
+that same process. The hot tier keeps the checkpoints and pending writes of
+these threads in a BoundedMemorySaver, evicting least recently used threads,
+and serves reads of the threads it holds without a round-trip to Redis.
+Writes go through to Redis first, which stays the source of truth for
+durability and failover, then to the hot tier. Reads missing the hot tier are
+served from Redis and refill it.
+
+Every thread of the hot tier is tagged with the version Redis returned for its
+latest write or read. With `verify`, a single GET per read checks that no other
+process wrote to the thread since, e.g. after a session moved to another pod
+and back, and drops the thread from the hot tier when one did.
+"""
+
+from collections import defaultdict
+from typing import Any, AsyncIterator, List, Optional, Tuple, Union
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from pydantic import Field
+
+from src.utils.memory_checkpointer import BoundedMemorySaver, MemoryLimits
+from src.utils.redis_checkpointer import AsyncRedisSaver
+from src.utils.redis_compression import CompressedSerializer
+
+
+class TieredSettings(MemoryLimits):
+    """
+    Hot tier settings, configured under `checkpointer.kwargs.hot_tier` in agent.yaml.
+
+    Attributes:
+        max_threads (Optional[int]): Threads kept in the hot tier.
+        max_bytes (Optional[int]): Serialized checkpoints and writes kept in the hot tier,
+            in bytes.
+        thread_ttl_seconds (Optional[float]): Threads unused for this long are evicted.
+        verify (bool): Check the version of the thread in Redis before serving it from the
+            hot tier. Only disable it when a thread is never written by two processes.
+    """
+
+    max_threads: Optional[int] = Field(default=1024, ge=1)
+    max_bytes: Optional[int] = Field(default=256 * 2**20, ge=1)
+    verify: bool = True
+
+
+class _HotTier(BoundedMemorySaver):
+    """BoundedMemorySaver forgetting the Redis versions of the threads it drops."""
+
+    def __init__(self, limits: MemoryLimits, versions: dict, **kwargs):
+        super().__init__(limits, **kwargs)
+        self.versions = versions
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        self.versions.pop(thread_id, None)
+
+
+class TieredCheckpointSaver(BaseCheckpointSaver):
+    """
+    Saver serving reads from an in-memory hot tier and writing through to an AsyncRedisSaver.
+
+    Listing checkpoints always reads Redis. Methods other than the checkpoint
+    API are forwarded to the wrapped saver.
+
+    Attributes:
+        saver (AsyncRedisSaver): Cold tier, the checkpoints are written to it first.
+        settings (TieredSettings): Size and coherence of the hot tier.
+        hot (BoundedMemorySaver): Hot tier.
+        hot_hits (int): Reads served from the hot tier.
+        cold_hits (int): Reads served from Redis.
+        cold_misses (int): Reads of checkpoints Redis does not have either.
+    """
+
+    def __init__(
+        self,
+        saver: AsyncRedisSaver,
+        settings: Union[TieredSettings, dict, None] = None,
+    ):
+        super().__init__(serde=saver.serde)
+        if settings is None:
+            settings = TieredSettings()
+        elif isinstance(settings, dict):
+            settings = TieredSettings(**settings)
+        self.saver = saver
+        self.settings = settings
+        self.hot_hits = 0
+        self.cold_hits = 0
+        self.cold_misses = 0
+        # thread_id -> checkpoint_ns -> version of the thread in Redis the hot tier
+        # is up to date with. Namespaces in the hot tier always have one.
+        self._versions: dict[str, dict[str, int]] = {}
+        serde = saver.serde
+        # Values are not compressed in memory
+        if isinstance(serde, CompressedSerializer):
+            serde = serde.serde
+        self.hot = _HotTier(settings, self._versions, serde=serde)
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "saver":
+            raise AttributeError(name)
+        return getattr(self.saver, name)
+
+    @property
+    def config_specs(self) -> list:
+        return self.saver.config_specs
+
+    def get_next_version(self, current: Optional[Any], channel: Any) -> Any:
+        return self.saver.get_next_version(current, channel)
+
+    def stats(self) -> dict:
+        """Hot tier size and the hit ratio of each tier, e.g. for metrics."""
+        reads = self.hot_hits + self.cold_hits + self.cold_misses
+        cold_reads = self.cold_hits + self.cold_misses
+        return {
+            **self.hot.stats(),
+            "hot_hits": self.hot_hits,
+            "cold_hits": self.cold_hits,
+            "cold_misses": self.cold_misses,
+            "hot_hit_ratio": self.hot_hits / reads if reads else None,
+            "cold_hit_ratio": self.cold_hits / cold_reads if cold_reads else None,
+        }
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Get a checkpoint tuple from the hot tier, or from Redis and refill the hot tier."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        known = self._version(thread_id, checkpoint_ns)
+        version = (
+            await self.saver.aget_version(thread_id, checkpoint_ns)
+            if self.settings.verify or known is None
+            else known
+        )
+        if known is not None and known != version:
+            # Another process wrote to the thread
+            self.hot.delete_thread(thread_id)
+        elif known is not None:
+            checkpoint_tuple = self.hot.get_tuple(config)
+            if checkpoint_tuple is not None:
+                self.hot_hits += 1
+                return checkpoint_tuple
+
+        checkpoint_tuple = await self.saver.aget_tuple(config)
+        if checkpoint_tuple is None:
+            self.cold_misses += 1
+            return None
+        self.cold_hits += 1
+        # An older checkpoint alone would be served as the latest one, so it only
+        # joins a thread whose latest checkpoint is in the hot tier. The version was
+        # read first, a concurrent write can only cause an extra refill.
+        if checkpoint_id is None or self._version(thread_id, checkpoint_ns) == version:
+            self._refill(checkpoint_tuple)
+            self._versions.setdefault(thread_id, {})[checkpoint_ns] = version
+        return checkpoint_tuple
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """List checkpoints from Redis, the hot tier only holds part of the history."""
+        async for checkpoint_tuple in self.saver.alist(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Save a checkpoint to Redis, then to the hot tier."""
+        next_config, version = await self.saver._aput(
+            config, checkpoint, metadata, new_versions
+        )
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        known = self._version(thread_id, checkpoint_ns)
+        if known is not None and known != version - 1:
+            # Another process wrote to the thread in between
+            self.hot.delete_thread(thread_id)
+        self.hot.put(
+            config,
+            checkpoint,
+            metadata,
+            self._hot_versions(thread_id, checkpoint_ns, checkpoint, new_versions),
+        )
+        self._versions.setdefault(thread_id, {})[checkpoint_ns] = version
+        return next_config
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: List[Tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        """Save writes to Redis, then to the hot tier if their checkpoint is in it."""
+        version = await self.saver._aput_writes(config, writes, task_id)
+        if version is None:
+            return
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        known = self._version(thread_id, checkpoint_ns)
+        if known is None:
+            return
+        if known != version - 1:
+            # Another process wrote to the thread in between
+            self.hot.delete_thread(thread_id)
+            return
+        self._versions[thread_id][checkpoint_ns] = version
+        if config["configurable"]["checkpoint_id"] in self.hot.storage.get(
+            thread_id, {}
+        ).get(checkpoint_ns, {}):
+            self.hot.put_writes(config, writes, task_id)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Delete a thread from both tiers."""
+        self.hot.delete_thread(thread_id)
+        await self.saver.adelete_thread(thread_id)
+
+    def _version(self, thread_id: str, checkpoint_ns: str) -> Optional[int]:
+        """Version the hot tier is up to date with, None if the thread is not in it."""
+        return self._versions.get(thread_id, {}).get(checkpoint_ns)
+
+    def _hot_versions(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        checkpoint: Checkpoint,
+        new_versions: ChannelVersions,
+    ) -> ChannelVersions:
+        """
+        Versions of the channels to store with a checkpoint put to the hot tier.
+
+        The hot tier only stores the values of the channels it is given, and
+        reads the others from the blobs of earlier checkpoints. Channels whose
+        blob it does not hold, e.g. unchanged since a checkpoint it never had,
+        are stored too so that it serves the whole state.
+        """
+        return {
+            **{
+                channel: version
+                for channel, version in checkpoint["channel_versions"].items()
+                if (thread_id, checkpoint_ns, channel, version) not in self.hot.blobs
+            },
+            **new_versions,
+        }
+
+    def _refill(self, checkpoint_tuple: CheckpointTuple):
+        """Add a checkpoint read from Redis, with its pending writes, to the hot tier."""
+        configurable = checkpoint_tuple.config["configurable"]
+        self.hot.put(
+            checkpoint_tuple.parent_config
+            or {
+                "configurable": {
+                    "thread_id": configurable["thread_id"],
+                    "checkpoint_ns": configurable["checkpoint_ns"],
+                }
+            },
+            checkpoint_tuple.checkpoint,
+            checkpoint_tuple.metadata,
+            # Every channel, for the checkpoint to be served whole from the hot tier
+            checkpoint_tuple.checkpoint["channel_versions"],
+        )
+        # Regular writes of a task first, so that they keep the index they were saved with
+        writes_by_task = defaultdict(list)
+        for task_id, channel, value in sorted(
+            checkpoint_tuple.pending_writes or [],
+            key=lambda write: write[1] in WRITES_IDX_MAP,
+        ):
+            writes_by_task[task_id].append((channel, value))
+        for task_id, writes in writes_by_task.items():
+            self.hot.put_writes(checkpoint_tuple.config, writes, task_id)
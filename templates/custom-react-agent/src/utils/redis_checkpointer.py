@@ -1,12 +1,21 @@
 """Implementation of a langgraph checkpoint saver using Redis."""
+import json
+import time
+from collections import OrderedDict
 from contextlib import asynccontextmanager, contextmanager
+from functools import partial
 from typing import (
     Any,
     AsyncGenerator,
     AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
     List,
+    NamedTuple,
     Optional,
     Tuple,
+    Union,
 )
 
 from langchain_core.runnables import RunnableConfig
@@ -23,12 +32,182 @@ from langgraph.checkpoint.base import (
 )
 from langgraph.checkpoint.serde.base import SerializerProtocol
 from redis.asyncio import Redis as AsyncRedis
-from redis.asyncio import ConnectionPool
+from redis.asyncio.cluster import RedisCluster
+from redis.exceptions import RedisError
 
+from src.utils.checkpoint_serde import CheckpointSerializer
 from src.utils.logger import logger
+from src.utils.redis_compression import CompressedSerializer, CompressionSettings
+from src.utils.redis_pool import InstrumentedConnectionPool
+from src.utils.redis_replicas import ReplicaRouter
+from src.utils.redis_retention import CheckpointPruner, RetentionPolicy
 
 REDIS_KEY_SEPARATOR = "$"
 
+# Layouts of the pending writes:
+# 1: one hash per write, found through a writes index set per checkpoint
+# 2: a single hash per checkpoint, with fields prefixed by task id and write idx
+KEY_SCHEMAS = (1, 2)
+
+# Number of checkpoints alist fetches per READ_CHECKPOINTS_SCRIPT call
+LIST_PAGE_SIZE = 50
+
+# Number of keys removed per UNLINK when deleting checkpoints
+DELETE_BATCH_SIZE = 500
+
+# Sorted set of every thread id, scored by the time of its latest checkpoint
+THREAD_CATALOG_KEY = "thread_catalog"
+
+# Number of threads alist_threads reads from the thread catalog per call
+THREAD_CATALOG_PAGE_SIZE = 100
+
+# Number of (thread, namespace) whose latest channel blobs are remembered by aput
+CHANNEL_BLOBS_CACHE_SIZE = 1024
+
+# Metadata values whose JSON encoding is longer than this are not indexed, filters
+# on them are checked against the loaded metadata instead
+METADATA_INDEX_MAX_VALUE_LENGTH = 256
+
+# Metadata fields never indexed, the thread id is the same for every checkpoint
+METADATA_INDEX_SKIPPED_FIELDS = ("thread_id",)
+
+# Stores every write of a task in a single round-trip (key schema 1).
+# KEYS[1]: version of the (thread, namespace), incremented
+# KEYS[2]: set indexing the writes keys of the checkpoint
+# KEYS[3..]: one writes hash per write
+# ARGV[1]: "1" to overwrite existing hashes (HSET), "0" to keep them (HSETNX)
+# ARGV[2..]: channel, type, value for each writes hash, in KEYS order
+# Returns the new version.
+PUT_WRITES_SCRIPT = """
+local overwrite = ARGV[1] == "1"
+for i = 3, #KEYS do
+    local key = KEYS[i]
+    local offset = 2 + (i - 3) * 3
+    local data = {"channel", ARGV[offset], "type", ARGV[offset + 1], "value", ARGV[offset + 2]}
+    if overwrite then
+        redis.call("HSET", key, unpack(data))
+    else
+        for j = 1, #data, 2 do
+            redis.call("HSETNX", key, data[j], data[j + 1])
+        end
+    end
+    redis.call("SADD", KEYS[2], key)
+end
+return redis.call("INCR", KEYS[1])
+"""
+
+# Stores every write of a task in a single round-trip (key schema 2).
+# KEYS[1]: version of the (thread, namespace), incremented
+# KEYS[2]: writes hash of the checkpoint
+# ARGV[1]: "1" to overwrite existing fields (HSET), "0" to keep them (HSETNX)
+# ARGV[2..]: field, value pairs
+# Returns the new version.
+PUT_WRITES_HASH_SCRIPT = """
+if ARGV[1] == "1" then
+    redis.call("HSET", KEYS[2], unpack(ARGV, 2))
+else
+    for i = 2, #ARGV, 2 do
+        redis.call("HSETNX", KEYS[2], ARGV[i], ARGV[i + 1])
+    end
+end
+return redis.call("INCR", KEYS[1])
+"""
+
+# Scans one page of a sorted set of checkpoint ids, newest first, keeping the ids
+# found in every other set.
+# KEYS[1]: sorted set scanned, the checkpoint index or a metadata index
+# KEYS[2..]: metadata indexes the returned ids must also belong to
+# ARGV[1]: exclusive upper bound of the scanned ids, empty to start from the newest
+# ARGV[2]: number of ids scanned
+# Returns {matching ids, last scanned id or empty once KEYS[1] is exhausted}.
+LIST_CHECKPOINT_IDS_SCRIPT = """
+local max = "+"
+if ARGV[1] ~= "" then
+    max = "(" .. ARGV[1]
+end
+local page_size = tonumber(ARGV[2])
+local scanned = redis.call("ZREVRANGEBYLEX", KEYS[1], max, "-", "LIMIT", 0, page_size)
+local checkpoint_ids = {}
+for _, checkpoint_id in ipairs(scanned) do
+    local found = true
+    for i = 2, #KEYS do
+        if not redis.call("ZSCORE", KEYS[i], checkpoint_id) then
+            found = false
+            break
+        end
+    end
+    if found then
+        checkpoint_ids[#checkpoint_ids + 1] = checkpoint_id
+    end
+end
+local last = ""
+if #scanned == page_size then
+    last = scanned[#scanned]
+end
+return {checkpoint_ids, last}
+"""
+
+# Reads checkpoints together with their pending writes in a single round-trip.
+# KEYS[1]: checkpoint index of the (thread, namespace)
+# ARGV[1]: checkpoint key prefix of the (thread, namespace)
+# ARGV[2]: writes index (key schema 1) or writes hash (key schema 2) key prefix
+# ARGV[3]: channel blob key prefix of the (thread, namespace)
+# ARGV[4]: key schema
+# ARGV[5..]: checkpoint ids to read, the latest checkpoint is read when omitted
+# Returns one {checkpoint_id, checkpoint hash, writes, blobs} entry per requested
+# checkpoint, where writes is {writes key, writes hash, ...} for key schema 1
+# and the writes hash of the checkpoint for key schema 2, and blobs is
+# {blob suffix, blob hash, ...} for every channel blob of the checkpoint.
+READ_CHECKPOINTS_SCRIPT = """
+local checkpoint_ids = {}
+if #ARGV > 4 then
+    for i = 5, #ARGV do
+        checkpoint_ids[#checkpoint_ids + 1] = ARGV[i]
+    end
+else
+    checkpoint_ids = redis.call("ZREVRANGE", KEYS[1], 0, 0)
+end
+local result = {}
+for _, checkpoint_id in ipairs(checkpoint_ids) do
+    local writes = {}
+    if ARGV[4] == "2" then
+        writes = redis.call("HGETALL", ARGV[2] .. checkpoint_id)
+    else
+        for _, key in ipairs(redis.call("SMEMBERS", ARGV[2] .. checkpoint_id)) do
+            writes[#writes + 1] = key
+            writes[#writes + 1] = redis.call("HGETALL", key)
+        end
+    end
+    local checkpoint = redis.call("HGETALL", ARGV[1] .. checkpoint_id)
+    local blobs = {}
+    for i = 1, #checkpoint, 2 do
+        if checkpoint[i] == "channel_blobs" then
+            for suffix in string.gmatch(checkpoint[i + 1], "[^\\n]+") do
+                blobs[#blobs + 1] = suffix
+                blobs[#blobs + 1] = redis.call("HGETALL", ARGV[3] .. suffix)
+            end
+        end
+    end
+    result[#result + 1] = {checkpoint_id, checkpoint, writes, blobs}
+end
+return result
+"""
+
+# Reads the pending writes of a checkpoint, in the format of READ_CHECKPOINTS_SCRIPT
+# KEYS[1]: writes hash key (key schema 2) or writes index key (key schema 1)
+# ARGV[1]: key schema
+READ_WRITES_SCRIPT = """
+if ARGV[1] == "2" then
+    return redis.call("HGETALL", KEYS[1])
+end
+local writes = {}
+for _, key in ipairs(redis.call("SMEMBERS", KEYS[1])) do
+    writes[#writes + 1] = key
+    writes[#writes + 1] = redis.call("HGETALL", key)
+end
+return writes
+"""
+
 
 def _make_redis_checkpoint_key(
     thread_id: str, checkpoint_ns: str, checkpoint_id: str
@@ -38,6 +217,121 @@ def _make_redis_checkpoint_key(
     )
 
 
+def _make_redis_checkpoint_index_key(thread_id: str, checkpoint_ns: str) -> str:
+    """Key of the sorted set holding every checkpoint id of a (thread, namespace).
+
+    All members share score 0, so Redis orders them lexicographically, which for
+    the monotonically increasing checkpoint ids is also chronological order.
+    """
+    return REDIS_KEY_SEPARATOR.join(["checkpoint_index", thread_id, checkpoint_ns])
+
+
+def _make_redis_checkpoint_blob_prefix(thread_id: str, checkpoint_ns: str) -> str:
+    """Prefix shared by the channel blob keys of a (thread, namespace)."""
+    return REDIS_KEY_SEPARATOR.join(["checkpoint_blob", thread_id, checkpoint_ns, ""])
+
+
+def _make_redis_checkpoint_blob_key(
+    thread_id: str, checkpoint_ns: str, channel: str, checkpoint_id: str
+) -> str:
+    """Key of the hash holding a channel value, as written by the given checkpoint.
+
+    Blobs are keyed by the checkpoint that wrote them rather than by channel
+    version: the default integer versions restart from the same number on
+    every fork of a thread, so they do not identify a value.
+    """
+    return _make_redis_checkpoint_blob_prefix(
+        thread_id, checkpoint_ns
+    ) + REDIS_KEY_SEPARATOR.join([channel, checkpoint_id])
+
+
+def _dump_channel_blobs(channel_blobs: dict[str, str]) -> str:
+    """Encode a channel -> writer checkpoint id mapping as blob key suffixes."""
+    return "\n".join(
+        REDIS_KEY_SEPARATOR.join([channel, checkpoint_id])
+        for channel, checkpoint_id in channel_blobs.items()
+    )
+
+
+def _load_channel_blobs(value: Optional[bytes]) -> dict[str, str]:
+    """Decode the channel_blobs field of a checkpoint hash."""
+    if not value:
+        return {}
+    return dict(
+        suffix.rsplit(REDIS_KEY_SEPARATOR, 1) for suffix in value.decode().split("\n")
+    )
+
+
+def _make_redis_checkpoint_metadata_index_prefix(
+    thread_id: str, checkpoint_ns: str
+) -> str:
+    """Prefix shared by the metadata index keys of a (thread, namespace)."""
+    return REDIS_KEY_SEPARATOR.join(
+        ["checkpoint_metadata", thread_id, checkpoint_ns, ""]
+    )
+
+
+def _make_redis_checkpoint_metadata_index_suffix(
+    field: str, value: Any
+) -> Optional[str]:
+    """
+    Suffix of the sorted set indexing the checkpoints whose metadata has field == value.
+
+    Like the checkpoint index, the sets hold checkpoint ids with score 0, so they
+    can be scanned newest first. Values are identified by their JSON encoding.
+
+    Args:
+        field (str): Metadata field.
+        value (Any): Value of the field.
+
+    Returns:
+        Optional[str]: The suffix, None when the field or value is not indexed.
+    """
+    if (
+        field in METADATA_INDEX_SKIPPED_FIELDS
+        or "\n" in field
+        or not (value is None or isinstance(value, (str, int, float, bool)))
+    ):
+        return None
+    encoded_value = json.dumps(value)
+    if len(encoded_value) > METADATA_INDEX_MAX_VALUE_LENGTH:
+        return None
+    return REDIS_KEY_SEPARATOR.join([field, encoded_value])
+
+
+def _make_redis_checkpoint_version_key(thread_id: str, checkpoint_ns: str) -> str:
+    """Key of the counter incremented by every write to a (thread, namespace)."""
+    return REDIS_KEY_SEPARATOR.join(["checkpoint_version", thread_id, checkpoint_ns])
+
+
+def _make_redis_thread_namespaces_key(thread_id: str) -> str:
+    """Key of the set holding every checkpoint namespace used by a thread."""
+    return REDIS_KEY_SEPARATOR.join(["checkpoint_namespaces", thread_id])
+
+
+def _make_redis_checkpoint_writes_index_key(
+    thread_id: str, checkpoint_ns: str, checkpoint_id: str
+) -> str:
+    """Key of the set holding the writes keys of a checkpoint."""
+    return REDIS_KEY_SEPARATOR.join(
+        ["writes_index", thread_id, checkpoint_ns, checkpoint_id]
+    )
+
+
+def _make_redis_checkpoint_writes_hash_key(
+    thread_id: str, checkpoint_ns: str, checkpoint_id: str
+) -> str:
+    """Key of the hash holding every pending write of a checkpoint (key schema 2)."""
+    return REDIS_KEY_SEPARATOR.join(
+        ["checkpoint_writes", thread_id, checkpoint_ns, checkpoint_id]
+    )
+
+
+def _make_redis_checkpoint_writes_field(task_id: str, idx: int, field: str) -> str:
+    """Field of a write inside the writes hash of its checkpoint (key schema 2)."""
+    return REDIS_KEY_SEPARATOR.join([task_id, str(idx), field])
+
+
 def _make_redis_checkpoint_writes_key(
     thread_id: str,
     checkpoint_ns: str,
@@ -85,26 +379,35 @@ def _parse_redis_checkpoint_writes_key(redis_key: str) -> dict:
     }
 
 
-def _filter_keys(
-    keys: List[str], before: Optional[RunnableConfig], limit: Optional[int]
-) -> list:
-    """Filter and sort Redis keys based on optional criteria."""
-    if before:
-        keys = [
-            k
-            for k in keys
-            if _parse_redis_checkpoint_key(k.decode())["checkpoint_id"]
-            < before["configurable"]["checkpoint_id"]
-        ]
+def _hash_reply_to_dict(reply: list) -> dict:
+    """Convert a flat [field, value, ...] HGETALL reply from a script into a dict."""
+    return dict(zip(reply[::2], reply[1::2]))
 
-    keys = sorted(
-        keys,
-        key=lambda k: _parse_redis_checkpoint_key(k.decode())["checkpoint_id"],
-        reverse=True,
-    )
-    if limit:
-        keys = keys[:limit]
-    return keys
+
+def _group_writes_reply(key_schema: int, reply: list) -> dict:
+    """
+    Group the writes returned by READ_CHECKPOINTS_SCRIPT by (task_id, idx).
+
+    Args:
+        key_schema (int): Key schema the writes were stored with.
+        reply (list): Writes part of a READ_CHECKPOINTS_SCRIPT entry.
+
+    Returns:
+        dict: Mapping of (task_id, idx) to the channel, type and value of the write,
+              ordered by task id and write index.
+    """
+    writes = {}
+    if key_schema == 2:
+        for field, value in zip(reply[::2], reply[1::2]):
+            task_id, idx, name = field.decode().rsplit(REDIS_KEY_SEPARATOR, 2)
+            writes.setdefault((task_id, idx), {})[name.encode()] = value
+    else:
+        for key, data in zip(reply[::2], reply[1::2]):
+            parsed_key = _parse_redis_checkpoint_writes_key(key.decode())
+            writes[(parsed_key["task_id"], parsed_key["idx"])] = _hash_reply_to_dict(
+                data
+            )
+    return dict(sorted(writes.items(), key=lambda x: (x[0][0], int(x[0][1]))))
 
 
 def _load_writes(
@@ -122,13 +425,44 @@ def _load_writes(
     return writes
 
 
+def _load_channel_values(serde: SerializerProtocol, reply: list) -> dict[str, Any]:
+    """Deserialize the channel blobs returned by READ_CHECKPOINTS_SCRIPT."""
+    channel_values = {}
+    for suffix, blob in zip(reply[::2], reply[1::2]):
+        data = _hash_reply_to_dict(blob)
+        if not data:
+            continue
+        channel = suffix.decode().rsplit(REDIS_KEY_SEPARATOR, 1)[0]
+        channel_values[channel] = serde.loads_typed(
+            (data[b"type"].decode(), data[b"value"])
+        )
+    return channel_values
+
+
+def _make_checkpoint_config(
+    thread_id: str, checkpoint_ns: str, checkpoint_id: str
+) -> RunnableConfig:
+    return {
+        "configurable": {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint_id,
+        }
+    }
+
+
 def _parse_redis_checkpoint_data(
     serde: SerializerProtocol,
     key: str,
     data: dict,
     pending_writes: Optional[List[PendingWrite]] = None,
+    channel_values: Optional[dict[str, Any]] = None,
 ) -> Optional[CheckpointTuple]:
-    """Parse checkpoint data retrieved from Redis."""
+    """Parse checkpoint data retrieved from Redis.
+
+    Channel values stored as blobs are merged back into the checkpoint, values
+    still inlined by older versions of the saver are kept as they are.
+    """
     if not data:
         return None
 
@@ -136,25 +470,18 @@ def _parse_redis_checkpoint_data(
     thread_id = parsed_key["thread_id"]
     checkpoint_ns = parsed_key["checkpoint_ns"]
     checkpoint_id = parsed_key["checkpoint_id"]
-    config = {
-        "configurable": {
-            "thread_id": thread_id,
-            "checkpoint_ns": checkpoint_ns,
-            "checkpoint_id": checkpoint_id,
-        }
-    }
+    config = _make_checkpoint_config(thread_id, checkpoint_ns, checkpoint_id)
 
     checkpoint = serde.loads_typed((data[b"type"].decode(), data[b"checkpoint"]))
-    metadata = serde.loads(data[b"metadata"].decode())
+    if channel_values:
+        checkpoint["channel_values"] = {
+            **checkpoint["channel_values"],
+            **channel_values,
+        }
+    metadata = serde.loads(data[b"metadata"])
     parent_checkpoint_id = data.get(b"parent_checkpoint_id", b"").decode()
     parent_config = (
-        {
-            "configurable": {
-                "thread_id": thread_id,
-                "checkpoint_ns": checkpoint_ns,
-                "checkpoint_id": parent_checkpoint_id,
-            }
-        }
+        _make_checkpoint_config(thread_id, checkpoint_ns, parent_checkpoint_id)
         if parent_checkpoint_id
         else None
     )
@@ -167,35 +494,177 @@ def _parse_redis_checkpoint_data(
     )
 
 
+class CheckpointMetadataTuple(NamedTuple):
+    """A checkpoint as listed by AsyncRedisSaver.alist_metadata, without its body."""
+
+    config: RunnableConfig
+    metadata: CheckpointMetadata
+    parent_config: Optional[RunnableConfig] = None
+
+
+class ThreadActivity(NamedTuple):
+    """A thread as listed by AsyncRedisSaver.alist_threads."""
+
+    thread_id: str
+    # Unix timestamp of the latest checkpoint of the thread
+    last_active: float
+
+
 class AsyncRedisSaver(BaseCheckpointSaver):
-    """Async redis-based checkpoint saver implementation."""
+    """Async redis-based checkpoint saver implementation.
+
+    In cluster mode thread ids are wrapped in a hash tag inside keys, e.g.
+    `checkpoint${thread}$ns$id`, so that every key of a thread maps to the same
+    slot and scripts and pipelines on a thread stay single-slot. The layout is
+    not compatible with the standalone one.
 
-    conn: AsyncRedis
-    _pool: Optional[ConnectionPool] = None
+    With replicas, checkpoints addressed by id are read from a replica, see
+    _aread_immutable, while latest checkpoint lookups and writes use `conn`.
+    """
 
-    def __init__(self, conn: AsyncRedis):
-        super().__init__()
+    conn: Union[AsyncRedis, RedisCluster]
+    _pool: Optional[InstrumentedConnectionPool] = None
+
+    def __init__(
+        self,
+        conn: Union[AsyncRedis, RedisCluster],
+        *,
+        cluster: bool = False,
+        key_schema: int = 1,
+        retention: Union[RetentionPolicy, dict, None] = None,
+        compression: Union[CompressionSettings, dict, None] = None,
+        serde: str = "jsonplus",
+        replicas: Optional[ReplicaRouter] = None,
+    ):
+        # Reads every format whatever the format written, see SERDE_FORMATS
+        super().__init__(serde=CheckpointSerializer(serde))
+        if key_schema not in KEY_SCHEMAS:
+            raise ValueError(
+                f"Invalid key schema: {key_schema}, expected one of {KEY_SCHEMAS}"
+            )
+        if replicas is not None and cluster:
+            raise ValueError(
+                "Read replicas are not supported in cluster mode, the cluster routes them"
+            )
         self.conn = conn
+        self.cluster = cluster
+        self.replicas = replicas
+        self.key_schema = key_schema
+        if isinstance(compression, dict):
+            compression = CompressionSettings(**compression)
+        # Always wrapped, so compressed checkpoints stay readable when it is disabled
+        self.serde = CompressedSerializer(self.serde, compression)
+        if isinstance(retention, dict):
+            retention = RetentionPolicy(**retention)
+        self._pruner = (
+            CheckpointPruner(self, retention)
+            if retention is not None and retention.enabled
+            else None
+        )
+        # (thread_id, checkpoint_ns) -> (checkpoint_id, channel blobs) of the latest
+        # checkpoint seen, so aput rarely has to read the blobs of the parent
+        self._channel_blobs: OrderedDict[
+            tuple[str, str], tuple[str, dict[str, str]]
+        ] = OrderedDict()
+        self._put_writes_script = conn.register_script(
+            PUT_WRITES_HASH_SCRIPT if key_schema == 2 else PUT_WRITES_SCRIPT
+        )
+        self._read_checkpoints_script = conn.register_script(READ_CHECKPOINTS_SCRIPT)
+        self._read_writes_script = conn.register_script(READ_WRITES_SCRIPT)
+        self._list_checkpoint_ids_script = conn.register_script(
+            LIST_CHECKPOINT_IDS_SCRIPT
+        )
 
     @classmethod
     @asynccontextmanager
     async def from_url(
-        cls, *, url: str, max_connections: int = 10
+        cls,
+        *,
+        url: str,
+        max_connections: int = 10,
+        pool_timeout: Optional[float] = 20,
+        socket_keepalive: bool = True,
+        health_check_interval: int = 30,
+        cluster: bool = False,
+        key_schema: int = 1,
+        retention: Union[RetentionPolicy, dict, None] = None,
+        compression: Union[CompressionSettings, dict, None] = None,
+        serde: str = "jsonplus",
+        replica_urls: Optional[List[str]] = None,
+        replica_max_lag_seconds: float = 5,
     ) -> AsyncIterator["AsyncRedisSaver"]:
         """Create a Redis saver from connection parameters with connection pooling.
 
+        The pool is closed, together with the saver, when the context exits, so the
+        context should span the lifetime of the application.
+
         Args:
             max_connections: Maximum number of connections in the pool
+            pool_timeout: Seconds to wait for a free connection when all are in use, None waits forever
+            socket_keepalive: Enable TCP keepalive on the connections
+            health_check_interval: Seconds a connection may stay idle before it is checked on reuse
+            cluster: Connect to a Redis Cluster, url being any of its nodes; max_connections then
+                applies per node and pool_timeout is not used
+            key_schema: Layout of the pending writes, see KEY_SCHEMAS
+            retention: Retention policy pruning old checkpoints and idle threads
+            compression: Compression of serialized checkpoints and writes, None disables it
+            serde: Format checkpoints and writes are serialized with, see SERDE_FORMATS
+            replica_urls: Read replicas of the primary at url, serving the reads of
+                checkpoints addressed by id, each with its own pool of max_connections
+            replica_max_lag_seconds: Replicas lagging further behind the primary are not read
 
         Returns:
             AsyncRedisSaver instance with pooled connections
         """
         pool = None
-        conn = None
+        replica_pools = []
+        saver = None
         try:
-            pool = ConnectionPool.from_url(url, max_connections=max_connections)
-            conn = AsyncRedis(connection_pool=pool)
-            saver = AsyncRedisSaver(conn)
+            if cluster:
+                conn = RedisCluster.from_url(
+                    url,
+                    max_connections=max_connections,
+                    socket_keepalive=socket_keepalive,
+                    health_check_interval=health_check_interval,
+                )
+            else:
+                pool = InstrumentedConnectionPool.from_url(
+                    url,
+                    max_connections=max_connections,
+                    timeout=pool_timeout,
+                    socket_keepalive=socket_keepalive,
+                    health_check_interval=health_check_interval,
+                )
+                conn = AsyncRedis(connection_pool=pool)
+            replicas = None
+            if replica_urls:
+                replica_pools = [
+                    InstrumentedConnectionPool.from_url(
+                        replica_url,
+                        max_connections=max_connections,
+                        timeout=pool_timeout,
+                        socket_keepalive=socket_keepalive,
+                        health_check_interval=health_check_interval,
+                    )
+                    for replica_url in replica_urls
+                ]
+                replicas = ReplicaRouter(
+                    conn,
+                    [
+                        AsyncRedis(connection_pool=replica_pool)
+                        for replica_pool in replica_pools
+                    ],
+                    max_lag_seconds=replica_max_lag_seconds,
+                )
+            saver = AsyncRedisSaver(
+                conn,
+                cluster=cluster,
+                key_schema=key_schema,
+                retention=retention,
+                compression=compression,
+                serde=serde,
+                replicas=replicas,
+            )
             saver._pool = pool
             # Check if the Redis connection is successful
             try:
@@ -204,14 +673,34 @@ class AsyncRedisSaver(BaseCheckpointSaver):
             except Exception as e:
                 logger.error(f"Redis connection failed: {e}")
                 raise
+            if replicas is not None:
+                # Reads stay on the primary until a check finds the replicas in sync
+                await replicas.check()
+                replicas.start()
+            if saver._pruner:
+                # Idle threads expire even if this process never writes a checkpoint
+                saver._pruner.start()
             yield saver
         finally:
-            if conn:
-                await conn.aclose()
-            # The pool will be closed when all connections are closed
+            if saver:
+                await saver.aclose()
+            for replica_pool in replica_pools:
+                await replica_pool.aclose()
+            if pool:
+                await pool.aclose()
+
+    def _thread_key(self, thread_id: str) -> str:
+        """The thread id as it appears in keys, hash tagged in cluster mode."""
+        return f"{{{thread_id}}}" if self.cluster else thread_id
 
     async def aclose(self) -> None:
         """Close the Redis connection and pool if owned by this instance."""
+        if self._pruner:
+            await self._pruner.stop()
+        if self.replicas:
+            await self.replicas.stop()
+            for replica in self.replicas.replicas:
+                await replica.aclose()
         if self.conn:
             await self.conn.aclose()
 
@@ -236,14 +725,53 @@ class AsyncRedisSaver(BaseCheckpointSaver):
         Returns:
             RunnableConfig: Updated configuration after storing the checkpoint.
         """
+        next_config, _ = await self._aput(config, checkpoint, metadata, new_versions)
+        return next_config
+
+    async def _aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> Tuple[RunnableConfig, int]:
+        """Same as aput, also returning the version of the thread it produced."""
         thread_id = config["configurable"]["thread_id"]
         checkpoint_ns = config["configurable"]["checkpoint_ns"]
         checkpoint_id = checkpoint["id"]
         parent_checkpoint_id = config["configurable"].get("checkpoint_id")
-        key = _make_redis_checkpoint_key(thread_id, checkpoint_ns, checkpoint_id)
+        key = _make_redis_checkpoint_key(
+            self._thread_key(thread_id), checkpoint_ns, checkpoint_id
+        )
+
+        # Only channels updated since the parent are serialized, the others keep
+        # pointing at the blobs written by an earlier checkpoint
+        parent_channel_blobs = await self._aget_channel_blobs(
+            thread_id, checkpoint_ns, parent_checkpoint_id
+        )
+        channel_blobs = {}
+        blobs = {}
+        for channel, value in checkpoint["channel_values"].items():
+            if channel not in new_versions and channel in parent_channel_blobs:
+                channel_blobs[channel] = parent_channel_blobs[channel]
+                continue
+            type_, serialized_value = self.serde.dumps_typed(value)
+            channel_blobs[channel] = checkpoint_id
+            blobs[
+                _make_redis_checkpoint_blob_key(
+                    self._thread_key(thread_id), checkpoint_ns, channel, checkpoint_id
+                )
+            ] = {"type": type_, "value": serialized_value}
 
-        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        type_, serialized_checkpoint = self.serde.dumps_typed(
+            {**checkpoint, "channel_values": {}}
+        )
         serialized_metadata = self.serde.dumps(metadata)
+        metadata_index_suffixes = [
+            suffix
+            for field, value in metadata.items()
+            if (suffix := _make_redis_checkpoint_metadata_index_suffix(field, value))
+        ]
         data = {
             "checkpoint": serialized_checkpoint,
             "type": type_,
@@ -252,16 +780,52 @@ class AsyncRedisSaver(BaseCheckpointSaver):
             "parent_checkpoint_id": parent_checkpoint_id
             if parent_checkpoint_id
             else "",
+            "channel_blobs": _dump_channel_blobs(channel_blobs),
+            "metadata_index": "\n".join(metadata_index_suffixes),
         }
+        metadata_index_prefix = _make_redis_checkpoint_metadata_index_prefix(
+            self._thread_key(thread_id), checkpoint_ns
+        )
+
+        # Redis Cluster has no MULTI across nodes, the index is then written after the
+        # checkpoint and its blobs so that a partial write is never visible
+        async with self.conn.pipeline(transaction=not self.cluster) as pipe:
+            for blob_key, blob in blobs.items():
+                pipe.hset(blob_key, mapping=blob)
+            pipe.hset(key, mapping=data)
+            for suffix in metadata_index_suffixes:
+                pipe.zadd(metadata_index_prefix + suffix, {checkpoint_id: 0})
+            pipe.zadd(
+                _make_redis_checkpoint_index_key(
+                    self._thread_key(thread_id), checkpoint_ns
+                ),
+                {checkpoint_id: 0},
+            )
+            pipe.sadd(
+                _make_redis_thread_namespaces_key(self._thread_key(thread_id)),
+                checkpoint_ns,
+            )
+            pipe.zadd(THREAD_CATALOG_KEY, {thread_id: time.time()})
+            pipe.incr(
+                _make_redis_checkpoint_version_key(
+                    self._thread_key(thread_id), checkpoint_ns
+                )
+            )
+            *_, version = await pipe.execute()
+        self._remember_channel_blobs(
+            thread_id, checkpoint_ns, checkpoint_id, channel_blobs
+        )
 
-        await self.conn.hset(key, mapping=data)
-        return {
+        if self._pruner:
+            self._pruner.mark(thread_id, checkpoint_ns)
+        next_config = {
             "configurable": {
                 "thread_id": thread_id,
                 "checkpoint_ns": checkpoint_ns,
                 "checkpoint_id": checkpoint_id,
             }
         }
+        return next_config, version
 
     async def aput_writes(
         self,
@@ -278,27 +842,98 @@ class AsyncRedisSaver(BaseCheckpointSaver):
             writes (Sequence[Tuple[str, Any]]): List of writes to store, each as (channel, value) pair.
             task_id (str): Identifier for the task creating the writes.
         """
+        await self._aput_writes(config, writes, task_id)
+
+    async def _aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: List[Tuple[str, Any]],
+        task_id: str,
+    ) -> Optional[int]:
+        """Same as aput_writes, also returning the version of the thread it produced."""
         thread_id = config["configurable"]["thread_id"]
         checkpoint_ns = config["configurable"]["checkpoint_ns"]
         checkpoint_id = config["configurable"]["checkpoint_id"]
+        version_key = _make_redis_checkpoint_version_key(
+            self._thread_key(thread_id), checkpoint_ns
+        )
 
-        for idx, (channel, value) in enumerate(writes):
-            key = _make_redis_checkpoint_writes_key(
-                thread_id,
-                checkpoint_ns,
-                checkpoint_id,
-                task_id,
-                WRITES_IDX_MAP.get(channel, idx),
+        if not writes:
+            return None
+
+        # Special channels (errors, interrupts, ...) replace earlier writes of the task,
+        # regular writes must never clobber what a previous attempt already stored
+        overwrite = all(w[0] in WRITES_IDX_MAP for w in writes)
+        serialized_writes = [
+            (WRITES_IDX_MAP.get(channel, idx), channel, *self.serde.dumps_typed(value))
+            for idx, (channel, value) in enumerate(writes)
+        ]
+
+        # One script call keeps all writes of the task atomic and costs a single round-trip
+        if self.key_schema == 2:
+            args = ["1" if overwrite else "0"]
+            for idx, channel, type_, serialized_value in serialized_writes:
+                for field, value in (
+                    ("channel", channel),
+                    ("type", type_),
+                    ("value", serialized_value),
+                ):
+                    args.extend(
+                        [
+                            _make_redis_checkpoint_writes_field(task_id, idx, field),
+                            value,
+                        ]
+                    )
+            return await self._put_writes_script(
+                keys=[
+                    version_key,
+                    _make_redis_checkpoint_writes_hash_key(
+                        self._thread_key(thread_id), checkpoint_ns, checkpoint_id
+                    ),
+                ],
+                args=args,
             )
-            type_, serialized_value = self.serde.dumps_typed(value)
-            data = {"channel": channel, "type": type_, "value": serialized_value}
-            if all(w[0] in WRITES_IDX_MAP for w in writes):
-                # Use HSET which will overwrite existing values
-                await self.conn.hset(key, mapping=data)
-            else:
-                # Use HSETNX which will not overwrite existing values
-                for field, value in data.items():
-                    await self.conn.hsetnx(key, field, value)
+        else:
+            keys = [
+                version_key,
+                _make_redis_checkpoint_writes_index_key(
+                    self._thread_key(thread_id), checkpoint_ns, checkpoint_id
+                ),
+            ]
+            args = ["1" if overwrite else "0"]
+            for idx, channel, type_, serialized_value in serialized_writes:
+                keys.append(
+                    _make_redis_checkpoint_writes_key(
+                        self._thread_key(thread_id),
+                        checkpoint_ns,
+                        checkpoint_id,
+                        task_id,
+                        idx,
+                    )
+                )
+                args.extend([channel, type_, serialized_value])
+            return await self._put_writes_script(keys=keys, args=args)
+
+    async def aget_version(self, thread_id: str, checkpoint_ns: str = "") -> int:
+        """
+        Get the version of a (thread, namespace).
+
+        The version is incremented by every aput and aput_writes, and reset when the
+        thread is deleted, so an unchanged version means an unchanged thread.
+
+        Args:
+            thread_id (str): The thread.
+            checkpoint_ns (str): The namespace.
+
+        Returns:
+            int: The version, 0 for threads never written.
+        """
+        version = await self.conn.get(
+            _make_redis_checkpoint_version_key(
+                self._thread_key(thread_id), checkpoint_ns
+            )
+        )
+        return int(version) if version else 0
 
     async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
         """Get a checkpoint tuple from Redis asynchronously.
@@ -308,6 +943,11 @@ class AsyncRedisSaver(BaseCheckpointSaver):
         the matching thread ID and checkpoint ID is retrieved. Otherwise, the latest checkpoint
         for the given thread ID is retrieved.
 
+        Checkpoints retrieved by ID are read from a replica when there is one in
+        sync, the latest checkpoint always from the primary. Pending writes are
+        always read from the primary: unlike checkpoints, they are added after a
+        checkpoint is saved, and a replica may not have them yet.
+
         Args:
             config (RunnableConfig): The config to use for retrieving the checkpoint.
 
@@ -318,30 +958,84 @@ class AsyncRedisSaver(BaseCheckpointSaver):
         checkpoint_id = get_checkpoint_id(config)
         checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
 
-        checkpoint_key = await self._aget_checkpoint_key(
-            self.conn, thread_id, checkpoint_ns, checkpoint_id
-        )
-        if not checkpoint_key:
-            return None
-        checkpoint_data = await self.conn.hgetall(checkpoint_key)
+        if checkpoint_id:
+            checkpoint_tuples = await self._aread_immutable(
+                partial(self._aread_checkpoint, thread_id, checkpoint_ns, checkpoint_id)
+            )
+        else:
+            checkpoint_tuples = await self._aread_checkpoints(
+                thread_id, checkpoint_ns, []
+            )
+        return checkpoint_tuples[0] if checkpoint_tuples else None
 
-        # load pending writes
-        checkpoint_id = (
-            checkpoint_id
-            or _parse_redis_checkpoint_key(checkpoint_key)["checkpoint_id"]
+    async def _aread_checkpoint(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        checkpoint_id: str,
+        conn: Union[AsyncRedis, RedisCluster],
+    ) -> List[CheckpointTuple]:
+        """Read a checkpoint by id from conn, and its pending writes from the primary."""
+        checkpoint_tuples = await self._aread_checkpoints(
+            thread_id, checkpoint_ns, [checkpoint_id], conn=conn
         )
-        pending_writes = await self._aload_pending_writes(
-            thread_id, checkpoint_ns, checkpoint_id
+        if not checkpoint_tuples or conn is self.conn:
+            return checkpoint_tuples
+        writes_reply = await self._read_writes_script(
+            keys=[
+                _make_redis_checkpoint_writes_hash_key(
+                    self._thread_key(thread_id), checkpoint_ns, checkpoint_id
+                )
+                if self.key_schema == 2
+                else _make_redis_checkpoint_writes_index_key(
+                    self._thread_key(thread_id), checkpoint_ns, checkpoint_id
+                )
+            ],
+            args=[self.key_schema],
+            client=self.conn,
         )
-        return _parse_redis_checkpoint_data(
-            self.serde, checkpoint_key, checkpoint_data, pending_writes=pending_writes
+        pending_writes = _load_writes(
+            self.serde, _group_writes_reply(self.key_schema, writes_reply)
         )
+        return [checkpoint_tuples[0]._replace(pending_writes=pending_writes)]
+
+    async def _aread_immutable(
+        self,
+        read: Callable[[Union[AsyncRedis, RedisCluster]], Awaitable[Any]],
+        found: Callable[[Any], bool] = bool,
+    ) -> Any:
+        """
+        Run a read of checkpoints addressed by id on a replica, or on the primary.
+
+        The read falls back to the primary when no replica is in sync, when the
+        replica fails, or when it finds nothing, the checkpoint not being
+        replicated yet.
+
+        Args:
+            read (Callable): Reads from the connection it is given.
+            found (Callable): Whether a result of read found something, its truth
+                value by default.
+
+        Returns:
+            Any: The result of read.
+        """
+        replica = self.replicas.pick() if self.replicas else None
+        if replica is not None:
+            try:
+                result = await read(replica)
+            except RedisError as e:
+                self.replicas.mark_failed(replica, e)
+            else:
+                if found(result):
+                    self.replicas.replica_reads += 1
+                    return result
+                self.replicas.primary_fallbacks += 1
+        return await read(self.conn)
 
     async def alist(
         self,
         config: Optional[RunnableConfig],
         *,
-        # TODO: implement filtering
         filter: Optional[dict[str, Any]] = None,
         before: Optional[RunnableConfig] = None,
         limit: Optional[int] = None,
@@ -351,6 +1045,12 @@ class AsyncRedisSaver(BaseCheckpointSaver):
         This method retrieves a list of checkpoint tuples from Redis based
         on the provided config. The checkpoints are ordered by checkpoint ID in descending order (newest first).
 
+        Checkpoints are streamed LIST_PAGE_SIZE ids at a time. Filters on scalar
+        metadata values are resolved with the metadata indexes written by aput,
+        other filters are checked against the metadata of the listed checkpoints.
+        Listings before a checkpoint only hold older, immutable checkpoints and are
+        read from a replica when there is one in sync.
+
         Args:
             config (Optional[RunnableConfig]): Base configuration for filtering checkpoints.
             filter (Optional[Dict[str, Any]]): Additional filtering criteria for metadata.
@@ -362,57 +1062,674 @@ class AsyncRedisSaver(BaseCheckpointSaver):
         """
         thread_id = config["configurable"]["thread_id"]
         checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
-        pattern = _make_redis_checkpoint_key(thread_id, checkpoint_ns, "*")
-        keys = _filter_keys(await self.conn.keys(pattern), before, limit)
-        for key in keys:
-            data = await self.conn.hgetall(key)
-            if data and b"checkpoint" in data and b"metadata" in data:
-                checkpoint_id = _parse_redis_checkpoint_key(key.decode())[
-                    "checkpoint_id"
-                ]
-                pending_writes = await self._aload_pending_writes(
-                    thread_id, checkpoint_ns, checkpoint_id
+        async for checkpoint_tuple in self._alist_pages(
+            thread_id,
+            checkpoint_ns,
+            lambda conn, checkpoint_ids: self._aread_checkpoints(
+                thread_id, checkpoint_ns, checkpoint_ids, conn=conn
+            ),
+            filter=filter,
+            before=before,
+            limit=limit,
+        ):
+            yield checkpoint_tuple
+
+    async def alist_metadata(
+        self,
+        config: RunnableConfig,
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncGenerator[CheckpointMetadataTuple, None]:
+        """List the metadata of checkpoints, newest first, without loading the checkpoints.
+
+        Same as alist, but only the metadata and parent of each checkpoint are read
+        from Redis and deserialized, the checkpoint body, channel values and
+        pending writes are not. Use it to browse the history of a thread. Like
+        alist, listings before a checkpoint are read from a replica when possible.
+
+        Args:
+            config (RunnableConfig): Config of the thread and namespace to list.
+            filter (Optional[Dict[str, Any]]): Additional filtering criteria for metadata.
+            before (Optional[RunnableConfig]): If provided, only checkpoints before the specified checkpoint ID are returned.
+            limit (Optional[int]): Maximum number of checkpoints to return.
+
+        Yields:
+            AsyncIterator[CheckpointMetadataTuple]: The config, metadata and parent config of each matching checkpoint.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        async for metadata_tuple in self._alist_pages(
+            thread_id,
+            checkpoint_ns,
+            lambda conn, checkpoint_ids: self._aread_checkpoint_metadata(
+                thread_id, checkpoint_ns, checkpoint_ids, conn=conn
+            ),
+            filter=filter,
+            before=before,
+            limit=limit,
+        ):
+            yield metadata_tuple
+
+    async def _alist_pages(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        read_page: Callable[[Any, List[str]], Awaitable[list]],
+        *,
+        filter: Optional[dict[str, Any]],
+        before: Optional[RunnableConfig],
+        limit: Optional[int],
+    ) -> AsyncIterator[Any]:
+        """
+        Read the checkpoints of a (thread, namespace) matching a filter, page by page.
+
+        Args:
+            thread_id (str): Thread to list.
+            checkpoint_ns (str): Namespace to list.
+            read_page (Callable): Reads the items of a page of checkpoint ids from the
+                connection it is given, each item having the metadata of its checkpoint.
+            filter (Optional[dict[str, Any]]): Metadata the checkpoints must have.
+            before (Optional[RunnableConfig]): Only checkpoints older than this one are read.
+            limit (Optional[int]): Maximum number of items to yield.
+
+        Yields:
+            The items returned by read_page for matching checkpoints, newest first.
+        """
+        if limit is not None and limit <= 0:
+            return
+
+        index_keys = []
+        unindexed_filter = {}
+        metadata_index_prefix = _make_redis_checkpoint_metadata_index_prefix(
+            self._thread_key(thread_id), checkpoint_ns
+        )
+        for field, value in (filter or {}).items():
+            suffix = _make_redis_checkpoint_metadata_index_suffix(field, value)
+            if suffix is None:
+                unindexed_filter[field] = value
+            else:
+                index_keys.append(metadata_index_prefix + suffix)
+        if len(index_keys) > 1:
+            # Scan the smallest index and check membership in the others
+            async with self.conn.pipeline(transaction=False) as pipe:
+                for index_key in index_keys:
+                    pipe.zcard(index_key)
+                sizes = await pipe.execute()
+            if not all(sizes):
+                return
+            index_keys = [key for _, key in sorted(zip(sizes, index_keys))]
+        elif not index_keys:
+            index_keys = [
+                _make_redis_checkpoint_index_key(
+                    self._thread_key(thread_id), checkpoint_ns
                 )
-                yield _parse_redis_checkpoint_data(
-                    self.serde, key.decode(), data, pending_writes=pending_writes
+            ]
+
+        upper_bound = get_checkpoint_id(before) if before else ""
+        while True:
+            read = partial(
+                self._alist_page,
+                index_keys=index_keys,
+                upper_bound=upper_bound or "",
+                read_page=read_page,
+            )
+            # Only checkpoints older than `before` are listed, and these never change
+            items, upper_bound = await (
+                self._aread_immutable(read, found=lambda page: bool(page[0]))
+                if before
+                else read(self.conn)
+            )
+            for item in items:
+                if not all(
+                    item.metadata.get(field) == value
+                    for field, value in unindexed_filter.items()
+                ):
+                    continue
+                yield item
+                if limit is not None:
+                    limit -= 1
+                    if limit == 0:
+                        return
+            if not upper_bound:
+                return
+            upper_bound = upper_bound.decode()
+
+    async def _alist_page(
+        self,
+        conn: Union[AsyncRedis, RedisCluster],
+        index_keys: List[str],
+        upper_bound: str,
+        read_page: Callable[[Any, List[str]], Awaitable[list]],
+    ) -> Tuple[list, Optional[bytes]]:
+        """Read the items of a page of _alist_pages, and the upper bound of the next page."""
+        checkpoint_ids, upper_bound = await self._list_checkpoint_ids_script(
+            keys=index_keys, args=[upper_bound, LIST_PAGE_SIZE], client=conn
+        )
+        items = (
+            await read_page(
+                conn, [checkpoint_id.decode() for checkpoint_id in checkpoint_ids]
+            )
+            if checkpoint_ids
+            else []
+        )
+        return items, upper_bound
+
+    async def _aread_checkpoint_metadata(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        checkpoint_ids: List[str],
+        conn: Union[AsyncRedis, RedisCluster, None] = None,
+    ) -> List[CheckpointMetadataTuple]:
+        """Read the metadata and parent of checkpoints in a single round-trip."""
+        async with (conn or self.conn).pipeline(transaction=False) as pipe:
+            for checkpoint_id in checkpoint_ids:
+                pipe.hmget(
+                    _make_redis_checkpoint_key(
+                        self._thread_key(thread_id), checkpoint_ns, checkpoint_id
+                    ),
+                    "metadata",
+                    "parent_checkpoint_id",
                 )
+            replies = await pipe.execute()
 
-    async def _aload_pending_writes(
-        self, thread_id: str, checkpoint_ns: str, checkpoint_id: str
-    ) -> List[PendingWrite]:
-        writes_key = _make_redis_checkpoint_writes_key(
-            thread_id, checkpoint_ns, checkpoint_id, "*", None
+        metadata_tuples = []
+        for checkpoint_id, (metadata, parent_checkpoint_id) in zip(
+            checkpoint_ids, replies
+        ):
+            if metadata is None:
+                # Deleted since its id was listed
+                continue
+            metadata_tuples.append(
+                CheckpointMetadataTuple(
+                    config=_make_checkpoint_config(
+                        thread_id, checkpoint_ns, checkpoint_id
+                    ),
+                    metadata=self.serde.loads(metadata),
+                    parent_config=_make_checkpoint_config(
+                        thread_id, checkpoint_ns, parent_checkpoint_id.decode()
+                    )
+                    if parent_checkpoint_id
+                    else None,
+                )
+            )
+        return metadata_tuples
+
+    async def _aread_checkpoints(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        checkpoint_ids: List[str],
+        conn: Union[AsyncRedis, RedisCluster, None] = None,
+    ) -> List[CheckpointTuple]:
+        """
+        Read checkpoints and their pending writes with a single script call.
+
+        Args:
+            thread_id (str): Thread the checkpoints belong to.
+            checkpoint_ns (str): Namespace the checkpoints belong to.
+            checkpoint_ids (List[str]): Ids to read, or an empty list for the latest checkpoint.
+            conn (Optional[AsyncRedis]): Connection read from, the primary by default.
+
+        Returns:
+            List[CheckpointTuple]: The checkpoints found, in the order of checkpoint_ids.
+        """
+        entries = await self._read_checkpoints_script(
+            keys=[
+                _make_redis_checkpoint_index_key(
+                    self._thread_key(thread_id), checkpoint_ns
+                )
+            ],
+            args=[
+                _make_redis_checkpoint_key(
+                    self._thread_key(thread_id), checkpoint_ns, ""
+                ),
+                (
+                    _make_redis_checkpoint_writes_hash_key(
+                        self._thread_key(thread_id), checkpoint_ns, ""
+                    )
+                    if self.key_schema == 2
+                    else _make_redis_checkpoint_writes_index_key(
+                        self._thread_key(thread_id), checkpoint_ns, ""
+                    )
+                ),
+                _make_redis_checkpoint_blob_prefix(
+                    self._thread_key(thread_id), checkpoint_ns
+                ),
+                self.key_schema,
+                *checkpoint_ids,
+            ],
+            client=conn or self.conn,
         )
-        matching_keys = await self.conn.keys(pattern=writes_key)
-        parsed_keys = [
-            _parse_redis_checkpoint_writes_key(key.decode()) for key in matching_keys
-        ]
-        pending_writes = _load_writes(
-            self.serde,
-            {
-                (parsed_key["task_id"], parsed_key["idx"]): await self.conn.hgetall(key)
-                for key, parsed_key in sorted(
-                    zip(matching_keys, parsed_keys), key=lambda x: x[1]["idx"]
+
+        checkpoint_tuples = []
+        for checkpoint_id, checkpoint_reply, writes_reply, blobs_reply in entries:
+            data = _hash_reply_to_dict(checkpoint_reply)
+            if b"checkpoint" not in data or b"metadata" not in data:
+                continue
+            pending_writes = _load_writes(
+                self.serde, _group_writes_reply(self.key_schema, writes_reply)
+            )
+            checkpoint_tuples.append(
+                _parse_redis_checkpoint_data(
+                    self.serde,
+                    _make_redis_checkpoint_key(
+                        thread_id, checkpoint_ns, checkpoint_id.decode()
+                    ),
+                    data,
+                    pending_writes=pending_writes,
+                    channel_values=_load_channel_values(self.serde, blobs_reply),
+                )
+            )
+            if not checkpoint_ids:
+                # The latest checkpoint is the parent of the next aput on the thread
+                self._remember_channel_blobs(
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint_id.decode(),
+                    _load_channel_blobs(data.get(b"channel_blobs")),
+                )
+        return checkpoint_tuples
+
+    def _remember_channel_blobs(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        checkpoint_id: str,
+        channel_blobs: dict[str, str],
+    ):
+        """Cache the channel blobs of the latest checkpoint of a thread."""
+        self._channel_blobs[(thread_id, checkpoint_ns)] = (checkpoint_id, channel_blobs)
+        self._channel_blobs.move_to_end((thread_id, checkpoint_ns))
+        if len(self._channel_blobs) > CHANNEL_BLOBS_CACHE_SIZE:
+            self._channel_blobs.popitem(last=False)
+
+    async def _aget_channel_blobs(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]
+    ) -> dict[str, str]:
+        """
+        Get the channel -> writer checkpoint id mapping of a checkpoint.
+
+        Args:
+            thread_id (str): Thread the checkpoint belongs to.
+            checkpoint_ns (str): Namespace the checkpoint belongs to.
+            checkpoint_id (Optional[str]): The checkpoint, usually the parent of the one being saved.
+
+        Returns:
+            dict[str, str]: The mapping, empty for checkpoints saved with inlined channel values.
+        """
+        if not checkpoint_id:
+            return {}
+        cached = self._channel_blobs.get((thread_id, checkpoint_ns))
+        if cached and cached[0] == checkpoint_id:
+            return cached[1]
+        return _load_channel_blobs(
+            await self.conn.hget(
+                _make_redis_checkpoint_key(
+                    self._thread_key(thread_id), checkpoint_ns, checkpoint_id
+                ),
+                "channel_blobs",
+            )
+        )
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """
+        Delete every checkpoint and pending write of a thread, in all namespaces.
+
+        Keys are removed with UNLINK, in batches of DELETE_BATCH_SIZE, so that large
+        threads are freed in the background by Redis without blocking it.
+
+        Args:
+            thread_id (str): The thread to delete.
+        """
+        namespaces_key = _make_redis_thread_namespaces_key(self._thread_key(thread_id))
+        # The root namespace is always checked, threads saved before the
+        # namespaces set existed only know about it once backfilled
+        checkpoint_namespaces = {
+            checkpoint_ns.decode()
+            for checkpoint_ns in await self.conn.smembers(namespaces_key)
+        } | {""}
+        for checkpoint_ns in checkpoint_namespaces:
+            index_key = _make_redis_checkpoint_index_key(
+                self._thread_key(thread_id), checkpoint_ns
+            )
+            while checkpoint_ids := await self.conn.zrange(
+                index_key, 0, DELETE_BATCH_SIZE - 1
+            ):
+                await self._adelete_checkpoints(
+                    thread_id,
+                    checkpoint_ns,
+                    [checkpoint_id.decode() for checkpoint_id in checkpoint_ids],
                 )
-            },
+            await self.conn.unlink(
+                index_key,
+                _make_redis_checkpoint_version_key(
+                    self._thread_key(thread_id), checkpoint_ns
+                ),
+            )
+            self._channel_blobs.pop((thread_id, checkpoint_ns), None)
+
+        async with self.conn.pipeline(transaction=False) as pipe:
+            pipe.unlink(namespaces_key)
+            pipe.zrem(THREAD_CATALOG_KEY, thread_id)
+            await pipe.execute()
+
+    async def alist_threads(
+        self,
+        *,
+        active_after: Optional[float] = None,
+        active_before: Optional[float] = None,
+        after: Optional[ThreadActivity] = None,
+        oldest_first: bool = False,
+        limit: Optional[int] = None,
+    ) -> AsyncGenerator[ThreadActivity, None]:
+        """
+        List threads by the time of their latest checkpoint, from the thread catalog.
+
+        Threads are read THREAD_CATALOG_PAGE_SIZE at a time with score range queries,
+        each costing O(log n) whatever the size of the catalog. Pass the last thread
+        of a page as `after`, with the same other arguments, to read the next page.
+
+        Args:
+            active_after (Optional[float]): Only threads active after this Unix timestamp.
+            active_before (Optional[float]): Only threads idle since before this Unix timestamp.
+            after (Optional[ThreadActivity]): Only threads listed after this one.
+            oldest_first (bool): List the least recently active threads first, e.g. to
+                find idle threads, instead of the most recently active ones.
+            limit (Optional[int]): Maximum number of threads to return.
+
+        Yields:
+            AsyncIterator[ThreadActivity]: The id and last activity of each thread.
+        """
+        if limit is not None and limit <= 0:
+            return
+
+        lowest = "-inf" if active_after is None else f"({active_after}"
+        highest = "+inf" if active_before is None else f"({active_before}"
+        # Threads active at the same time are ordered by id, the range restarts from
+        # the score of the last thread read, skipping the `offset` threads of that
+        # score already read
+        anchor = after
+        offset = 0
+        while True:
+            if oldest_first:
+                page = await self.conn.zrangebyscore(
+                    THREAD_CATALOG_KEY,
+                    repr(anchor.last_active) if anchor else lowest,
+                    highest,
+                    start=offset,
+                    num=THREAD_CATALOG_PAGE_SIZE,
+                    withscores=True,
+                )
+            else:
+                page = await self.conn.zrevrangebyscore(
+                    THREAD_CATALOG_KEY,
+                    repr(anchor.last_active) if anchor else highest,
+                    lowest,
+                    start=offset,
+                    num=THREAD_CATALOG_PAGE_SIZE,
+                    withscores=True,
+                )
+            for thread_id, last_active in page:
+                thread = ThreadActivity(thread_id.decode(), last_active)
+                if (
+                    after is not None
+                    and last_active == after.last_active
+                    and (
+                        thread.thread_id <= after.thread_id
+                        if oldest_first
+                        else thread.thread_id >= after.thread_id
+                    )
+                ):
+                    # Listed before `after`, on the previous page
+                    continue
+                yield thread
+                if limit is not None:
+                    limit -= 1
+                    if limit == 0:
+                        return
+            if len(page) < THREAD_CATALOG_PAGE_SIZE:
+                return
+            last_active = page[-1][1]
+            if anchor is not None and last_active == anchor.last_active:
+                offset += len(page)
+            else:
+                anchor = ThreadActivity(page[-1][0].decode(), last_active)
+                offset = sum(1 for _, score in page if score == last_active)
+
+    async def adelete_idle_threads(
+        self, last_active_before: float, limit: int = 100
+    ) -> int:
+        """
+        Delete threads whose latest checkpoint is older than a timestamp.
+
+        Args:
+            last_active_before (float): Unix timestamp, threads idle since before it are deleted.
+            limit (int): Maximum number of threads deleted by this call.
+
+        Returns:
+            int: Number of threads deleted.
+        """
+        thread_ids = await self.conn.zrangebyscore(
+            THREAD_CATALOG_KEY, "-inf", f"({last_active_before}", start=0, num=limit
         )
-        return pending_writes
+        deleted = 0
+        for thread_id in thread_ids:
+            # Skip threads that became active again since the range was read
+            last_active = await self.conn.zscore(THREAD_CATALOG_KEY, thread_id)
+            if last_active is not None and last_active >= last_active_before:
+                continue
+            await self.adelete_thread(thread_id.decode())
+            deleted += 1
+        return deleted
 
-    async def _aget_checkpoint_key(
-        self, conn, thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]
-    ) -> Optional[str]:
-        """Asynchronously determine the Redis key for a checkpoint."""
-        if checkpoint_id:
-            return _make_redis_checkpoint_key(thread_id, checkpoint_ns, checkpoint_id)
+    async def aprune_thread(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        *,
+        keep_last_checkpoints: Optional[int] = None,
+        keep_last_writes: Optional[int] = None,
+        batch_size: int = 100,
+    ) -> bool:
+        """
+        Delete old checkpoints and the pending writes of superseded checkpoints.
+
+        At most batch_size checkpoints are pruned per call, so that a thread with
+        a large backlog does not monopolize the connection.
 
-        all_keys = await conn.keys(
-            _make_redis_checkpoint_key(thread_id, checkpoint_ns, "*")
+        Args:
+            thread_id (str): Thread to prune.
+            checkpoint_ns (str): Namespace to prune.
+            keep_last_checkpoints (Optional[int]): Newest checkpoints to keep, None keeps all.
+            keep_last_writes (Optional[int]): Newest checkpoints whose pending writes are kept,
+                None keeps all.
+            batch_size (int): Maximum number of checkpoints pruned by this call.
+
+        Returns:
+            bool: Whether checkpoints beyond keep_last_checkpoints remain to be pruned.
+        """
+        index_key = _make_redis_checkpoint_index_key(
+            self._thread_key(thread_id), checkpoint_ns
         )
-        if not all_keys:
-            return None
+        remaining = False
+        if keep_last_checkpoints is not None:
+            excess = await self.conn.zcard(index_key) - keep_last_checkpoints
+            if excess > 0:
+                pruned = min(excess, batch_size)
+                # Only the oldest checkpoints, pruned by this call, and the retained
+                # ones are read, whatever the length of the thread. Retained
+                # checkpoints may still point at channel blobs written by the pruned
+                # ones; checkpoints in between are pruned by the next calls.
+                async with self.conn.pipeline(transaction=False) as pipe:
+                    pipe.zrange(index_key, 0, pruned - 1)
+                    pipe.zrange(index_key, -keep_last_checkpoints, -1)
+                    pruned_ids, retained_ids = await pipe.execute()
+                await self._adelete_checkpoints(
+                    thread_id,
+                    checkpoint_ns,
+                    [checkpoint_id.decode() for checkpoint_id in pruned_ids],
+                    retained_ids=[
+                        checkpoint_id.decode() for checkpoint_id in retained_ids
+                    ],
+                )
+                remaining = excess > batch_size
+
+        if keep_last_writes is not None and (
+            keep_last_checkpoints is None or keep_last_writes < keep_last_checkpoints
+        ):
+            # Only the checkpoints superseded most recently can still have writes,
+            # older ones were cleaned up by earlier sweeps
+            checkpoint_ids = await self.conn.zrevrange(
+                index_key, keep_last_writes, keep_last_writes + batch_size - 1
+            )
+            await self._adelete_checkpoints(
+                thread_id,
+                checkpoint_ns,
+                [checkpoint_id.decode() for checkpoint_id in checkpoint_ids],
+                writes_only=True,
+            )
+        return remaining
 
-        latest_key = max(
-            all_keys,
-            key=lambda k: _parse_redis_checkpoint_key(k.decode())["checkpoint_id"],
+    async def _adelete_checkpoints(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        checkpoint_ids: List[str],
+        writes_only: bool = False,
+        retained_ids: Iterable[str] = (),
+    ):
+        """
+        UNLINK checkpoints, or only their pending writes, and drop them from the indexes.
+
+        Channel blobs of the deleted checkpoints are deleted with them, unless one
+        of the retained checkpoints still points at them.
+
+        Args:
+            thread_id (str): Thread the checkpoints belong to.
+            checkpoint_ns (str): Namespace the checkpoints belong to.
+            checkpoint_ids (List[str]): Checkpoints to delete.
+            writes_only (bool): Keep the checkpoints themselves and only delete their writes.
+            retained_ids (Iterable[str]): Checkpoints of the namespace that are kept.
+        """
+        if not checkpoint_ids:
+            return
+
+        keys = await self._awrites_keys(thread_id, checkpoint_ns, checkpoint_ids)
+        metadata_index_keys = {}
+        if not writes_only:
+            metadata_index_keys = await self._ametadata_index_keys(
+                thread_id, checkpoint_ns, checkpoint_ids
+            )
+            keys.extend(
+                _make_redis_checkpoint_key(
+                    self._thread_key(thread_id), checkpoint_ns, checkpoint_id
+                )
+                for checkpoint_id in checkpoint_ids
+            )
+            keys.extend(
+                await self._ablob_keys(
+                    thread_id, checkpoint_ns, checkpoint_ids, retained_ids
+                )
+            )
+
+        async with self.conn.pipeline(transaction=False) as pipe:
+            for start in range(0, len(keys), DELETE_BATCH_SIZE):
+                pipe.unlink(*keys[start : start + DELETE_BATCH_SIZE])
+            for index_key, indexed_ids in metadata_index_keys.items():
+                pipe.zrem(index_key, *indexed_ids)
+            if not writes_only:
+                pipe.zrem(
+                    _make_redis_checkpoint_index_key(
+                        self._thread_key(thread_id), checkpoint_ns
+                    ),
+                    *checkpoint_ids,
+                )
+            await pipe.execute()
+
+    async def _ablob_keys(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        checkpoint_ids: List[str],
+        retained_ids: Iterable[str],
+    ) -> List[str]:
+        """List the channel blobs of the given checkpoints not used by the retained ones."""
+        retained_ids = list(retained_ids)
+        async with self.conn.pipeline(transaction=False) as pipe:
+            for checkpoint_id in checkpoint_ids + retained_ids:
+                pipe.hget(
+                    _make_redis_checkpoint_key(
+                        self._thread_key(thread_id), checkpoint_ns, checkpoint_id
+                    ),
+                    "channel_blobs",
+                )
+            mappings = [_load_channel_blobs(value) for value in await pipe.execute()]
+
+        retained = {
+            (channel, writer_id)
+            for mapping in mappings[len(checkpoint_ids) :]
+            for channel, writer_id in mapping.items()
+        }
+        # Blobs outlive their writer while a newer checkpoint points at them, so
+        # every blob referenced by a deleted checkpoint is a candidate
+        deleted = {
+            (channel, writer_id)
+            for mapping in mappings[: len(checkpoint_ids)]
+            for channel, writer_id in mapping.items()
+        }
+        return [
+            _make_redis_checkpoint_blob_key(
+                self._thread_key(thread_id), checkpoint_ns, *blob
+            )
+            for blob in deleted - retained
+        ]
+
+    async def _ametadata_index_keys(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_ids: List[str]
+    ) -> dict[str, List[str]]:
+        """Map the metadata indexes the given checkpoints belong to, to their ids."""
+        async with self.conn.pipeline(transaction=False) as pipe:
+            for checkpoint_id in checkpoint_ids:
+                pipe.hget(
+                    _make_redis_checkpoint_key(
+                        self._thread_key(thread_id), checkpoint_ns, checkpoint_id
+                    ),
+                    "metadata_index",
+                )
+            suffixes = await pipe.execute()
+
+        prefix = _make_redis_checkpoint_metadata_index_prefix(
+            self._thread_key(thread_id), checkpoint_ns
         )
-        return latest_key.decode()
+        index_keys = {}
+        for checkpoint_id, value in zip(checkpoint_ids, suffixes):
+            for suffix in value.decode().split("\n") if value else []:
+                index_keys.setdefault(prefix + suffix, []).append(checkpoint_id)
+        return index_keys
+
+    async def _awrites_keys(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_ids: Iterable[str]
+    ) -> List[str]:
+        """List every key holding pending writes of the given checkpoints."""
+        if self.key_schema == 2:
+            return [
+                _make_redis_checkpoint_writes_hash_key(
+                    self._thread_key(thread_id), checkpoint_ns, checkpoint_id
+                )
+                for checkpoint_id in checkpoint_ids
+            ]
+
+        index_keys = [
+            _make_redis_checkpoint_writes_index_key(
+                self._thread_key(thread_id), checkpoint_ns, checkpoint_id
+            )
+            for checkpoint_id in checkpoint_ids
+        ]
+        async with self.conn.pipeline(transaction=False) as pipe:
+            for index_key in index_keys:
+                pipe.smembers(index_key)
+            members = await pipe.execute()
+        return index_keys + [key.decode() for keys in members for key in keys]
@@ -0,0 +1,126 @@
+"""
+Compression of the values serialized by the Redis checkpointer.
+
+Compressed values keep the type returned by the wrapped serializer, suffixed with
+the codec that compressed them, e.g. `msgpack+zlib`. Values without a codec
+marker are read as they are, so data written without compression, or before it
+was introduced, stays readable.
+"""
+
+import zlib
+from typing import Any, Callable, Optional
+
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from pydantic import BaseModel, Field, field_validator
+
+CODEC_SEPARATOR = "+"
+
+# Codec name -> (compress(data, level), decompress(data)), zlib is always available
+CODECS: dict[
+    str, tuple[Callable[[bytes, Optional[int]], bytes], Callable[[bytes], bytes]]
+] = {
+    "zlib": (
+        lambda data, level: zlib.compress(data, -1 if level is None else level),
+        zlib.decompress,
+    ),
+}
+
+# Every codec the serializer knows about, installed or not
+KNOWN_CODECS = ("zlib", "zstd", "lz4")
+
+try:
+    import zstandard
+
+    CODECS["zstd"] = (
+        lambda data, level: zstandard.ZstdCompressor(
+            level=3 if level is None else level
+        ).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+except ImportError:
+    pass
+
+try:
+    import lz4.frame
+
+    CODECS["lz4"] = (
+        lambda data, level: lz4.frame.compress(
+            data, compression_level=0 if level is None else level
+        ),
+        lz4.frame.decompress,
+    )
+except ImportError:
+    pass
+
+
+class CompressionSettings(BaseModel):
+    """
+    Compression settings, configured under `checkpointer.kwargs.compression` in agent.yaml.
+
+    Attributes:
+        codec (str): zlib, zstd or lz4, or auto for the fastest installed codec.
+        threshold_bytes (int): Serialized values smaller than this are stored uncompressed.
+        level (Optional[int]): Compression level, None uses the default of the codec.
+    """
+
+    codec: str = Field(default="auto", validate_default=True)
+    threshold_bytes: int = Field(default=1024, ge=0)
+    level: Optional[int] = None
+
+    @field_validator("codec")
+    @classmethod
+    def validate_codec(cls, codec: str) -> str:
+        if codec == "auto":
+            return next(codec for codec in ("lz4", "zstd", "zlib") if codec in CODECS)
+        if codec not in KNOWN_CODECS:
+            raise ValueError(f"Unknown codec {codec}, expected one of {KNOWN_CODECS}")
+        if codec not in CODECS:
+            raise ValueError(f"Codec {codec} is not installed")
+        return codec
+
+
+class CompressedSerializer(SerializerProtocol):
+    """
+    Serializer compressing the typed values of another serializer.
+
+    `dumps` and `loads`, used for the small metadata dicts, are not compressed.
+
+    Attributes:
+        serde (SerializerProtocol): Serializer producing the uncompressed values.
+        settings (Optional[CompressionSettings]): None only decompresses existing values.
+    """
+
+    def __init__(
+        self, serde: SerializerProtocol, settings: Optional[CompressionSettings] = None
+    ):
+        self.serde = serde
+        self.settings = settings
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.serde.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self.serde.loads(data)
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(obj)
+        if self.settings is None or len(data) < self.settings.threshold_bytes:
+            return type_, data
+        compress, _ = CODECS[self.settings.codec]
+        compressed = compress(data, self.settings.level)
+        # Incompressible values, e.g. already compressed bytes, are kept as they are
+        if len(compressed) >= len(data):
+            return type_, data
+        return f"{type_}{CODEC_SEPARATOR}{self.settings.codec}", compressed
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, value = data
+        base_type, separator, codec = type_.rpartition(CODEC_SEPARATOR)
+        if separator and codec in KNOWN_CODECS:
+            if codec not in CODECS:
+                raise ValueError(
+                    f"Checkpoint compressed with {codec}, which is not installed"
+                )
+            _, decompress = CODECS[codec]
+            type_, value = base_type, decompress(value)
+        return self.serde.loads_typed((type_, value))
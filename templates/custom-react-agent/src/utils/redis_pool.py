@@ -0,0 +1,58 @@
+"""
+Redis connection pool shared by the checkpointer for the lifetime of the application.
+"""
+
+import time
+
+from redis.asyncio import BlockingConnectionPool
+
+
+class InstrumentedConnectionPool(BlockingConnectionPool):
+    """
+    Blocking connection pool keeping counters about its connections.
+
+    Callers wait, up to `timeout` seconds, for a connection to be released when
+    all `max_connections` are in use, instead of failing straight away.
+
+    Attributes:
+        created_connections (int): Connections opened since the pool was created.
+        checkouts (int): Connections handed out by the pool.
+        wait_seconds (float): Total time spent getting a connection, including
+            waiting for a free one and connecting new ones.
+        max_wait_seconds (float): Longest time spent getting a single connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_connections = 0
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def make_connection(self):
+        self.created_connections += 1
+        return super().make_connection()
+
+    async def get_connection(self, command_name=None, *keys, **options):
+        # redis-py 6 and later call get_connection() without a command name
+        start = time.perf_counter()
+        connection = await super().get_connection(command_name, *keys, **options)
+        waited = time.perf_counter() - start
+        self.checkouts += 1
+        self.wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return connection
+
+    def stats(self) -> dict:
+        """Pool size, usage and wait time, e.g. for metrics."""
+        return {
+            "max_connections": self.max_connections,
+            "in_use_connections": len(self._in_use_connections),
+            "available_connections": len(self._available_connections),
+            "created_connections": self.created_connections,
+            "checkouts": self.checkouts,
+            "avg_wait_ms": 1000 * self.wait_seconds / self.checkouts
+            if self.checkouts
+            else 0.0,
+            "max_wait_ms": 1000 * self.max_wait_seconds,
+        }
@@ -0,0 +1,524 @@
+"""
+Implementation of a langgraph checkpoint saver using SQLite, for single-node deployments.
+
+Checkpoints and pending writes live in two tables of a single database file,
+keyed by (thread_id, checkpoint_ns, checkpoint_id), so that reading the latest
+checkpoint of a thread or a page of its history is an index range scan. The
+database runs in WAL mode: readers never block the writer, and a commit only
+appends to the log.
+
+sqlite3 is blocking, so every statement runs on a single worker thread owning
+the connection, off the event loop. The aput_writes calls of the tasks of a
+super-step, which LangGraph issues concurrently, are committed together in one
+transaction.
+"""
+
+import asyncio
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Callable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+
+from src.utils.checkpoint_serde import CheckpointSerializer
+from src.utils.logger import logger
+from src.utils.redis_checkpointer import (
+    CheckpointMetadataTuple,
+    _make_checkpoint_config,
+)
+from src.utils.redis_compression import CompressedSerializer, CompressionSettings
+
+# Number of checkpoints alist reads per query
+LIST_PAGE_SIZE = 50
+
+# Values of PRAGMA synchronous allowed in WAL mode. NORMAL only syncs the log at
+# checkpoints of the WAL: a power loss may lose the latest commits, never corrupt.
+SYNCHRONOUS_MODES = ("NORMAL", "FULL")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+class AsyncSqliteSaver(BaseCheckpointSaver):
+    """Async SQLite-based checkpoint saver implementation.
+
+    Same interface as AsyncRedisSaver, for deployments without a Redis. The
+    database file must only be opened by a single process.
+    """
+
+    conn: sqlite3.Connection
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        *,
+        compression: Union[CompressionSettings, dict, None] = None,
+        serde: str = "jsonplus",
+    ):
+        # Reads every format whatever the format written, see SERDE_FORMATS
+        super().__init__(serde=CheckpointSerializer(serde))
+        if isinstance(compression, dict):
+            compression = CompressionSettings(**compression)
+        # Always wrapped, so compressed checkpoints stay readable when it is disabled
+        self.serde = CompressedSerializer(self.serde, compression)
+        self.conn = conn
+        # The connection is only ever used from this thread
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="sqlite-checkpointer"
+        )
+        # aput_writes calls waiting for the next transaction
+        self._write_batch: List[Tuple[list, bool, asyncio.Future]] = []
+        self._write_batch_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    @asynccontextmanager
+    async def from_path(
+        cls,
+        *,
+        path: str,
+        synchronous: str = "NORMAL",
+        busy_timeout: float = 5,
+        compression: Union[CompressionSettings, dict, None] = None,
+        serde: str = "jsonplus",
+    ) -> AsyncIterator["AsyncSqliteSaver"]:
+        """Open, and create if needed, a SQLite database in WAL mode.
+
+        The database is closed, together with the saver, when the context exits, so the
+        context should span the lifetime of the application.
+
+        Args:
+            path: Path of the database file, its directory must exist
+            synchronous: When commits are synced to disk, see SYNCHRONOUS_MODES
+            busy_timeout: Seconds to wait for a lock held by another connection
+            compression: Compression of serialized checkpoints and writes, None disables it
+            serde: Format checkpoints and writes are serialized with, see SERDE_FORMATS
+
+        Returns:
+            AsyncSqliteSaver instance
+        """
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(
+                f"Invalid synchronous mode: {synchronous}, expected one of {SYNCHRONOUS_MODES}"
+            )
+        conn = sqlite3.connect(
+            path, timeout=busy_timeout, isolation_level=None, check_same_thread=False
+        )
+        saver = AsyncSqliteSaver(conn, compression=compression, serde=serde)
+        try:
+            await saver._run(saver._setup, synchronous)
+            logger.info(f"SQLite checkpointer opened at {path}")
+            yield saver
+        finally:
+            await saver.aclose()
+
+    async def aclose(self) -> None:
+        """Commit pending writes, then close the database and its worker thread."""
+        if self._write_batch_task is not None:
+            await asyncio.gather(self._write_batch_task, return_exceptions=True)
+        await self._run(self.conn.close)
+        self._executor.shutdown()
+
+    async def _run(self, fn: Callable, *args) -> Any:
+        """Run blocking database code on the worker thread."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, fn, *args
+        )
+
+    @contextmanager
+    def _transaction(self):
+        """Run statements in a single transaction, rolled back on error."""
+        self.conn.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+
+    def _setup(self, synchronous: str):
+        journal_mode = self.conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        if journal_mode != "wal":
+            logger.warning(f"SQLite WAL mode unavailable, using {journal_mode}")
+        self.conn.execute(f"PRAGMA synchronous={synchronous}")
+        self.conn.executescript(SCHEMA)
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Save a checkpoint to the database asynchronously.
+
+        Args:
+            config (RunnableConfig): The config to associate with the checkpoint.
+            checkpoint (Checkpoint): The checkpoint to save.
+            metadata (CheckpointMetadata): Additional metadata to save with the checkpoint.
+            new_versions (ChannelVersions): New channel versions as of this write.
+
+        Returns:
+            RunnableConfig: Updated configuration after storing the checkpoint.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        row = (
+            thread_id,
+            checkpoint_ns,
+            checkpoint["id"],
+            config["configurable"].get("checkpoint_id"),
+            type_,
+            serialized_checkpoint,
+            self.serde.dumps(metadata).decode(),
+        )
+        await self._run(self._put_checkpoint, row)
+        return _make_checkpoint_config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def _put_checkpoint(self, row: tuple):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?)", row
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: List[Tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        """Store intermediate writes linked to a checkpoint asynchronously.
+
+        Calls made while a transaction is pending are committed together in the
+        next one.
+
+        Args:
+            config (RunnableConfig): Configuration of the related checkpoint.
+            writes (List[Tuple[str, Any]]): List of writes to store, each as (channel, value) pair.
+            task_id (str): Identifier for the task creating the writes.
+        """
+        if not writes:
+            return
+        configurable = config["configurable"]
+        # Special channels (errors, interrupts, ...) replace earlier writes of the task,
+        # regular writes must never clobber what a previous attempt already stored
+        overwrite = all(w[0] in WRITES_IDX_MAP for w in writes)
+        rows = [
+            (
+                configurable["thread_id"],
+                configurable["checkpoint_ns"],
+                configurable["checkpoint_id"],
+                task_id,
+                WRITES_IDX_MAP.get(channel, idx),
+                channel,
+                *self.serde.dumps_typed(value),
+            )
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        future = asyncio.get_running_loop().create_future()
+        self._write_batch.append((rows, overwrite, future))
+        if self._write_batch_task is None:
+            self._write_batch_task = asyncio.create_task(self._acommit_writes())
+        await future
+
+    async def _acommit_writes(self):
+        # Let the other tasks of the super-step join the batch
+        await asyncio.sleep(0)
+        batch, self._write_batch, self._write_batch_task = self._write_batch, [], None
+        try:
+            await self._run(self._put_writes, batch)
+        except BaseException as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for _, _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    def _put_writes(self, batch: list):
+        with self._transaction():
+            for rows, overwrite, _ in batch:
+                self.conn.executemany(
+                    f"INSERT OR {'REPLACE' if overwrite else 'IGNORE'} INTO writes "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Get a checkpoint tuple from the database asynchronously.
+
+        If the config contains a "checkpoint_id" key, the checkpoint with the matching
+        thread ID and checkpoint ID is retrieved. Otherwise, the latest checkpoint
+        for the given thread ID is retrieved.
+
+        Args:
+            config (RunnableConfig): The config to use for retrieving the checkpoint.
+
+        Returns:
+            Optional[CheckpointTuple]: The retrieved checkpoint tuple, or None if no matching checkpoint was found.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id:
+            query, args = (
+                "AND checkpoint_id = ?",
+                [thread_id, checkpoint_ns, checkpoint_id],
+            )
+        else:
+            query, args = "", [thread_id, checkpoint_ns]
+        rows = await self._run(self._read_checkpoints, query, args, 1)
+        return rows[0] if rows else None
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncGenerator[CheckpointTuple, None]:
+        """List checkpoints from the database asynchronously, newest first.
+
+        Checkpoints are streamed LIST_PAGE_SIZE at a time. Filters on scalar metadata
+        values are applied by the query, other filters are checked against the
+        metadata of the listed checkpoints.
+
+        Args:
+            config (Optional[RunnableConfig]): Base configuration for filtering checkpoints.
+            filter (Optional[Dict[str, Any]]): Additional filtering criteria for metadata.
+            before (Optional[RunnableConfig]): If provided, only checkpoints before the specified checkpoint ID are returned. Defaults to None.
+            limit (Optional[int]): Maximum number of checkpoints to return.
+
+        Yields:
+            AsyncIterator[CheckpointTuple]: An asynchronous iterator of matching checkpoint tuples.
+        """
+        async for checkpoint_tuple in self._alist_pages(
+            config, self._read_checkpoints, filter=filter, before=before, limit=limit
+        ):
+            yield checkpoint_tuple
+
+    async def alist_metadata(
+        self,
+        config: RunnableConfig,
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncGenerator[CheckpointMetadataTuple, None]:
+        """List the metadata of checkpoints, newest first, without loading the checkpoints.
+
+        Args:
+            config (RunnableConfig): Config of the thread and namespace to list.
+            filter (Optional[Dict[str, Any]]): Additional filtering criteria for metadata.
+            before (Optional[RunnableConfig]): If provided, only checkpoints before the specified checkpoint ID are returned.
+            limit (Optional[int]): Maximum number of checkpoints to return.
+
+        Yields:
+            AsyncIterator[CheckpointMetadataTuple]: The config, metadata and parent config of each matching checkpoint.
+        """
+        async for metadata_tuple in self._alist_pages(
+            config,
+            self._read_checkpoint_metadata,
+            filter=filter,
+            before=before,
+            limit=limit,
+        ):
+            yield metadata_tuple
+
+    async def _alist_pages(
+        self,
+        config: RunnableConfig,
+        read_page: Callable[[str, list, int], list],
+        *,
+        filter: Optional[dict[str, Any]],
+        before: Optional[RunnableConfig],
+        limit: Optional[int],
+    ) -> AsyncIterator[Any]:
+        """
+        Read the checkpoints of a (thread, namespace) matching a filter, page by page.
+
+        Args:
+            config (RunnableConfig): Config of the thread and namespace to list.
+            read_page (Callable): Reads a page of items on the worker thread, from the extra
+                WHERE clause, its arguments and the page size.
+            filter (Optional[dict[str, Any]]): Metadata the checkpoints must have.
+            before (Optional[RunnableConfig]): Only checkpoints older than this one are read.
+            limit (Optional[int]): Maximum number of items to yield.
+
+        Yields:
+            The items returned by read_page for matching checkpoints, newest first.
+        """
+        if limit is not None and limit <= 0:
+            return
+
+        where, filter_args, unindexed_filter = "", [], {}
+        for field, value in (filter or {}).items():
+            if value is None or isinstance(value, (str, int, float)):
+                # json_extract returns JSON scalars as SQL values
+                where += " AND json_extract(metadata, ?) IS ?"
+                filter_args.extend([f"$.{json.dumps(field)}", value])
+            else:
+                unindexed_filter[field] = value
+
+        upper_bound = get_checkpoint_id(before) if before else None
+        while True:
+            args = [
+                config["configurable"]["thread_id"],
+                config["configurable"].get("checkpoint_ns", ""),
+                *filter_args,
+            ]
+            query = where
+            if upper_bound:
+                query += " AND checkpoint_id < ?"
+                args.append(upper_bound)
+            items = await self._run(read_page, query, args, LIST_PAGE_SIZE)
+            for item in items:
+                if not all(
+                    item.metadata.get(field) == value
+                    for field, value in unindexed_filter.items()
+                ):
+                    continue
+                yield item
+                if limit is not None:
+                    limit -= 1
+                    if limit == 0:
+                        return
+            if len(items) < LIST_PAGE_SIZE:
+                return
+            upper_bound = items[-1].config["configurable"]["checkpoint_id"]
+
+    def _read_checkpoints(
+        self, where: str, args: list, page_size: int
+    ) -> List[CheckpointTuple]:
+        """Read checkpoints, newest first, with their pending writes in one transaction."""
+        with self._transaction():
+            rows = self.conn.execute(
+                "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+                "type, checkpoint, metadata FROM checkpoints "
+                f"WHERE thread_id = ? AND checkpoint_ns = ? {where} "
+                "ORDER BY checkpoint_id DESC LIMIT ?",
+                [*args, page_size],
+            ).fetchall()
+            writes = {}
+            if rows:
+                for checkpoint_id, task_id, channel, type_, value in self.conn.execute(
+                    "SELECT checkpoint_id, task_id, channel, type, value FROM writes "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? "
+                    f"AND checkpoint_id IN ({', '.join('?' * len(rows))}) "
+                    "ORDER BY checkpoint_id, task_id, idx",
+                    [rows[0][0], rows[0][1], *(row[2] for row in rows)],
+                ):
+                    writes.setdefault(checkpoint_id, []).append(
+                        (task_id, channel, self.serde.loads_typed((type_, value)))
+                    )
+
+        return [
+            CheckpointTuple(
+                config=_make_checkpoint_config(thread_id, checkpoint_ns, checkpoint_id),
+                checkpoint=self.serde.loads_typed((type_, checkpoint)),
+                metadata=self.serde.loads(metadata.encode()),
+                parent_config=_make_checkpoint_config(
+                    thread_id, checkpoint_ns, parent_checkpoint_id
+                )
+                if parent_checkpoint_id
+                else None,
+                pending_writes=writes.get(checkpoint_id, []),
+            )
+            for (
+                thread_id,
+                checkpoint_ns,
+                checkpoint_id,
+                parent_checkpoint_id,
+                type_,
+                checkpoint,
+                metadata,
+            ) in rows
+        ]
+
+    def _read_checkpoint_metadata(
+        self, where: str, args: list, page_size: int
+    ) -> List[CheckpointMetadataTuple]:
+        """Read the metadata and parent of checkpoints, newest first."""
+        rows = self.conn.execute(
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+            "metadata FROM checkpoints "
+            f"WHERE thread_id = ? AND checkpoint_ns = ? {where} "
+            "ORDER BY checkpoint_id DESC LIMIT ?",
+            [*args, page_size],
+        ).fetchall()
+        return [
+            CheckpointMetadataTuple(
+                config=_make_checkpoint_config(thread_id, checkpoint_ns, checkpoint_id),
+                metadata=self.serde.loads(metadata.encode()),
+                parent_config=_make_checkpoint_config(
+                    thread_id, checkpoint_ns, parent_checkpoint_id
+                )
+                if parent_checkpoint_id
+                else None,
+            )
+            for (
+                thread_id,
+                checkpoint_ns,
+                checkpoint_id,
+                parent_checkpoint_id,
+                metadata,
+            ) in rows
+        ]
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """
+        Delete every checkpoint and pending write of a thread, in all namespaces.
+
+        Args:
+            thread_id (str): The thread to delete.
+        """
+        await self._run(self._delete_thread, thread_id)
+
+    def _delete_thread(self, thread_id: str):
+        with self._transaction():
+            self.conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ?", [thread_id]
+            )
+            self.conn.execute("DELETE FROM writes WHERE thread_id = ?", [thread_id])
@@ -1,5 +1,29 @@
-from src.utils.chat import print_event, get_ai_response
+from typing import AsyncIterator
+
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+
+from src.utils.chat import (
+    get_ai_response,
+    get_message_text,
+    get_update_messages,
+    print_event,
+)
 from src.core.graphs.graph_builder import GraphBuilder
+from src.utils.checkpointer_factory import CheckpointerFactory
+from src.utils.logger import logger
+
+
+async def _aflush_failed_run(thread_id: str):
+    """
+    Save the checkpoints a failed run buffered in write-behind mode.
+
+    A failure to save them is logged rather than raised, so that the caller sees
+    the error of the run instead.
+    """
+    try:
+        await CheckpointerFactory.aflush(thread_id)
+    except Exception:
+        logger.exception("Failed to flush the checkpoints of thread %s", thread_id)
 
 
 async def run_agent(thread_id: str, user_input: str):
@@ -8,8 +32,8 @@ async def run_agent(thread_id: str, user_input: str):
 
     This function takes a thread ID and user input, constructs the necessary
     configuration and input messages, and processes them through the agent's
-    graph. It streams events generated during the processing and collects
-    them for further handling.
+    graph. It streams the updates of the graph's nodes and keeps the last AI
+    response found in them.
 
     Args:
         thread_id (str): Unique identifier for the conversation thread.
@@ -20,12 +44,91 @@ async def run_agent(thread_id: str, user_input: str):
     """
     graph = await GraphBuilder.get_graph()
     config = {"configurable": {"thread_id": thread_id}}
-    inputs = {"messages": [("user", user_input)]}
-    events = []
+    response = None
 
-    async for event in graph.astream(inputs, config=config, stream_mode="values"):
-        print_event(event)
-        events.append(event)
+    try:
+        # Each event only holds the output of the nodes that just completed, not the
+        # whole state, and is dropped once its AI response, if any, is read
+        async for event in graph.astream(
+            {"messages": [("user", user_input)]}, config=config, stream_mode="updates"
+        ):
+            print_event(event)
+            response = get_ai_response(event) or response
+    except BaseException:
+        await _aflush_failed_run(thread_id)
+        raise
+    # Checkpoints buffered in write-behind mode are saved when the run ends
+    await CheckpointerFactory.aflush(thread_id)
 
-    response = await get_ai_response(events)
     return {"response": response}
+
+
+async def stream_agent(
+    thread_id: str, user_input: str
+) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Asynchronously runs the agent's workflow, yielding its progress as it happens.
+
+    The graph is streamed in `messages` mode, which emits the tokens of the model
+    while it generates them, and in `updates` mode, which emits the output of
+    each node when it completes.
+
+    Args:
+        thread_id (str): Unique identifier for the conversation thread.
+        user_input (str): The input message from the user to be processed.
+
+    Yields:
+        tuple[str, dict]: The name and data of each event:
+            - `token` for every chunk of text generated by the model,
+            - `tool_start` for every tool call requested by the model,
+            - `tool_end` with the result of every tool call,
+            - `node` when a node of the graph completes,
+            - `final` with the AI's response, once the run is over.
+    """
+    graph = await GraphBuilder.get_graph()
+    config = {"configurable": {"thread_id": thread_id}}
+    response = None
+
+    try:
+        async for mode, chunk in graph.astream(
+            {"messages": [("user", user_input)]},
+            config=config,
+            stream_mode=["messages", "updates"],
+        ):
+            if mode == "messages":
+                message, metadata = chunk
+                if isinstance(message, AIMessageChunk) and message.content:
+                    yield "token", {
+                        "node": metadata.get("langgraph_node"),
+                        "content": get_message_text(message),
+                    }
+                continue
+
+            for node, update in chunk.items():
+                for message in get_update_messages(update):
+                    if isinstance(message, AIMessage):
+                        for tool_call in message.tool_calls:
+                            yield "tool_start", {
+                                "node": node,
+                                "id": tool_call["id"],
+                                "name": tool_call["name"],
+                                "args": tool_call["args"],
+                            }
+                        if not message.tool_calls:
+                            response = get_message_text(message)
+                    elif isinstance(message, ToolMessage):
+                        yield "tool_end", {
+                            "node": node,
+                            "id": message.tool_call_id,
+                            "name": message.name,
+                            "content": get_message_text(message),
+                        }
+                yield "node", {"node": node}
+    except BaseException:
+        # Also raised when the client disconnects and the stream is closed early
+        await _aflush_failed_run(thread_id)
+        raise
+    # Checkpoints buffered in write-behind mode are saved when the run ends
+    await CheckpointerFactory.aflush(thread_id)
+
+    yield "final", {"response": response}
@@ -19,6 +19,7 @@ from langchain_mcp_adapters.client import MultiServerMCPClient
 from src.config import settings
 from src.utils.logger import logger
 from src.utils.checkpointer_factory import CheckpointerFactory
+from src.utils.history import HistoryManager, history_prompt
 
 
 class MCPClientManager:
@@ -146,6 +147,13 @@ class GraphBuilder:
         """
         if instance._graph is None:
             prompt = settings.AGENT_CONFIG.get("prompt", "You are a helpful assistant.")
+            # Optional token budget of the messages sent to the model, applied by the
+            # prompt before every model call
+            history_config = dict(settings.get("history", {}))
+            summary_threads = history_config.pop("summary_threads", 1024)
+            history_manager = HistoryManager.from_config(history_config, MODEL)
+            if history_manager is not None:
+                prompt = history_prompt(prompt, history_manager, summary_threads)
             checkpointer_type = settings.get("checkpointer.type", "in_memory")
             checkpointer_kwargs = settings.get("checkpointer.kwargs", {})
 
@@ -1,64 +1,121 @@
-from langchain_core.messages import AIMessage
+import json
+import logging
+from typing import Optional
 
+from langchain_core.messages import AIMessage, BaseMessage
 
-def print_event(event):
+from src.utils.logger import logger
+
+
+def get_update_messages(update) -> list:
+    """
+    Retrieves the messages written by a node, from its output in an `updates` stream event.
+
+    Args:
+        update: The output of the node, a dictionary of state updates or None.
+
+    Returns:
+        list: The messages written by the node, empty if it wrote none.
+    """
+    if not isinstance(update, dict):
+        return []
+    messages = update.get("messages", [])
+    return messages if isinstance(messages, list) else [messages]
+
+
+class PrettyMessage:
+    """Renders a message with pretty_repr only when it is logged."""
+
+    __slots__ = ("message",)
+
+    def __init__(self, message: BaseMessage):
+        self.message = message
+
+    def __str__(self) -> str:
+        return self.message.pretty_repr()
+
+
+def print_event(event: dict):
+    """
+    Logs the messages written by the nodes of an `updates` stream event, at DEBUG level.
+
+    Nothing is done unless DEBUG logging is enabled. The messages, which include
+    full tool outputs, are then rendered by the logging thread rather than in
+    the request.
+
+    Args:
+        event (dict): A dictionary mapping each node that completed to its output.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    for node, update in event.items():
+        for message in get_update_messages(update):
+            if isinstance(message, BaseMessage):
+                logger.debug("%s", PrettyMessage(message), extra={"node": node})
+
+
+def get_ai_response(event: dict) -> Optional[str]:
     """
-    Prints the last message from the event if available.
+    Retrieves the AI response from an `updates` stream event.
 
-    This function retrieves the 'messages' from the provided event dictionary.
-    If messages are present, it checks if they are in a list format. If so, it
-    selects the last message and calls its pretty_print method to display it.
+    The response is the content of the last AI message that does not involve tool
+    calls. Only the messages written by the event's nodes are read, so a run is
+    consumed one event at a time without keeping earlier events, or the state of
+    the thread, alive.
 
     Args:
-        event (dict): A dictionary containing event data, expected to have a
-                      'messages' key that holds a list of message objects.
+        event (dict): A dictionary mapping each node that completed to its output.
+
+    Returns:
+        str or None: The content of the AI message as a string, or None if the event
+                     has no such message.
     """
-    message = event.get("messages", [])
-    if message:
-        if isinstance(message, list):
-            message = message[-1]  # Select the last message if it's a list
-        message.pretty_print()  # Print the message in a formatted way
+    response = None
+    for update in event.values():
+        for message in get_update_messages(update):
+            if isinstance(message, AIMessage) and not message.tool_calls:
+                response = get_message_text(message)
+    return response
 
 
-async def get_ai_response(events):
+def get_message_text(message: BaseMessage) -> str:
     """
-    Retrieves the AI response from a list of events.
+    Extracts the content of a message as a single string.
 
-    This asynchronous function processes a list of events in reverse order to find
-    the last AI message that does not involve tool calls. It extracts the content
-    of the message, which can be in various formats (string, list, or dictionary),
-    and returns it as a single string. If an error occurs during this process,
-    the error message is returned instead.
+    The content can be in various formats (string, list, or dictionary). If an
+    error occurs while converting it, the error message is returned instead.
+
+    Args:
+        message (BaseMessage): The message, or message chunk, to read.
+
+    Returns:
+        str: The content of the message as a string.
+    """
+    try:
+        content = message.content  # Extract the content of the message
+        if isinstance(content, str):
+            return content  # Return string content directly
+        elif isinstance(content, list):
+            # Flatten the list of content and join into a single string
+            return " ".join([str(item) for sublist in content for item in sublist])
+        elif isinstance(content, dict):
+            # Join string values from the dictionary into a single string
+            return " ".join([str(v) for k, v in content.items() if isinstance(v, str)])
+        else:
+            return str(content)  # Convert other types to string
+    except Exception as e:
+        return str(e)  # Return the error message as a string
+
+
+def format_sse(event: str, data: dict) -> str:
+    """
+    Formats an event as a Server-Sent Events message.
 
     Args:
-        events (list): A list of event dictionaries, each potentially containing
-                       a 'messages' key with a list of message objects.
+        event (str): Name of the event, e.g. `token` or `final`.
+        data (dict): Payload of the event, sent as JSON on a single data line.
 
     Returns:
-        str or None: The content of the last AI message as a string, or None if no
-                     valid message is found.
+        str: The message, terminated by a blank line.
     """
-    for event in reversed(events):  # Process events in reverse order
-        if event.get("messages"):  # Check if there are messages in the event
-            last_message = event["messages"][-1]  # Get the last message
-            if isinstance(last_message, AIMessage) and not last_message.tool_calls:
-                try:
-                    content = last_message.content  # Extract the content of the message
-                    if isinstance(content, str):
-                        return content  # Return string content directly
-                    elif isinstance(content, list):
-                        # Flatten the list of content and join into a single string
-                        return " ".join(
-                            [str(item) for sublist in content for item in sublist]
-                        )
-                    elif isinstance(content, dict):
-                        # Join string values from the dictionary into a single string
-                        return " ".join(
-                            [str(v) for k, v in content.items() if isinstance(v, str)]
-                        )
-                    else:
-                        return str(content)  # Convert other types to string
-                except Exception as e:
-                    return str(e)  # Return the error message as a string
-
-    return None  # Return None if no valid message is found
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -0,0 +1,280 @@
+"""
+Read-through cache of the latest checkpoint of each thread, in front of the Redis saver.
+
+Every turn of a conversation starts by reading the latest checkpoint of its
+thread, which the same process usually wrote moments before. The cache keeps
+the deserialized CheckpointTuple written by `aput` and `aput_writes`, so such
+reads skip the checkpoint script and the deserialization.
+
+Entries are validated against the version the saver increments on every write
+to a thread: a single GET per read keeps several replicas writing to the same
+Redis coherent.
+"""
+
+from collections import OrderedDict
+from typing import Any, AsyncIterator, List, Optional, Tuple, Union
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    copy_checkpoint,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from pydantic import BaseModel, Field
+
+from src.utils.redis_checkpointer import AsyncRedisSaver
+
+
+class CacheSettings(BaseModel):
+    """
+    Cache settings, configured under `checkpointer.kwargs.cache` in agent.yaml.
+
+    Attributes:
+        max_threads (int): Threads whose latest checkpoint is cached, least recently used
+            ones are evicted first.
+        verify (bool): Check the version of the thread in Redis before serving a cached
+            checkpoint. Only disable it when a single process writes to the Redis.
+    """
+
+    max_threads: int = Field(default=1024, ge=1)
+    verify: bool = True
+
+
+class CachedCheckpointSaver(BaseCheckpointSaver):
+    """
+    Saver caching the latest checkpoint of each thread in front of an AsyncRedisSaver.
+
+    Methods other than the checkpoint API are forwarded to the wrapped saver.
+
+    Attributes:
+        saver (AsyncRedisSaver): Saver the checkpoints are read from and written to.
+        settings (CacheSettings): Size and coherence of the cache.
+        hits (int): Reads of the latest checkpoint served from the cache.
+        misses (int): Reads of the latest checkpoint that went to Redis.
+    """
+
+    def __init__(
+        self,
+        saver: AsyncRedisSaver,
+        settings: Union[CacheSettings, dict, None] = None,
+    ):
+        super().__init__(serde=saver.serde)
+        if settings is None:
+            settings = CacheSettings()
+        elif isinstance(settings, dict):
+            settings = CacheSettings(**settings)
+        self.saver = saver
+        self.settings = settings
+        self.hits = 0
+        self.misses = 0
+        # (thread_id, checkpoint_ns) -> (version, checkpoint tuple, pending writes by
+        # (task_id, idx)), the writes are None when the entry was read from Redis
+        self._entries: OrderedDict[
+            Tuple[str, str], Tuple[int, CheckpointTuple, Optional[dict]]
+        ] = OrderedDict()
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "saver":
+            raise AttributeError(name)
+        return getattr(self.saver, name)
+
+    @property
+    def config_specs(self) -> list:
+        return self.saver.config_specs
+
+    def get_next_version(self, current: Optional[Any], channel: Any) -> Any:
+        return self.saver.get_next_version(current, channel)
+
+    def stats(self) -> dict:
+        """Cached threads and hit/miss counters, e.g. for metrics."""
+        return {"threads": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Get a checkpoint tuple, from the cache when it is the latest of its thread."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        key = (thread_id, checkpoint_ns)
+        entry = self._entries.get(key)
+        if checkpoint_id is not None and (
+            entry is None
+            or checkpoint_id != entry[1].config["configurable"]["checkpoint_id"]
+        ):
+            # Not cached: the version of the thread is only read to validate an entry
+            return await self.saver.aget_tuple(config)
+
+        version = (
+            await self.saver.aget_version(thread_id, checkpoint_ns)
+            if self.settings.verify or entry is None
+            else entry[0]
+        )
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return _copy_checkpoint_tuple(entry[1])
+
+        self.misses += 1
+        checkpoint_tuple = await self.saver.aget_tuple(config)
+        if checkpoint_tuple is None:
+            self._entries.pop(key, None)
+        elif checkpoint_id is None:
+            # The version was read first, a concurrent write can only make the
+            # entry look older than it is and cause an extra miss
+            self._store(key, version, checkpoint_tuple, None)
+        return checkpoint_tuple
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """List checkpoints from the wrapped saver, the cache is not used."""
+        async for checkpoint_tuple in self.saver.alist(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Save a checkpoint and cache it as the latest of its thread."""
+        next_config, version = await self.saver._aput(
+            config, checkpoint, metadata, new_versions
+        )
+        configurable = next_config["configurable"]
+        parent_checkpoint_id = config["configurable"].get("checkpoint_id")
+        self._store(
+            (configurable["thread_id"], configurable["checkpoint_ns"]),
+            version,
+            CheckpointTuple(
+                config=next_config,
+                checkpoint=copy_checkpoint(checkpoint),
+                metadata=metadata,
+                parent_config={
+                    "configurable": {
+                        "thread_id": configurable["thread_id"],
+                        "checkpoint_ns": configurable["checkpoint_ns"],
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None,
+                pending_writes=[],
+            ),
+            {},
+        )
+        return next_config
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: List[Tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        """Store writes and add them to the cached checkpoint they belong to."""
+        version = await self.saver._aput_writes(config, writes, task_id)
+        if version is None:
+            return
+        configurable = config["configurable"]
+        key = (configurable["thread_id"], configurable["checkpoint_ns"])
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        cached_version, checkpoint_tuple, pending_writes = entry
+        same_checkpoint = (
+            checkpoint_tuple.config["configurable"]["checkpoint_id"]
+            == configurable["checkpoint_id"]
+        )
+        if cached_version != version - 1 or (
+            same_checkpoint and pending_writes is None
+        ):
+            # Someone else wrote to the thread in between, or the writes already
+            # stored with the entry are unknown
+            del self._entries[key]
+            return
+        if not same_checkpoint:
+            # Writes to an older checkpoint leave the latest one unchanged
+            self._entries[key] = (version, checkpoint_tuple, pending_writes)
+            return
+
+        self._entries[key] = (
+            version,
+            checkpoint_tuple._replace(
+                pending_writes=_merge_pending_writes(
+                    self.serde, pending_writes, writes, task_id
+                )
+            ),
+            pending_writes,
+        )
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Delete a thread and drop it from the cache."""
+        for key in [key for key in self._entries if key[0] == thread_id]:
+            del self._entries[key]
+        await self.saver.adelete_thread(thread_id)
+
+    def _store(
+        self,
+        key: Tuple[str, str],
+        version: int,
+        checkpoint_tuple: CheckpointTuple,
+        pending_writes: Optional[dict],
+    ):
+        self._entries[key] = (version, checkpoint_tuple, pending_writes)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.settings.max_threads:
+            self._entries.popitem(last=False)
+
+
+def _merge_pending_writes(
+    serde: SerializerProtocol,
+    pending_writes: dict,
+    writes: List[Tuple[str, Any]],
+    task_id: str,
+) -> list:
+    """
+    Add the writes of a task to the pending writes of a checkpoint, as the saver stores them.
+
+    Special channels replace earlier writes of the task, regular writes never
+    replace a write already stored.
+
+    Args:
+        serde (SerializerProtocol): Serializer of the saver.
+        pending_writes (dict): Pending writes by (task_id, idx), updated in place.
+        writes (List[Tuple[str, Any]]): Writes of the task, as (channel, value) pairs.
+        task_id (str): The task.
+
+    Returns:
+        list: The pending writes, ordered as the saver returns them.
+    """
+    overwrite = all(w[0] in WRITES_IDX_MAP for w in writes)
+    for idx, (channel, value) in enumerate(writes):
+        write_key = (task_id, WRITES_IDX_MAP.get(channel, idx))
+        if channel in WRITES_IDX_MAP:
+            # Errors and interrupts do not survive serialization unchanged,
+            # serve them as they are read back from Redis
+            value = serde.loads_typed(serde.dumps_typed(value))
+        if overwrite or write_key not in pending_writes:
+            pending_writes[write_key] = (task_id, channel, value)
+    return [pending_writes[write_key] for write_key in sorted(pending_writes)]
+
+
+def _copy_checkpoint_tuple(checkpoint_tuple: CheckpointTuple) -> CheckpointTuple:
+    """Copy a cached tuple, so that callers cannot alter the cache."""
+    return checkpoint_tuple._replace(
+        checkpoint=copy_checkpoint(checkpoint_tuple.checkpoint),
+        pending_writes=list(checkpoint_tuple.pending_writes or []),
+    )
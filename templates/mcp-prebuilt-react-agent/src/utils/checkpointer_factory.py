@@ -1,25 +1,137 @@
-from langgraph.checkpoint.memory import MemorySaver
+from contextlib import AsyncExitStack
+from typing import Optional
+
+from src.utils.checkpoint_cache import CachedCheckpointSaver
+from src.utils.checkpoint_tiered import TieredCheckpointSaver
+from src.utils.checkpoint_write_behind import WriteBehindCheckpointSaver
+from src.utils.memory_checkpointer import BoundedMemorySaver, MemoryLimits
 from src.utils.redis_checkpointer import AsyncRedisSaver
+from src.utils.sqlite_checkpointer import AsyncSqliteSaver
 from src.config import settings
 from src.utils.logger import logger
 
 
 class CheckpointerFactory:
     _redis_pool = None
+    _replicas = None
+    _checkpointer = None
+    # Keeps the Redis or SQLite saver context, and so its connections, open until aclose
+    _exit_stack = None
 
     @classmethod
     async def create_checkpointer(cls, checkpointer_type: str, **kwargs):
         """Create a checkpointer based on the type and kwargs."""
         logger.info(f"Creating checkpointer of type: {checkpointer_type}")
         if checkpointer_type == "in_memory":
-            return MemorySaver()
-        elif checkpointer_type == "redis":
+            # Unbounded, like LangGraph's MemorySaver, unless limits are configured
+            cls._checkpointer = BoundedMemorySaver(
+                MemoryLimits(
+                    max_threads=kwargs.get("max_threads"),
+                    max_bytes=kwargs.get("max_bytes"),
+                    thread_ttl_seconds=kwargs.get("thread_ttl_seconds"),
+                )
+            )
+        elif checkpointer_type in ("redis", "tiered"):
             max_connections = kwargs.get("max_connections", 10)
+            pool_timeout = kwargs.get("pool_timeout", 20)
+            socket_keepalive = kwargs.get("socket_keepalive", True)
+            health_check_interval = kwargs.get("health_check_interval", 30)
+            cluster = kwargs.get("cluster", False)
+            key_schema = kwargs.get("key_schema", 1)
+            retention = kwargs.get("retention")
+            compression = kwargs.get("compression")
+            serde = kwargs.get("serde", "jsonplus")
+            cache = kwargs.get("cache")
+            write_behind = kwargs.get("write_behind")
+            replica_urls = kwargs.get("replica_urls")
+            replica_max_lag_seconds = kwargs.get("replica_max_lag_seconds", 5)
 
-            # Async redis saver already handles connection pooling
-            async with AsyncRedisSaver.from_url(
-                url=settings.REDIS_URL, max_connections=max_connections
-            ) as redis_saver:
-                return redis_saver
+            # The pool lives until aclose is called when the application shuts down
+            await cls.aclose()
+            exit_stack = AsyncExitStack()
+            redis_saver = await exit_stack.enter_async_context(
+                AsyncRedisSaver.from_url(
+                    url=settings.REDIS_URL,
+                    max_connections=max_connections,
+                    pool_timeout=pool_timeout,
+                    socket_keepalive=socket_keepalive,
+                    health_check_interval=health_check_interval,
+                    cluster=cluster,
+                    key_schema=key_schema,
+                    retention=retention,
+                    compression=compression,
+                    serde=serde,
+                    replica_urls=replica_urls,
+                    replica_max_lag_seconds=replica_max_lag_seconds,
+                )
+            )
+            cls._exit_stack = exit_stack
+            cls._redis_pool = redis_saver._pool
+            cls._replicas = redis_saver.replicas
+            if checkpointer_type == "tiered":
+                # Sticky sessions: reads served by the process holding the thread
+                cls._checkpointer = TieredCheckpointSaver(
+                    redis_saver, kwargs.get("hot_tier")
+                )
+            elif cache is not None:
+                cls._checkpointer = CachedCheckpointSaver(redis_saver, cache)
+            else:
+                cls._checkpointer = redis_saver
+            if write_behind is not None:
+                cls._checkpointer = WriteBehindCheckpointSaver(
+                    cls._checkpointer, write_behind
+                )
+        elif checkpointer_type == "sqlite":
+            # The database stays open until aclose is called when the application shuts down
+            await cls.aclose()
+            exit_stack = AsyncExitStack()
+            cls._checkpointer = await exit_stack.enter_async_context(
+                AsyncSqliteSaver.from_path(
+                    path=kwargs.get("path", "checkpoints.sqlite"),
+                    synchronous=kwargs.get("synchronous", "NORMAL"),
+                    compression=kwargs.get("compression"),
+                    serde=kwargs.get("serde", "jsonplus"),
+                )
+            )
+            cls._exit_stack = exit_stack
+            if kwargs.get("write_behind") is not None:
+                cls._checkpointer = WriteBehindCheckpointSaver(
+                    cls._checkpointer, kwargs["write_behind"]
+                )
         else:
             raise ValueError(f"Invalid checkpointer type: {checkpointer_type}")
+        return cls._checkpointer
+
+    @classmethod
+    def checkpointer(cls):
+        """The checkpointer created by the last create_checkpointer call, if any."""
+        return cls._checkpointer
+
+    @classmethod
+    def stats(cls) -> dict:
+        """Metrics of the connection pool, read replicas and checkpointer, when available."""
+        return {
+            "pool": cls._redis_pool.stats() if cls._redis_pool else None,
+            "replicas": cls._replicas.stats() if cls._replicas else None,
+            "checkpointer": cls._checkpointer.stats()
+            if hasattr(cls._checkpointer, "stats")
+            else None,
+        }
+
+    @classmethod
+    async def aflush(cls, thread_id: Optional[str] = None):
+        """Save the checkpoints of a thread, or of all threads, buffered in write-behind mode."""
+        if isinstance(cls._checkpointer, WriteBehindCheckpointSaver):
+            await cls._checkpointer.aflush(thread_id)
+
+    @classmethod
+    async def aclose(cls):
+        """Close the checkpointer and its connection pool, if any."""
+        await cls.aflush()
+        if cls._exit_stack is not None:
+            logger.info("Closing checkpointer")
+            await cls._exit_stack.aclose()
+        cls._exit_stack = None
+        cls._redis_pool = None
+        cls._replicas = None
+        cls._checkpointer = None
@@ -0,0 +1,288 @@
+"""
+Token budget of the messages of a thread sent to the model.
+
+Without a budget, every model call sends the whole history of the thread, so
+prompt tokens, latency and cost grow with every turn. `HistoryManager` picks
+the most recent messages fitting in `max_tokens` and, optionally, folds the
+older ones into a rolling summary sent before them. The history saved in the
+thread is never modified, only the model input is.
+
+The history is only cut before a human message, so the messages sent always
+start a turn and keep every tool call with its result. The current turn is
+always sent whole, even when it is over budget on its own.
+
+Token counts are estimated from the length of the messages and cached by
+message id: a model call only counts the messages added since the previous
+one, and reads the cached counts of the messages it sends.
+
+Configured under `history` in agent.yaml:
+
+    history:
+      max_tokens: 8000
+      summarize: true
+      summary_max_tokens: 512
+"""
+
+import json
+import math
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    get_buffer_string,
+)
+from langchain_core.runnables import RunnableConfig
+from langgraph.constants import TAG_NOSTREAM
+
+from src.utils.chat import get_message_text
+from src.utils.logger import logger
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below so that it can be continued without it. "
+    "Extend the current summary, if any, with the new messages. Keep the facts, "
+    "decisions, names, tool results and open questions, drop pleasantries. "
+    "Answer with the summary only, in at most {max_words} words."
+)
+
+
+class HistoryWindow(NamedTuple):
+    """The messages of a thread sent to the model, and the summary of the older ones."""
+
+    start: int
+    summary: Optional[str]
+    summarized_until: Optional[str]
+
+
+class HistoryManager:
+    """
+    Trims the history of a thread to a token budget, optionally summarizing the rest.
+
+    Attributes:
+        max_tokens (int): Budget of the messages sent to the model, summary included.
+        summarize (bool): Whether messages left out are folded into a rolling summary.
+        summary_max_tokens (int): Length the summary is asked to stay under.
+        chars_per_token (float): Characters per token of the estimates.
+        model (BaseChatModel): Model writing the summaries.
+        cache_size (int): Number of messages whose token count is cached.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int,
+        *,
+        summarize: bool = False,
+        summary_max_tokens: int = 512,
+        chars_per_token: float = 4.0,
+        model: Optional[BaseChatModel] = None,
+        cache_size: int = 100_000,
+    ):
+        if max_tokens <= 0 or summary_max_tokens <= 0 or chars_per_token <= 0:
+            raise ValueError(
+                "max_tokens, summary_max_tokens and chars_per_token must be > 0"
+            )
+        if summarize and model is None:
+            raise ValueError("A model is required to summarize the history")
+        self.max_tokens = max_tokens
+        self.summarize = summarize
+        self.summary_max_tokens = summary_max_tokens
+        self.chars_per_token = chars_per_token
+        self.model = model
+        self.cache_size = cache_size
+        self._counts: OrderedDict[str, int] = OrderedDict()
+
+    @classmethod
+    def from_config(
+        cls, config: Optional[dict], model: Optional[BaseChatModel] = None
+    ) -> Optional["HistoryManager"]:
+        """
+        Create the manager configured under `history` in agent.yaml.
+
+        Args:
+            config (dict, optional): The `history` section, None when it is not set.
+            model (BaseChatModel, optional): Model writing the summaries.
+
+        Returns:
+            HistoryManager or None: The manager, or None when the history is not trimmed.
+        """
+        if not config:
+            return None
+        return cls(**config, model=model)
+
+    def count(self, message: BaseMessage) -> int:
+        """Estimated number of tokens of a message, cached by message id."""
+        if message.id is None:
+            return self._estimate(message)
+        tokens = self._counts.get(message.id)
+        if tokens is None:
+            tokens = self._estimate(message)
+            self._counts[message.id] = tokens
+            if len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+        else:
+            self._counts.move_to_end(message.id)
+        return tokens
+
+    def _estimate(self, message: BaseMessage) -> int:
+        content = message.content
+        if not isinstance(content, str):
+            content = json.dumps(content, default=str)
+        if isinstance(message, AIMessage) and message.tool_calls:
+            content += json.dumps(message.tool_calls, default=str)
+        # A few tokens of every message go to its role and delimiters
+        return math.ceil(len(content) / self.chars_per_token) + 4
+
+    def _count_text(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def find(self, messages: list[BaseMessage], message_id: Optional[str]) -> int:
+        """Index of a message in the history, searched from the most recent one, or -1."""
+        if message_id is not None:
+            for idx in range(len(messages) - 1, -1, -1):
+                if messages[idx].id == message_id:
+                    return idx
+        return -1
+
+    def trim_start(self, messages: list[BaseMessage], budget: int) -> int:
+        """
+        Index of the first message sent to the model.
+
+        Messages are counted from the most recent one until the budget is spent,
+        the history is then cut before the oldest human message counted.
+
+        Args:
+            messages (list[BaseMessage]): The history of the thread.
+            budget (int): Token budget of the messages sent.
+
+        Returns:
+            int: The index of the first message sent.
+        """
+        start = None
+        tokens = 0
+        for idx in range(len(messages) - 1, -1, -1):
+            tokens += self.count(messages[idx])
+            if tokens > budget and start is not None:
+                break
+            if isinstance(messages[idx], HumanMessage):
+                start = idx
+        if start is None:
+            # No human message, e.g. a thread started by update_state
+            return 0
+        return start
+
+    async def apply(
+        self,
+        messages: list[BaseMessage],
+        summary: Optional[str] = None,
+        summarized_until: Optional[str] = None,
+    ) -> HistoryWindow:
+        """
+        Pick the messages sent to the model and update the summary of the older ones.
+
+        The summary is only extended when the history is cut after the last
+        message it covers, with the messages in between, so a model call whose
+        cut does not move sends the same summary without rewriting it.
+
+        Args:
+            messages (list[BaseMessage]): The history of the thread.
+            summary (str, optional): The summary of the messages before the window.
+            summarized_until (str, optional): Id of the last message the summary covers.
+
+        Returns:
+            HistoryWindow: The index of the first message sent and the summary.
+        """
+        budget = self.max_tokens
+        if self.summarize and summary:
+            budget -= self._count_text(summary)
+        start = self.trim_start(messages, budget)
+        if not self.summarize or start == 0:
+            return HistoryWindow(start, summary, summarized_until)
+
+        folded = self.find(messages, summarized_until) + 1
+        if folded == 0:
+            # The summary covers none of the messages left out, or they were
+            # removed from the thread: it is rewritten from scratch
+            summary = None
+        if folded >= start:
+            return HistoryWindow(start, summary, summarized_until)
+
+        # Only the most recent messages left out are folded when there are many,
+        # e.g. the first time a long thread is trimmed
+        unfolded = messages[folded:start]
+        tokens = 0
+        for idx in range(len(unfolded) - 1, -1, -1):
+            tokens += self.count(unfolded[idx])
+            if tokens > self.max_tokens:
+                unfolded = unfolded[idx + 1 :]
+                break
+        summary = await self._summarize(summary, unfolded)
+        return HistoryWindow(start, summary, messages[start - 1].id)
+
+    async def _summarize(self, summary: Optional[str], messages: list) -> str:
+        instructions = SUMMARY_PROMPT.format(
+            max_words=int(self.summary_max_tokens * 0.75)
+        )
+        request = f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n"
+        request += get_buffer_string(messages)
+        # The summary is not part of the answer: tagged for `messages` streams of
+        # the graph to leave its tokens out, the call is still traced
+        response = await self.model.ainvoke(
+            [SystemMessage(content=instructions), HumanMessage(content=request)],
+            config={"tags": [TAG_NOSTREAM]},
+        )
+        logger.debug("Folded %s messages into the history summary", len(messages))
+        return get_message_text(response)
+
+    def model_input(
+        self, messages: list[BaseMessage], window: HistoryWindow
+    ) -> list[BaseMessage]:
+        """The summary, as a system message, followed by the messages of the window."""
+        kept = messages[window.start :]
+        if self.summarize and window.summary:
+            return [
+                SystemMessage(
+                    content=f"Summary of the earlier conversation:\n{window.summary}"
+                ),
+                *kept,
+            ]
+        return kept
+
+
+def history_prompt(
+    prompt: str, manager: HistoryManager, summary_threads: int = 1024
+) -> Callable:
+    """
+    A `prompt` for create_react_agent, sending the system prompt then the messages within budget.
+
+    create_react_agent runs its prompt before every model call, which makes it the
+    pre-model stage of the prebuilt agents. Its output is not saved in the state,
+    so the summaries are kept in memory for the most recently used threads, and
+    rewritten from the messages left out when a thread is not in memory.
+
+    Args:
+        prompt (str): The system prompt.
+        manager (HistoryManager): Trims the history of the threads.
+        summary_threads (int): Number of threads whose summary is kept in memory.
+
+    Returns:
+        Callable: An async function of the state and config returning the model input.
+    """
+    system_message = SystemMessage(content=prompt)
+    summaries: OrderedDict[str, tuple[str, Optional[str]]] = OrderedDict()
+
+    async def trimmed_prompt(state, config: RunnableConfig) -> list[BaseMessage]:
+        messages = state["messages"]
+        thread_id = config.get("configurable", {}).get("thread_id")
+        summary, summarized_until = summaries.pop(thread_id, (None, None))
+        window = await manager.apply(messages, summary, summarized_until)
+        if window.summary is not None:
+            summaries[thread_id] = (window.summary, window.summarized_until)
+            if len(summaries) > summary_threads:
+                summaries.popitem(last=False)
+        return [system_message, *manager.model_input(messages, window)]
+
+    return trimmed_prompt
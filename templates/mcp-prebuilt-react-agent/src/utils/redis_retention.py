@@ -0,0 +1,135 @@
+"""
+Retention for the Redis checkpointer.
+
+Pruning runs in a background asyncio task owned by the saver and started with
+it by `AsyncRedisSaver.from_url`. `aput` only marks the written thread as dirty,
+the task then trims dirty threads and expires idle ones in small batches, so
+retention never adds latency to a graph step.
+"""
+
+import asyncio
+import time
+from typing import TYPE_CHECKING, Optional
+
+from pydantic import BaseModel, Field
+
+from src.utils.logger import logger
+
+if TYPE_CHECKING:
+    from src.utils.redis_checkpointer import AsyncRedisSaver
+
+
+class RetentionPolicy(BaseModel):
+    """
+    Retention settings, configured under `checkpointer.kwargs.retention` in agent.yaml.
+
+    Attributes:
+        keep_last_checkpoints (Optional[int]): Checkpoints kept per thread and namespace,
+            older ones are deleted together with their pending writes. None keeps all.
+        keep_last_writes (Optional[int]): Newest checkpoints per thread and namespace whose
+            pending writes are kept, writes of older, superseded checkpoints are deleted.
+            None keeps all.
+        thread_ttl_seconds (Optional[int]): Threads without any new checkpoint for this long
+            are deleted. None never expires threads.
+        sweep_interval_seconds (float): Pause between two sweeps of the background task.
+        sweep_batch_size (int): Maximum threads, and checkpoints per thread, handled per sweep.
+    """
+
+    keep_last_checkpoints: Optional[int] = Field(default=None, ge=1)
+    keep_last_writes: Optional[int] = Field(default=None, ge=1)
+    thread_ttl_seconds: Optional[int] = Field(default=None, ge=1)
+    sweep_interval_seconds: float = Field(default=60, gt=0)
+    sweep_batch_size: int = Field(default=100, ge=1)
+
+    @property
+    def enabled(self) -> bool:
+        """Whether the policy ever deletes anything."""
+        return any(
+            value is not None
+            for value in (
+                self.keep_last_checkpoints,
+                self.keep_last_writes,
+                self.thread_ttl_seconds,
+            )
+        )
+
+
+class CheckpointPruner:
+    """
+    Background task applying a RetentionPolicy to the threads of an AsyncRedisSaver.
+
+    Attributes:
+        saver (AsyncRedisSaver): Saver whose threads are pruned.
+        policy (RetentionPolicy): Retention applied on every sweep.
+    """
+
+    def __init__(self, saver: "AsyncRedisSaver", policy: RetentionPolicy):
+        self.saver = saver
+        self.policy = policy
+        self._dirty: dict[tuple[str, str], None] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def mark(self, thread_id: str, checkpoint_ns: str):
+        """
+        Schedule a thread for pruning and make sure the background task runs.
+
+        The task is started with the saver, it is only started here for savers
+        created without from_url.
+        """
+        if (
+            self.policy.keep_last_checkpoints is not None
+            or self.policy.keep_last_writes is not None
+        ):
+            self._dirty[(thread_id, checkpoint_ns)] = None
+        self.start()
+
+    def start(self):
+        """Start the background task, if it is not already running."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the background task and wait for it to finish."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.policy.sweep_interval_seconds)
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Checkpoint retention sweep failed: {e}")
+
+    async def sweep(self):
+        """Prune one batch of dirty threads, then delete one batch of idle threads."""
+        batch = list(self._dirty)[: self.policy.sweep_batch_size]
+        for thread in batch:
+            del self._dirty[thread]
+        for thread_id, checkpoint_ns in batch:
+            remaining = await self.saver.aprune_thread(
+                thread_id,
+                checkpoint_ns,
+                keep_last_checkpoints=self.policy.keep_last_checkpoints,
+                keep_last_writes=self.policy.keep_last_writes,
+                batch_size=self.policy.sweep_batch_size,
+            )
+            if remaining:
+                # Large backlogs are pruned over several sweeps
+                self._dirty[(thread_id, checkpoint_ns)] = None
+            await asyncio.sleep(0)
+
+        if self.policy.thread_ttl_seconds is not None:
+            expired = await self.saver.adelete_idle_threads(
+                time.time() - self.policy.thread_ttl_seconds,
+                limit=self.policy.sweep_batch_size,
+            )
+            if expired:
+                logger.info(f"Deleted {expired} idle threads")
@@ -1,4 +1,5 @@
 import os
+from typing import Literal
 import yaml
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import field_validator
@@ -11,6 +12,10 @@ class Settings(BaseSettings):
 
     # Log level can be configured via environment variable, defaults to INFO
     LOG_LEVEL: str = "INFO"
+    # Log records as JSON objects ("json") or plain text lines ("text")
+    LOG_FORMAT: Literal["json", "text"] = "text"
+    # Fraction of the DEBUG and INFO records logged, WARNING and above are always logged
+    LOG_SAMPLE_RATE: float = 1.0
     LITELLM_GATEWAY_URL: str
     LITELLM_GATEWAY_API_KEY: str
 
@@ -1,13 +1,18 @@
-from fastapi import FastAPI, Request, HTTPException
+from typing import Optional
+
+from fastapi import FastAPI, Query, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import logging
 from contextlib import asynccontextmanager
 from src.models.user_input import UserInput
 
-from src.core.agents import run_agent
+from src.core.agents import run_agent, stream_agent
+from src.utils.chat import format_sse
 from src.utils.logger import logger
 from src.core.graphs.graph_builder import GraphBuilder, GRAPH
+from src.utils.checkpointer_factory import CheckpointerFactory
+from src.utils.redis_checkpointer import ThreadActivity
 
 
 @asynccontextmanager
@@ -29,6 +34,8 @@ async def lifespan(app: FastAPI):
 
     yield  # This is where FastAPI runs
     logger.info("Shutting down")
+    # The checkpointer's connection pool lives as long as the application
+    await CheckpointerFactory.aclose()
 
 
 app = FastAPI(
@@ -67,6 +74,58 @@ def status():
     return JSONResponse(content={"status": "OK"})
 
 
+@app.get("/metrics/checkpointer")
+def checkpointer_metrics():
+    return JSONResponse(content=CheckpointerFactory.stats())
+
+
+@app.get("/threads")
+async def list_threads(
+    limit: int = Query(default=50, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    active_after: Optional[float] = None,
+    active_before: Optional[float] = None,
+    oldest_first: bool = False,
+):
+    """
+    List threads by last activity, most recent first, a page at a time.
+
+    Pass the `next_cursor` of a page as `cursor`, with the same other parameters,
+    to get the next page. It is null on the last page.
+    """
+    checkpointer = CheckpointerFactory.checkpointer()
+    if not hasattr(checkpointer, "alist_threads"):
+        return JSONResponse(
+            content={"error": "The checkpointer does not keep a thread catalog"},
+            status_code=501,
+        )
+    after = None
+    if cursor:
+        try:
+            last_active, thread_id = cursor.split(":", 1)
+            after = ThreadActivity(thread_id, float(last_active))
+        except ValueError:
+            return JSONResponse(content={"error": "Invalid cursor"}, status_code=400)
+    threads = [
+        thread
+        async for thread in checkpointer.alist_threads(
+            active_after=active_after,
+            active_before=active_before,
+            after=after,
+            oldest_first=oldest_first,
+            limit=limit,
+        )
+    ]
+    return JSONResponse(
+        content={
+            "threads": [thread._asdict() for thread in threads],
+            "next_cursor": f"{threads[-1].last_active!r}:{threads[-1].thread_id}"
+            if len(threads) == limit
+            else None,
+        }
+    )
+
+
 class HealthCheck(logging.Filter):
     def filter(self, record: logging.LogRecord) -> bool:
         return record.getMessage().find("/health-check") == -1
@@ -79,3 +138,34 @@ logging.getLogger("uvicorn.access").addFilter(HealthCheck())
 @app.post("/chat")
 async def run_agent_endpoint(user_input: UserInput):
     return await run_agent(user_input.thread_id, user_input.user_input)
+
+
+@app.post("/chat/stream")
+async def stream_agent_endpoint(user_input: UserInput):
+    """
+    Run the agent and stream its progress as Server-Sent Events.
+
+    Tokens are sent as `token` events while the model generates them, tool calls
+    as `tool_start` and `tool_end` events, completed nodes as `node` events and
+    the response as a `final` event. Errors raised once streaming has started
+    are sent as an `error` event.
+    """
+
+    async def events():
+        try:
+            async for event, data in stream_agent(
+                user_input.thread_id, user_input.user_input
+            ):
+                yield format_sse(event, data)
+        except Exception as e:
+            logger.exception(e)
+            yield format_sse(
+                "error", {"error": f"An unexpected error occurred: {str(e)}"}
+            )
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Proxies must forward each event as soon as it is written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,133 @@
+"""
+Serializer of the checkpoints and writes saved by the Redis checkpointer.
+
+LangGraph's JsonPlusSerializer encodes LangChain messages as msgpack extensions
+carrying their module and class name, and rebuilds them by importing the
+class and validating the fields again. Message histories make up most of a
+checkpoint, so the `msgpack` format encodes the message classes registered in
+MESSAGE_TYPES with a fixed extension code instead, and rebuilds them from the
+already validated fields without a lookup by name. Any other object is
+encoded by JsonPlusSerializer.dumps_typed and nested as a JSONPLUS_CODE
+extension, so that only the public API of JsonPlusSerializer is relied on.
+
+Values in the `msgpack` format are stored with the MSGPACK_TYPE type marker.
+Every format is always readable, so switching formats keeps existing
+checkpoints readable in both directions.
+"""
+
+from typing import Any
+
+import msgpack
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    ChatMessage,
+    ChatMessageChunk,
+    FunctionMessage,
+    FunctionMessageChunk,
+    HumanMessage,
+    HumanMessageChunk,
+    RemoveMessage,
+    SystemMessage,
+    SystemMessageChunk,
+    ToolMessage,
+    ToolMessageChunk,
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+# Serialization formats of checkpoints and writes
+SERDE_FORMATS = ("jsonplus", "msgpack")
+
+# Type marker of the values written in the msgpack format
+MSGPACK_TYPE = "msgpack_lc"
+
+# Extension code -> message class. Codes are stored with the checkpoints: never
+# change or reuse one, only add new codes. Codes below 16 belong to JsonPlusSerializer.
+MESSAGE_TYPES = {
+    16: HumanMessage,
+    17: AIMessage,
+    18: ToolMessage,
+    19: SystemMessage,
+    20: FunctionMessage,
+    21: ChatMessage,
+    22: RemoveMessage,
+    23: HumanMessageChunk,
+    24: AIMessageChunk,
+    25: ToolMessageChunk,
+    26: SystemMessageChunk,
+    27: FunctionMessageChunk,
+    28: ChatMessageChunk,
+}
+
+# Extension code of the objects other than messages, holding the (type, bytes) pair
+# JsonPlusSerializer.dumps_typed returns for them
+JSONPLUS_CODE = 29
+
+_MESSAGE_CODES = {cls: code for code, cls in MESSAGE_TYPES.items()}
+
+_JSONPLUS = JsonPlusSerializer()
+
+
+class CheckpointSerializer(JsonPlusSerializer):
+    """
+    JsonPlusSerializer writing either its own format or the msgpack one.
+
+    Attributes:
+        format (str): Format of the values written, one of SERDE_FORMATS.
+    """
+
+    def __init__(self, format: str = "jsonplus", **kwargs):
+        super().__init__(**kwargs)
+        if format not in SERDE_FORMATS:
+            raise ValueError(
+                f"Invalid serde: {format}, expected one of {SERDE_FORMATS}"
+            )
+        self.format = format
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        if self.format == "jsonplus" or isinstance(obj, (bytes, bytearray)):
+            return super().dumps_typed(obj)
+        try:
+            return MSGPACK_TYPE, _msgpack_dumps(obj)
+        except UnicodeEncodeError:
+            # Falls back to JSON, as JsonPlusSerializer does
+            return super().dumps_typed(obj)
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, value = data
+        if type_ == MSGPACK_TYPE:
+            return msgpack.unpackb(value, ext_hook=_ext_hook, strict_map_key=False)
+        return super().loads_typed(data)
+
+
+def _msgpack_dumps(obj: Any) -> bytes:
+    return msgpack.packb(obj, default=_default)
+
+
+def _default(obj: Any) -> Any:
+    code = _MESSAGE_CODES.get(type(obj))
+    if code is None:
+        return msgpack.ExtType(JSONPLUS_CODE, msgpack.packb(_JSONPLUS.dumps_typed(obj)))
+    # The fields of a message are plain data once validated, except for nested
+    # objects which go through this hook again. Messages allow extra fields.
+    return msgpack.ExtType(
+        code, _msgpack_dumps({**obj.__dict__, **(obj.__pydantic_extra__ or {})})
+    )
+
+
+def _ext_hook(code: int, data: bytes) -> Any:
+    if code == JSONPLUS_CODE:
+        return _JSONPLUS.loads_typed(tuple(msgpack.unpackb(data)))
+    cls = MESSAGE_TYPES.get(code)
+    if cls is None:
+        # Objects written inline with the extension codes of JsonPlusSerializer by
+        # earlier versions, decoded by it as a value of its own msgpack format
+        return _JSONPLUS.loads_typed(
+            ("msgpack", msgpack.packb(msgpack.ExtType(code, data)))
+        )
+    fields = msgpack.unpackb(data, ext_hook=_ext_hook, strict_map_key=False)
+    try:
+        # The fields were validated when the message was created
+        return cls.model_construct(**fields)
+    except Exception:
+        return cls(**fields)
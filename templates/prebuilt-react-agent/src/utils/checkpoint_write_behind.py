@@ -0,0 +1,327 @@
+"""
+Write-behind buffering of the checkpoints saved during a run.
+
+LangGraph saves a checkpoint at every super-step of a run, e.g. after each
+call_model and tool_node of a ReAct loop, and the writes of every task in
+between. In write-behind mode these are kept in memory and only the latest
+checkpoint of each thread, with its pending writes, is saved to Redis: in the
+background every `flush_every_steps` checkpoints, and when the run completes or
+fails. Intermediate checkpoints are coalesced away, the saved checkpoint points
+at the latest checkpoint saved before it.
+
+A crash of the process loses the checkpoints not flushed yet, so a run restarts
+from the latest flushed checkpoint, usually the end of the previous run.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, List, Optional, Tuple, Union
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    copy_checkpoint,
+    get_checkpoint_id,
+)
+from pydantic import BaseModel, Field
+
+from src.utils.checkpoint_cache import _copy_checkpoint_tuple, _merge_pending_writes
+from src.utils.logger import logger
+
+
+class WriteBehindSettings(BaseModel):
+    """
+    Write-behind settings, configured under `checkpointer.kwargs.write_behind` in agent.yaml.
+
+    Attributes:
+        flush_every_steps (int): Checkpoints of a thread buffered before they are flushed in
+            the background, 0 only flushes when the run completes or fails.
+    """
+
+    flush_every_steps: int = Field(default=0, ge=0)
+
+
+@dataclass
+class _Buffer:
+    """Checkpoints and writes of a (thread, namespace) not saved to the wrapped saver yet."""
+
+    # Latest checkpoint saved to the wrapped saver, the parent of the next flushed one
+    parent_config: Optional[RunnableConfig]
+    # Latest checkpoint, as returned to readers, with its pending writes
+    checkpoint_tuple: Optional[CheckpointTuple] = None
+    pending_writes: dict = field(default_factory=dict)
+    # What the next flush saves: the latest checkpoint unless already flushed, the
+    # channels updated since the parent and the aput_writes calls on the checkpoint
+    unflushed: Optional[Tuple[RunnableConfig, Checkpoint, CheckpointMetadata]] = None
+    new_versions: dict = field(default_factory=dict)
+    unflushed_writes: list = field(default_factory=list)
+    steps: int = 0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def dirty(self) -> bool:
+        return self.unflushed is not None or bool(self.unflushed_writes)
+
+
+class WriteBehindCheckpointSaver(BaseCheckpointSaver):
+    """
+    Saver buffering checkpoints in memory and flushing the latest one to another saver.
+
+    Reads of the latest checkpoint of a buffered thread are served from memory,
+    other reads of a buffered thread flush it first. Methods other than the
+    checkpoint API are forwarded to the wrapped saver.
+
+    Attributes:
+        saver (BaseCheckpointSaver): Saver the checkpoints are flushed to.
+        settings (WriteBehindSettings): When checkpoints are flushed.
+        flushes (int): Checkpoints saved to the wrapped saver.
+        coalesced (int): Checkpoints superseded before they were flushed.
+        flush_errors (int): Background flushes that failed, their data is kept for the next one.
+    """
+
+    def __init__(
+        self,
+        saver: BaseCheckpointSaver,
+        settings: Union[WriteBehindSettings, dict, None] = None,
+    ):
+        super().__init__(serde=saver.serde)
+        if settings is None:
+            settings = WriteBehindSettings()
+        elif isinstance(settings, dict):
+            settings = WriteBehindSettings(**settings)
+        self.saver = saver
+        self.settings = settings
+        self.flushes = 0
+        self.coalesced = 0
+        self.flush_errors = 0
+        self._buffers: dict[Tuple[str, str], _Buffer] = {}
+        self._flush_tasks: set[asyncio.Task] = set()
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "saver":
+            raise AttributeError(name)
+        return getattr(self.saver, name)
+
+    @property
+    def config_specs(self) -> list:
+        return self.saver.config_specs
+
+    def get_next_version(self, current: Optional[Any], channel: Any) -> Any:
+        return self.saver.get_next_version(current, channel)
+
+    def stats(self) -> dict:
+        """Buffered threads and flush counters, with the stats of the wrapped saver."""
+        return {
+            **(self.saver.stats() if hasattr(self.saver, "stats") else {}),
+            "buffered_threads": len(self._buffers),
+            "flushes": self.flushes,
+            "coalesced": self.coalesced,
+            "flush_errors": self.flush_errors,
+        }
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Get a checkpoint tuple, from memory when it is the latest of a buffered thread."""
+        configurable = config["configurable"]
+        buffer = self._buffers.get(
+            (configurable["thread_id"], configurable.get("checkpoint_ns", ""))
+        )
+        checkpoint_id = get_checkpoint_id(config)
+        if (
+            buffer is not None
+            and buffer.checkpoint_tuple is not None
+            and checkpoint_id
+            in (None, buffer.checkpoint_tuple.config["configurable"]["checkpoint_id"])
+        ):
+            return _copy_checkpoint_tuple(buffer.checkpoint_tuple)
+        if buffer is not None:
+            # Older checkpoints may not have been flushed yet
+            await self.aflush(configurable["thread_id"])
+        return await self.saver.aget_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """Flush the thread, then list its checkpoints from the wrapped saver."""
+        await self.aflush(config["configurable"]["thread_id"] if config else None)
+        async for checkpoint_tuple in self.saver.alist(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield checkpoint_tuple
+
+    async def alist_metadata(
+        self, config: RunnableConfig, **kwargs
+    ) -> AsyncIterator[Any]:
+        """Flush the thread, then list the metadata of its checkpoints from the wrapped saver."""
+        await self.aflush(config["configurable"]["thread_id"])
+        async for metadata_tuple in self.saver.alist_metadata(config, **kwargs):
+            yield metadata_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Buffer a checkpoint, superseding the buffered one of its thread."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        parent_checkpoint_id = config["configurable"].get("checkpoint_id")
+        buffer = self._buffers.get((thread_id, checkpoint_ns))
+        if buffer is None:
+            # Nothing is buffered, so the parent is already saved
+            buffer = self._buffers[(thread_id, checkpoint_ns)] = _Buffer(
+                parent_config=config if parent_checkpoint_id else None
+            )
+        elif buffer.unflushed is not None:
+            self.coalesced += 1
+
+        next_config = {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+        checkpoint = copy_checkpoint(checkpoint)
+        buffer.checkpoint_tuple = CheckpointTuple(
+            config=next_config,
+            checkpoint=checkpoint,
+            metadata=metadata,
+            parent_config=config if parent_checkpoint_id else None,
+            pending_writes=[],
+        )
+        buffer.pending_writes = {}
+        buffer.unflushed = (next_config, checkpoint, metadata)
+        buffer.new_versions.update(new_versions)
+        # Writes of superseded checkpoints are not flushed
+        buffer.unflushed_writes = []
+        buffer.steps += 1
+        if (
+            self.settings.flush_every_steps
+            and buffer.steps >= self.settings.flush_every_steps
+        ):
+            self._flush_in_background(thread_id)
+        return next_config
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: List[Tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        """Buffer writes of the buffered checkpoint, other writes are saved right away."""
+        configurable = config["configurable"]
+        buffer = self._buffers.get(
+            (configurable["thread_id"], configurable["checkpoint_ns"])
+        )
+        if (
+            buffer is None
+            or buffer.checkpoint_tuple is None
+            or buffer.checkpoint_tuple.config["configurable"]["checkpoint_id"]
+            != configurable["checkpoint_id"]
+        ):
+            await self.saver.aput_writes(config, writes, task_id)
+            return
+
+        buffer.unflushed_writes.append((config, writes, task_id))
+        buffer.checkpoint_tuple = buffer.checkpoint_tuple._replace(
+            pending_writes=_merge_pending_writes(
+                self.serde, buffer.pending_writes, writes, task_id
+            )
+        )
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Drop the buffered checkpoints of a thread and delete it."""
+        for key in [key for key in self._buffers if key[0] == thread_id]:
+            del self._buffers[key]
+        await self.saver.adelete_thread(thread_id)
+
+    async def aflush(self, thread_id: Optional[str] = None):
+        """
+        Save the buffered checkpoints and writes of a thread to the wrapped saver.
+
+        Args:
+            thread_id (Optional[str]): The thread to flush, None waits for background
+                flushes and flushes every thread, e.g. before shutting down.
+        """
+        if thread_id is None and self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        for key in [
+            key for key in self._buffers if thread_id is None or key[0] == thread_id
+        ]:
+            await self._aflush_buffer(key)
+
+    def _flush_in_background(self, thread_id: str):
+        task = asyncio.create_task(self.aflush(thread_id))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task: asyncio.Task):
+        self._flush_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.flush_errors += 1
+            logger.error(f"Background checkpoint flush failed: {task.exception()}")
+
+    async def _aflush_buffer(self, key: Tuple[str, str]):
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            return
+        async with buffer.lock:
+            unflushed, new_versions, unflushed_writes = (
+                buffer.unflushed,
+                buffer.new_versions,
+                buffer.unflushed_writes,
+            )
+            buffer.unflushed, buffer.new_versions, buffer.unflushed_writes = (
+                None,
+                {},
+                [],
+            )
+            buffer.steps = 0
+            saved = unflushed is None
+            try:
+                if unflushed is not None:
+                    next_config, checkpoint, metadata = unflushed
+                    await self.saver.aput(
+                        buffer.parent_config
+                        or {
+                            "configurable": {
+                                "thread_id": key[0],
+                                "checkpoint_ns": key[1],
+                            }
+                        },
+                        checkpoint,
+                        metadata,
+                        new_versions,
+                    )
+                    buffer.parent_config = next_config
+                    saved = True
+                    self.flushes += 1
+                while unflushed_writes:
+                    config, writes, task_id = unflushed_writes[0]
+                    await self.saver.aput_writes(config, writes, task_id)
+                    unflushed_writes.pop(0)
+            except BaseException:
+                # Keep what was not saved for the next flush, unless superseded since
+                if not saved:
+                    if buffer.unflushed is None:
+                        buffer.unflushed = unflushed
+                    buffer.new_versions = {**new_versions, **buffer.new_versions}
+                if unflushed_writes and (
+                    buffer.checkpoint_tuple.config["configurable"]["checkpoint_id"]
+                    == unflushed_writes[0][0]["configurable"]["checkpoint_id"]
+                ):
+                    buffer.unflushed_writes = unflushed_writes + buffer.unflushed_writes
+                raise
+            if not buffer.dirty and self._buffers.get(key) is buffer:
+                del self._buffers[key]
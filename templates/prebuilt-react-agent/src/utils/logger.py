@@ -1,13 +1,102 @@
+"""
+Logging of the application, off the event loop.
+
+Records are put on a queue by the logger and written to stdout by a
+QueueListener thread, so a slow or blocked stdout never stalls a request.
+Rendering a record, its message, arguments and traceback, also happens on that
+thread: log with %-style arguments (`logger.debug("%s", value)`) rather than
+f-strings for the rendering to be skipped when the level is disabled, and use
+`logger.isEnabledFor` to guard work done only to build a log message.
+
+Records are plain text lines by default, LOG_FORMAT=json writes them as JSON
+objects for log collectors. LOG_SAMPLE_RATE keeps a fraction of the DEBUG and
+INFO records, records of level WARNING and above are always kept.
+"""
+
+import atexit
+import json
 import logging
+import queue
+import random
 import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 
 from src.config import settings
 
-logger = logging.getLogger(__name__)
-logger.setLevel(settings.LOG_LEVEL)
-formatter = logging.Formatter(
-    "%(levelname)s:    %(asctime)s - %(module)s:%(funcName)s:%(lineno)d - %(message)s"
-)
+# Attributes of every LogRecord, the others were passed to the log call in `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a JSON object on a single line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "function": record.funcName,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        entry.update(
+            (key, value)
+            for key, value in vars(record).items()
+            if key not in _RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of the records below WARNING, and every other record."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        if not 0 <= rate <= 1:
+            raise ValueError("LOG_SAMPLE_RATE must be between 0 and 1")
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Puts records on the queue as they are, to be rendered by the listener.
+
+    QueueHandler renders the message before queueing the record, so that it can
+    be pickled to another process. The listener runs in this process, the
+    record is queued untouched and rendered on the listener's thread instead.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+if settings.LOG_FORMAT == "json":
+    formatter = JsonFormatter()
+else:
+    formatter = logging.Formatter(
+        "%(levelname)s:    %(asctime)s - %(module)s:%(funcName)s:%(lineno)d - %(message)s"
+    )
 handler = logging.StreamHandler(stream=sys.stdout)
 handler.setFormatter(formatter)
-logger.addHandler(handler)
+
+log_queue = queue.SimpleQueue()
+listener = QueueListener(log_queue, handler, respect_handler_level=True)
+listener.start()
+# Write the records still queued when the process exits
+atexit.register(listener.stop)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(settings.LOG_LEVEL)
+queue_handler = DeferredQueueHandler(log_queue)
+if settings.LOG_SAMPLE_RATE < 1:
+    queue_handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_RATE))
+logger.addHandler(queue_handler)
@@ -0,0 +1,222 @@
+"""
+In-process checkpointer with bounded memory, used for the `in_memory` checkpointer type.
+
+LangGraph's MemorySaver keeps every checkpoint of every thread for the lifetime of
+the process. BoundedMemorySaver stores checkpoints the same way, but tracks the
+serialized size, channel values included, and last use of each thread and evicts whole threads, least
+recently used first, once a thread count or byte budget is exceeded or a thread
+has been idle for too long.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Iterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from pydantic import BaseModel, Field
+
+from src.utils.logger import logger
+
+
+class MemoryLimits(BaseModel):
+    """
+    Limits of the in-memory checkpointer, configured under `checkpointer.kwargs` in agent.yaml.
+
+    Attributes:
+        max_threads (Optional[int]): Threads kept in memory. None keeps all.
+        max_bytes (Optional[int]): Serialized checkpoints, channel values and writes kept in
+            memory, in bytes.
+            None keeps all.
+        thread_ttl_seconds (Optional[float]): Threads unused for this long are evicted.
+            None never expires threads.
+    """
+
+    max_threads: Optional[int] = Field(default=None, ge=1)
+    max_bytes: Optional[int] = Field(default=None, ge=1)
+    thread_ttl_seconds: Optional[float] = Field(default=None, gt=0)
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    MemorySaver evicting least recently used threads to stay within MemoryLimits.
+
+    The thread being written is never evicted by its own write, so a single
+    thread larger than max_bytes is kept until another thread is written.
+
+    Attributes:
+        limits (MemoryLimits): Limits enforced on every write and read.
+        evictions (int): Threads evicted to respect max_threads or max_bytes.
+        expirations (int): Threads evicted because they were idle for thread_ttl_seconds.
+    """
+
+    def __init__(self, limits: Optional[MemoryLimits] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.limits = limits or MemoryLimits()
+        self.evictions = 0
+        self.expirations = 0
+        # thread_id -> time of last use, least recently used first
+        self._last_used: OrderedDict[str, float] = OrderedDict()
+        self._thread_bytes: dict[str, int] = {}
+        # thread_id -> keys of its channel values in self.blobs
+        self._thread_blobs: dict[str, set] = {}
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        """Live threads, bytes and eviction counters, e.g. for metrics."""
+        return {
+            "threads": len(self._last_used),
+            "bytes": self._bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        self._expire()
+        thread_id = config["configurable"]["thread_id"]
+        if thread_id not in self.storage:
+            # MemorySaver would leave an empty entry behind for the unknown thread
+            return None
+        self._touch(thread_id)
+        return super().get_tuple(config)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        self._expire()
+        if config:
+            if config["configurable"]["thread_id"] not in self.storage:
+                return iter(())
+            self._touch(config["configurable"]["thread_id"])
+        return super().list(config, filter=filter, before=before, limit=limit)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        previous = self.storage[thread_id][checkpoint_ns].get(checkpoint["id"])
+        # The channel values updated by the checkpoint are saved apart, in self.blobs
+        blob_keys = [
+            (thread_id, checkpoint_ns, channel, version)
+            for channel, version in new_versions.items()
+        ]
+        previous_blobs = sum(
+            _blob_size(self.blobs[key]) for key in blob_keys if key in self.blobs
+        )
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        saved = self.storage[thread_id][checkpoint_ns][checkpoint["id"]]
+        self._thread_blobs.setdefault(thread_id, set()).update(blob_keys)
+        self._add_bytes(
+            thread_id,
+            _checkpoint_size(saved)
+            - (_checkpoint_size(previous) if previous else 0)
+            + sum(_blob_size(self.blobs[key]) for key in blob_keys)
+            - previous_blobs,
+        )
+        self._enforce(thread_id)
+        return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        outer_key = (
+            thread_id,
+            config["configurable"].get("checkpoint_ns", ""),
+            config["configurable"]["checkpoint_id"],
+        )
+        before = _writes_size(self.writes.get(outer_key, {}))
+        super().put_writes(config, writes, task_id, task_path)
+        self._add_bytes(thread_id, _writes_size(self.writes[outer_key]) - before)
+        self._enforce(thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete every checkpoint, channel value and pending write of a thread."""
+        for checkpoint_ns, checkpoints in self.storage.pop(thread_id, {}).items():
+            for checkpoint_id in checkpoints:
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        for key in self._thread_blobs.pop(thread_id, ()):
+            self.blobs.pop(key, None)
+        self._last_used.pop(thread_id, None)
+        self._bytes -= self._thread_bytes.pop(thread_id, 0)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Asynchronous version of delete_thread."""
+        self.delete_thread(thread_id)
+
+    def _touch(self, thread_id: str):
+        self._last_used[thread_id] = time.monotonic()
+        self._last_used.move_to_end(thread_id)
+
+    def _add_bytes(self, thread_id: str, size: int):
+        self._thread_bytes[thread_id] = self._thread_bytes.get(thread_id, 0) + size
+        self._bytes += size
+        self._touch(thread_id)
+
+    def _expire(self):
+        """Evict threads idle for longer than thread_ttl_seconds."""
+        if self.limits.thread_ttl_seconds is None:
+            return
+        expired_before = time.monotonic() - self.limits.thread_ttl_seconds
+        while self._last_used:
+            thread_id, last_used = next(iter(self._last_used.items()))
+            if last_used >= expired_before:
+                break
+            self.delete_thread(thread_id)
+            self.expirations += 1
+
+    def _enforce(self, thread_id: str):
+        """Evict least recently used threads, other than thread_id, beyond the limits."""
+        self._expire()
+        while len(self._last_used) > 1 and (
+            (
+                self.limits.max_threads is not None
+                and len(self._last_used) > self.limits.max_threads
+            )
+            or (
+                self.limits.max_bytes is not None
+                and self._bytes > self.limits.max_bytes
+            )
+        ):
+            evicted = next(iter(self._last_used))
+            if evicted == thread_id:
+                break
+            self.delete_thread(evicted)
+            self.evictions += 1
+            logger.debug("Evicted thread %s from the in-memory checkpointer", evicted)
+
+
+def _checkpoint_size(saved: tuple) -> int:
+    """Serialized size of a (checkpoint, metadata, parent_checkpoint_id) entry."""
+    (_, checkpoint), (_, metadata), _ = saved
+    return len(checkpoint) + len(metadata)
+
+
+def _blob_size(blob: tuple) -> int:
+    """Serialized size of a (type, value) channel value entry."""
+    return len(blob[1])
+
+
+def _writes_size(writes: dict) -> int:
+    """Serialized size of the pending writes of a checkpoint."""
+    return sum(len(value) for _, _, (_, value), _ in writes.values())
@@ -0,0 +1,392 @@
+"""Offline migrations for data written by older versions of the Redis checkpointer.
+
+Every migration streams over the keyspace with SCAN (never KEYS) and writes in
+pipelined batches, so it can run against a live Redis without blocking it.
+
+Usage:
+    python -m src.utils.redis_migrations backfill-index
+    python -m src.utils.redis_migrations backfill-metadata-index
+    python -m src.utils.redis_migrations writes-key-schema-2
+    python -m src.utils.redis_migrations dedupe-system-prompt
+"""
+
+import argparse
+import asyncio
+import time
+
+from langchain_core.messages import SystemMessage
+from langgraph.checkpoint.base import create_checkpoint
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from redis.asyncio import Redis as AsyncRedis
+
+from src.config import settings
+from src.utils.logger import logger
+from src.utils.redis_checkpointer import (
+    REDIS_KEY_SEPARATOR,
+    THREAD_CATALOG_KEY,
+    AsyncRedisSaver,
+    _make_redis_checkpoint_index_key,
+    _make_redis_checkpoint_key,
+    _make_redis_checkpoint_metadata_index_prefix,
+    _make_redis_checkpoint_metadata_index_suffix,
+    _make_redis_checkpoint_writes_field,
+    _make_redis_checkpoint_writes_hash_key,
+    _make_redis_checkpoint_writes_index_key,
+    _make_redis_checkpoint_writes_key,
+    _make_redis_thread_namespaces_key,
+    _parse_redis_checkpoint_key,
+    _parse_redis_checkpoint_writes_key,
+)
+
+# Settings of `checkpointer.kwargs` in agent.yaml the saver of SAVER_MIGRATIONS is
+# created with: the connection, key layout and serialization of the agent's saver.
+# Retention and read replicas are left out, the migration only reads the primary.
+SAVER_KWARGS = (
+    "max_connections",
+    "pool_timeout",
+    "socket_keepalive",
+    "health_check_interval",
+    "cluster",
+    "key_schema",
+    "compression",
+    "serde",
+)
+
+
+async def backfill_checkpoint_index(conn: AsyncRedis, batch_size: int = 500) -> int:
+    """
+    Add every existing checkpoint to its per-thread sorted set index.
+
+    Checkpoints saved before the index was introduced are invisible to
+    "latest checkpoint" lookups and to `alist` until they are backfilled.
+    Their threads are also registered in the namespaces set and the thread
+    catalog, as active now, so retention can find them.
+    The migration is idempotent and can safely be re-run.
+
+    Args:
+        conn (AsyncRedis): Connection to the Redis holding the checkpoints.
+        batch_size (int): Number of keys fetched per SCAN call and written per pipeline.
+
+    Returns:
+        int: Number of checkpoints indexed.
+    """
+    pattern = _make_redis_checkpoint_key("*", "*", "*")
+    indexed = 0
+    now = time.time()
+    pipe = conn.pipeline(transaction=False)
+    async for key in conn.scan_iter(match=pattern, count=batch_size):
+        key = key.decode()
+        # Skip keys that merely match the glob, e.g. separators inside a thread id
+        if key.count(REDIS_KEY_SEPARATOR) != 3:
+            continue
+        parsed_key = _parse_redis_checkpoint_key(key)
+        pipe.zadd(
+            _make_redis_checkpoint_index_key(
+                parsed_key["thread_id"], parsed_key["checkpoint_ns"]
+            ),
+            {parsed_key["checkpoint_id"]: 0},
+        )
+        pipe.sadd(
+            _make_redis_thread_namespaces_key(parsed_key["thread_id"]),
+            parsed_key["checkpoint_ns"],
+        )
+        pipe.zadd(THREAD_CATALOG_KEY, {parsed_key["thread_id"]: now}, nx=True)
+        indexed += 1
+        if len(pipe) >= batch_size:
+            await pipe.execute()
+    if len(pipe):
+        await pipe.execute()
+
+    logger.info(f"Indexed {indexed} checkpoints")
+    return indexed
+
+
+async def backfill_writes_index(conn: AsyncRedis, batch_size: int = 500) -> int:
+    """
+    Add every existing writes key to the writes index set of its checkpoint.
+
+    Pending writes saved before the index was introduced are not returned with
+    their checkpoint until they are backfilled. SADD is idempotent, so the
+    migration can safely be re-run.
+
+    Args:
+        conn (AsyncRedis): Connection to the Redis holding the checkpoints.
+        batch_size (int): Number of keys fetched per SCAN call and written per pipeline.
+
+    Returns:
+        int: Number of writes indexed.
+    """
+    pattern = _make_redis_checkpoint_writes_key("*", "*", "*", "*", "*")
+    indexed = 0
+    pipe = conn.pipeline(transaction=False)
+    async for key in conn.scan_iter(match=pattern, count=batch_size):
+        key = key.decode()
+        if key.count(REDIS_KEY_SEPARATOR) != 5:
+            continue
+        parsed_key = _parse_redis_checkpoint_writes_key(key)
+        pipe.sadd(
+            _make_redis_checkpoint_writes_index_key(
+                parsed_key["thread_id"],
+                parsed_key["checkpoint_ns"],
+                parsed_key["checkpoint_id"],
+            ),
+            key,
+        )
+        indexed += 1
+        if len(pipe) >= batch_size:
+            await pipe.execute()
+    if len(pipe):
+        await pipe.execute()
+
+    logger.info(f"Indexed {indexed} writes")
+    return indexed
+
+
+async def backfill_indexes(conn: AsyncRedis, batch_size: int = 500):
+    """Backfill both the checkpoint and the pending writes indexes."""
+    await backfill_checkpoint_index(conn, batch_size=batch_size)
+    await backfill_writes_index(conn, batch_size=batch_size)
+
+
+async def backfill_metadata_index(conn: AsyncRedis, batch_size: int = 500) -> int:
+    """
+    Add every existing checkpoint to the metadata indexes used by filtered `alist`.
+
+    Checkpoints saved before the metadata indexes were introduced are not
+    returned by `alist` calls filtering on indexed metadata until they are
+    backfilled. The migration is idempotent and can safely be re-run.
+
+    Args:
+        conn (AsyncRedis): Connection to the Redis holding the checkpoints.
+        batch_size (int): Number of checkpoints read and indexed per batch.
+
+    Returns:
+        int: Number of checkpoints indexed.
+    """
+    pattern = _make_redis_checkpoint_key("*", "*", "*")
+    serde = JsonPlusSerializer()
+    indexed = 0
+    batch = []
+
+    async def index_batch():
+        read_pipe = conn.pipeline(transaction=False)
+        for key in batch:
+            read_pipe.hget(key, "metadata")
+        write_pipe = conn.pipeline(transaction=False)
+        for key, metadata in zip(batch, await read_pipe.execute()):
+            if metadata is None:
+                continue
+            parsed_key = _parse_redis_checkpoint_key(key)
+            prefix = _make_redis_checkpoint_metadata_index_prefix(
+                parsed_key["thread_id"], parsed_key["checkpoint_ns"]
+            )
+            suffixes = [
+                suffix
+                for field, value in serde.loads(metadata).items()
+                if (
+                    suffix := _make_redis_checkpoint_metadata_index_suffix(field, value)
+                )
+            ]
+            for suffix in suffixes:
+                write_pipe.zadd(prefix + suffix, {parsed_key["checkpoint_id"]: 0})
+            write_pipe.hset(key, "metadata_index", "\n".join(suffixes))
+        await write_pipe.execute()
+
+    async for key in conn.scan_iter(match=pattern, count=batch_size):
+        key = key.decode()
+        if key.count(REDIS_KEY_SEPARATOR) != 3:
+            continue
+        batch.append(key)
+        if len(batch) >= batch_size:
+            await index_batch()
+            indexed += len(batch)
+            batch = []
+    if batch:
+        await index_batch()
+        indexed += len(batch)
+
+    logger.info(f"Indexed the metadata of {indexed} checkpoints")
+    return indexed
+
+
+async def migrate_writes_to_key_schema_2(
+    conn: AsyncRedis, batch_size: int = 500
+) -> int:
+    """
+    Move pending writes from one hash per write into one hash per checkpoint.
+
+    Run it while no saver is writing, then restart the savers with
+    `key_schema: 2`. Writes are moved batch by batch: each batch is read with one
+    pipeline and rewritten, together with the removal of the old keys and of
+    their writes index sets, with another one.
+
+    Args:
+        conn (AsyncRedis): Connection to the Redis holding the checkpoints.
+        batch_size (int): Number of writes keys moved per batch.
+
+    Returns:
+        int: Number of writes migrated.
+    """
+    pattern = _make_redis_checkpoint_writes_key("*", "*", "*", "*", "*")
+    migrated = 0
+    batch = []
+
+    async def migrate_batch():
+        read_pipe = conn.pipeline(transaction=False)
+        for key in batch:
+            read_pipe.hgetall(key)
+        write_pipe = conn.pipeline(transaction=False)
+        for key, data in zip(batch, await read_pipe.execute()):
+            parsed_key = _parse_redis_checkpoint_writes_key(key)
+            write_pipe.hset(
+                _make_redis_checkpoint_writes_hash_key(
+                    parsed_key["thread_id"],
+                    parsed_key["checkpoint_ns"],
+                    parsed_key["checkpoint_id"],
+                ),
+                mapping={
+                    _make_redis_checkpoint_writes_field(
+                        parsed_key["task_id"], parsed_key["idx"], field.decode()
+                    ): value
+                    for field, value in data.items()
+                },
+            )
+            write_pipe.unlink(
+                key,
+                _make_redis_checkpoint_writes_index_key(
+                    parsed_key["thread_id"],
+                    parsed_key["checkpoint_ns"],
+                    parsed_key["checkpoint_id"],
+                ),
+            )
+        await write_pipe.execute()
+
+    async for key in conn.scan_iter(match=pattern, count=batch_size):
+        key = key.decode()
+        if key.count(REDIS_KEY_SEPARATOR) != 5:
+            continue
+        batch.append(key)
+        if len(batch) >= batch_size:
+            await migrate_batch()
+            migrated += len(batch)
+            batch = []
+    if batch:
+        await migrate_batch()
+        migrated += len(batch)
+
+    logger.info(f"Migrated {migrated} writes to key schema 2")
+    return migrated
+
+
+async def dedupe_system_prompts(saver: AsyncRedisSaver, batch_size: int = 500) -> int:
+    """
+    Remove the system prompts saved in the message history of every thread.
+
+    The custom agent used to add its system prompt to the inputs of every turn,
+    so each turn saved another copy of it in the thread. The prompt is now sent
+    before the messages of the state on every model call instead. Every
+    namespace of a thread whose latest checkpoint holds system messages gets a
+    new checkpoint without them, as `update_state` would do; older checkpoints
+    are left to retention. Run it while no agent is writing. The migration is
+    idempotent and can safely be re-run.
+
+    Args:
+        saver (AsyncRedisSaver): Saver configured as the agent's, see SAVER_KWARGS,
+            so that keys, compression and serialization match the checkpoints.
+        batch_size (int): Number of threads whose latest checkpoints are read concurrently.
+
+    Returns:
+        int: Number of threads updated.
+    """
+    updated = 0
+
+    async def dedupe_thread(thread_id: str) -> bool:
+        namespaces_key = _make_redis_thread_namespaces_key(saver._thread_key(thread_id))
+        # The root namespace is always checked, as in adelete_thread
+        checkpoint_namespaces = {
+            checkpoint_ns.decode()
+            for checkpoint_ns in await saver.conn.smembers(namespaces_key)
+        } | {""}
+        deduped = [
+            await dedupe_namespace(thread_id, checkpoint_ns)
+            for checkpoint_ns in sorted(checkpoint_namespaces)
+        ]
+        return any(deduped)
+
+    async def dedupe_namespace(thread_id: str, checkpoint_ns: str) -> bool:
+        config = {
+            "configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+        }
+        saved = await saver.aget_tuple(config)
+        if saved is None:
+            return False
+        messages = saved.checkpoint["channel_values"].get("messages", [])
+        kept = [
+            message for message in messages if not isinstance(message, SystemMessage)
+        ]
+        if len(kept) == len(messages):
+            return False
+
+        step = saved.metadata.get("step", -1) + 1
+        checkpoint = create_checkpoint(saved.checkpoint, None, step)
+        version = saver.get_next_version(
+            checkpoint["channel_versions"].get("messages"), None
+        )
+        checkpoint["channel_values"]["messages"] = kept
+        checkpoint["channel_versions"]["messages"] = version
+        await saver.aput(
+            saved.config,
+            checkpoint,
+            {"source": "update", "step": step, "writes": None, "parents": {}},
+            {"messages": version},
+        )
+        return True
+
+    batch = []
+    async for thread in saver.alist_threads():
+        batch.append(thread.thread_id)
+        if len(batch) >= batch_size:
+            updated += sum(await asyncio.gather(*map(dedupe_thread, batch)))
+            batch = []
+    if batch:
+        updated += sum(await asyncio.gather(*map(dedupe_thread, batch)))
+
+    logger.info(f"Removed the saved system prompts of {updated} threads")
+    return updated
+
+
+MIGRATIONS = {
+    "backfill-index": backfill_indexes,
+    "backfill-metadata-index": backfill_metadata_index,
+    "writes-key-schema-2": migrate_writes_to_key_schema_2,
+    "dedupe-system-prompt": dedupe_system_prompts,
+}
+
+
+# Migrations reading and writing checkpoints through a saver rather than raw keys
+SAVER_MIGRATIONS = {"dedupe-system-prompt"}
+
+
+async def main(migration: str, batch_size: int):
+    if migration in SAVER_MIGRATIONS:
+        kwargs = settings.get("checkpointer.kwargs", {})
+        async with AsyncRedisSaver.from_url(
+            url=settings.REDIS_URL,
+            **{key: kwargs[key] for key in SAVER_KWARGS if key in kwargs},
+        ) as saver:
+            await MIGRATIONS[migration](saver, batch_size=batch_size)
+        return
+
+    conn = AsyncRedis.from_url(settings.REDIS_URL)
+    try:
+        await MIGRATIONS[migration](conn, batch_size=batch_size)
+    finally:
+        await conn.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("migration", choices=sorted(MIGRATIONS))
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.migration, args.batch_size))
@@ -0,0 +1,145 @@
+"""
+Routing of immutable checkpoint reads to Redis read replicas.
+
+A checkpoint addressed by its id never changes once written, so history reads
+can be served by a replica, while the latest checkpoint of a thread and every
+write stay on the primary. A background task estimates the replication lag of
+each replica from the replication offsets reported by `INFO replication`:
+replicas lagging by more than `max_lag_seconds`, disconnected from the primary
+or failing a read are skipped, and reads fall back to the primary.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Optional, Union
+
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError
+
+from src.utils.logger import logger
+
+
+class ReplicaRouter:
+    """
+    Picks a replica lagging by less than max_lag_seconds behind the primary.
+
+    The lag is measured with a resolution of check_interval_seconds: the primary's
+    replication offset is sampled on every check, and a replica lags by the age
+    of the newest sample its own offset has reached.
+
+    Attributes:
+        primary (AsyncRedis): Connection to the primary.
+        replicas (list[AsyncRedis]): Connections to the replicas.
+        max_lag_seconds (float): Largest lag of a replica serving reads.
+        check_interval_seconds (float): Pause between two lag checks.
+        replica_reads (int): Reads served by a replica.
+        primary_fallbacks (int): Reads sent to a replica then retried on the primary.
+    """
+
+    def __init__(
+        self,
+        primary: AsyncRedis,
+        replicas: list[AsyncRedis],
+        *,
+        max_lag_seconds: float = 5,
+        check_interval_seconds: float = 1,
+    ):
+        if max_lag_seconds < 0 or check_interval_seconds <= 0:
+            raise ValueError(
+                "max_lag_seconds must be >= 0 and check_interval_seconds > 0"
+            )
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval_seconds = check_interval_seconds
+        self.replica_reads = 0
+        self.primary_fallbacks = 0
+        # (monotonic time, master_repl_offset) samples of the primary, oldest first,
+        # covering max_lag_seconds
+        self._offsets: deque[tuple[float, int]] = deque(
+            maxlen=math.ceil(max_lag_seconds / check_interval_seconds) + 2
+        )
+        self._lags: list[Optional[float]] = [None] * len(replicas)
+        self._healthy: list[AsyncRedis] = []
+        self._next = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def pick(self) -> Optional[AsyncRedis]:
+        """The next healthy replica, in turn, or None when reads must go to the primary."""
+        if not self._healthy:
+            return None
+        self._next = (self._next + 1) % len(self._healthy)
+        return self._healthy[self._next]
+
+    def mark_failed(self, replica: AsyncRedis, error: Exception):
+        """Stop reading from a replica until the next check finds it healthy again."""
+        logger.warning(
+            f"Redis replica read failed, falling back to the primary: {error}"
+        )
+        self.primary_fallbacks += 1
+        if replica in self._healthy:
+            self._healthy.remove(replica)
+
+    def start(self):
+        """Start the background lag checks, if they are not already running."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the background lag checks and wait for them to finish."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval_seconds)
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis replica lag check failed: {e}")
+
+    async def check(self):
+        """Sample the primary's replication offset and update the lag of every replica."""
+        info = await self.primary.info("replication")
+        now = time.monotonic()
+        self._offsets.append((now, int(info.get("master_repl_offset", 0))))
+        healthy = []
+        for idx, replica in enumerate(self.replicas):
+            try:
+                lag = self._replication_lag(await replica.info("replication"), now)
+            except RedisError as e:
+                logger.warning(f"Redis replica {idx} is unavailable: {e}")
+                lag = None
+            self._lags[idx] = lag
+            if lag is not None and lag <= self.max_lag_seconds:
+                healthy.append(replica)
+        self._healthy = healthy
+
+    def _replication_lag(self, info: dict, now: float) -> Optional[float]:
+        """Seconds a replica lags behind the primary, None when it is not replicating."""
+        if info.get("role") != "slave" or info.get("master_link_status") != "up":
+            return None
+        offset = int(info.get("slave_repl_offset", 0))
+        for sampled_at, primary_offset in reversed(self._offsets):
+            if offset >= primary_offset:
+                return now - sampled_at
+        return None
+
+    def stats(self) -> dict[str, Union[int, list]]:
+        """Replica health and read counters, e.g. for metrics."""
+        return {
+            "replicas": len(self.replicas),
+            "healthy_replicas": len(self._healthy),
+            "lag_seconds": self._lags,
+            "replica_reads": self.replica_reads,
+            "primary_fallbacks": self.primary_fallbacks,
+        }